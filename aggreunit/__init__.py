@@ -1,3 +1,31 @@
-from .util_functions import *
-from .aggregate_units import *
-#from .rasterize_geoms import *
\ No newline at end of file
+from .core import *
+#from .rasterize_geoms import *
+
+#Vector/pandas based modules are imported on first use so raster-only workers don't pay for geopandas
+_LAZY = {
+    'vector_io': ['DEFAULT_BATCH_SIZE', 'VECTOR_WRITERS', 'register_vector_writer', 'write_vector', 'read_vector'],
+    'util_functions': ['raster_to_polygon', 'join_population_to_shp', 'get_pop_density', 'sort_by_density', 'get_labels',
+                       'get_target_labels', 'get_ensemble_labels', 'population_columns', 'read_population_table', 'aggr_table',
+                       'aggr_constrained_shp', 'dissolve_admin_units', 'coverage_dissolve', 'compact_coverage', 'lod_path',
+                       'save_shapefile', 'rasterize'],
+    'aggregate_units': ['PIPELINE_STAGES', 'OUTPUT_STAGES', 'OUTPUT_RECORDS', 'APPLY_STAGES', 'AggregateUnits'],
+    'batch': ['PATH_FIELDS', 'OPTION_FIELDS', 'STATUS_FIELDS', 'read_manifest', 'job_size', 'run_job', 'run_batch', 'write_status'],
+    'worker': ['SPOOL_DIRS', 'Worker', 'submit_job'],
+}
+_LAZY_NAMES = {name: module for module, names in _LAZY.items() for name in names}
+__all__ = [name for name in globals() if not name.startswith('_')] + list(_LAZY_NAMES)
+
+
+def __getattr__(name):
+    import importlib
+    if name in _LAZY_NAMES:
+        value = getattr(importlib.import_module(f'.{_LAZY_NAMES[name]}', __name__), name)
+        globals()[name] = value
+        return value
+    if name in _LAZY or name in ('rasterize_geoms', 'cli'):
+        return importlib.import_module(f'.{name}', __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_NAMES))
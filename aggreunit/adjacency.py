@@ -0,0 +1,300 @@
+"""
+Neighbour graph of admin units built straight from the admin unit raster
+"""
+import numpy as np
+import rasterio
+
+from .id_index import IdIndex
+from .windows import DEFAULT_WINDOW_PIXELS, iter_windows, expand_window
+
+
+class AdjacencyGraph:
+    """
+    CSR-style neighbour list of admin units. Units are stored in ascending id order, and the neighbours of the unit at
+    position p are indices[indptr[p]:indptr[p + 1]] (positions into ids).
+    """
+    def __init__(self, ids, indptr, indices, weights=None):
+        """
+        Instantiation
+
+        Parameters:
+        -----------
+        ids :   (np.ndarray)
+            Sorted unique admin unit ids
+        indptr  :   (np.ndarray)
+            Row pointer of length len(ids) + 1
+        indices :   (np.ndarray)
+            Neighbour positions (into ids) of every unit, concatenated
+        weights :   (np.ndarray) - Optional: Default = None
+            Shared boundary length (in CRS units) for every entry in indices
+        """
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.weights = None if weights is None else np.asarray(weights, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def index(self):
+        """IdIndex of the units (graph positions are their dense codes)"""
+        return IdIndex(self.ids, assume_unique=True)
+
+    @property
+    def degree(self):
+        """Number of neighbours of every unit (in ids order)"""
+        return np.diff(self.indptr)
+
+    def index_of(self, ids):
+        """
+        Returns positions of ids in the graph (-1 where the id is not in the graph)
+
+        Parameters:
+        -----------
+        ids :   (array-like)
+            Admin unit ids to look up
+
+        Returns:
+        --------
+        positions   :   (np.ndarray)
+            Position of every id in self.ids
+        """
+        return self.index.codes(ids)
+
+    def neighbours(self, unit_id):
+        """
+        Returns ids of the units touching unit_id
+
+        Parameters:
+        -----------
+        unit_id :   (int)
+            Admin unit id
+
+        Returns:
+        --------
+        neighbours  :   (np.ndarray)
+            Ids of neighbouring units (empty if unit_id is not in the graph)
+        """
+        position = self.index_of([unit_id])[0]
+        if position < 0:
+            return np.empty(0, dtype=np.int64)
+        return self.ids[self.indices[self.indptr[position]:self.indptr[position + 1]]]
+
+    def boundary_lengths(self, unit_id):
+        """
+        Returns shared boundary length between unit_id and each of its neighbours (same order as neighbours())
+
+        Parameters:
+        -----------
+        unit_id :   (int)
+            Admin unit id
+
+        Returns:
+        --------
+        lengths :   (np.ndarray)
+            Shared boundary length of every neighbour
+        """
+        if self.weights is None:
+            raise ValueError("Graph was built without boundary lengths. Rebuild with boundary_length=True")
+        position = self.index_of([unit_id])[0]
+        if position < 0:
+            return np.empty(0, dtype=np.float64)
+        return self.weights[self.indptr[position]:self.indptr[position + 1]]
+
+    def row_neighbours(self, ids):
+        """
+        Returns the neighbour list re-indexed to the row order of ids, with every row's neighbours sorted by row position.
+        Units missing from either side are dropped.
+
+        Parameters:
+        -----------
+        ids :   (array-like)
+            Admin unit ids in row order (e.g. the index of a density sorted geodataframe)
+
+        Returns:
+        --------
+        indptr  :   (np.ndarray)
+            Row pointer of length len(ids) + 1
+        indices :   (np.ndarray)
+            int32 neighbour row positions
+        """
+        graph_pos = self.index_of(ids)
+        row_pos = np.full(len(self), -1, dtype=np.int64)
+        row_pos[graph_pos[graph_pos >= 0]] = np.flatnonzero(graph_pos >= 0)
+        rows = row_pos[np.repeat(np.arange(len(self)), self.degree)]
+        cols = row_pos[self.indices]
+        keep = (rows >= 0) & (cols >= 0)
+        rows, cols = rows[keep], cols[keep]
+        order = np.lexsort((cols, rows))
+        indptr = np.zeros(len(graph_pos) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(graph_pos)), out=indptr[1:])
+        return indptr, cols[order].astype(np.int32)
+
+    def save(self, path):
+        """
+        Saves graph arrays to an uncompressed .npz file
+
+        Parameters:
+        -----------
+        path    :   (Path/str)
+            Output path (or open binary file)
+
+        Returns:
+        --------
+        None
+        """
+        arrays = {'ids': self.ids, 'indptr': self.indptr, 'indices': self.indices}
+        if self.weights is not None:
+            arrays['weights'] = self.weights
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Returns graph saved with save()
+
+        Parameters:
+        -----------
+        path    :   (Path/str)
+            Path to .npz file
+
+        Returns:
+        --------
+        graph   :   (AdjacencyGraph)
+        """
+        with np.load(path) as arrays:
+            return cls(arrays['ids'], arrays['indptr'], arrays['indices'], arrays['weights'] if 'weights' in arrays else None)
+
+    @classmethod
+    def from_pairs(cls, ids, a, b, weights=None):
+        """
+        Returns graph from undirected pairs of unit positions (duplicates are merged and their weights summed)
+
+        Parameters:
+        -----------
+        ids :   (np.ndarray)
+            Sorted unique admin unit ids
+        a   :   (np.ndarray)
+            First position of every pair
+        b   :   (np.ndarray)
+            Second position of every pair
+        weights :   (np.ndarray) - Optional: Default = None
+            Weight of every pair
+
+        Returns:
+        --------
+        graph   :   (AdjacencyGraph)
+        """
+        a = np.asarray(a, dtype=np.int64)
+        b = np.asarray(b, dtype=np.int64)
+        w = np.zeros(len(a)) if weights is None else np.asarray(weights, dtype=np.float64)
+        keep = a != b
+        a, b, w = a[keep], b[keep], w[keep]
+        #Store both directions then sort by (row, neighbour)
+        rows = np.concatenate([a, b])
+        cols = np.concatenate([b, a])
+        w = np.concatenate([w, w])
+        rows, cols, w = _reduce_pairs(rows, cols, w)
+        indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(ids)), out=indptr[1:])
+        return cls(ids, indptr, cols, None if weights is None else w)
+
+    @classmethod
+    def from_raster(cls, raster, diagonal=True, boundary_length=False, max_pixels=DEFAULT_WINDOW_PIXELS, index=None):
+        """
+        Returns graph of admin units built by comparing neighbouring pixel ids of the admin raster, window by window
+
+        Parameters:
+        -----------
+        raster  :   (Path/str)
+            Path to admin unit raster
+        diagonal    :   (Boolean) - Optional: Default = True
+            Count units meeting only at a pixel corner as neighbours (matches shapely's touches predicate)
+        boundary_length :   (Boolean) - Optional: Default = False
+            Keep shared boundary length (in CRS units) of every neighbour pair
+        max_pixels  :   (int) - Optional: Default = DEFAULT_WINDOW_PIXELS
+            Pixel budget of each window read from the raster
+        index   :   (IdIndex) - Optional: Default = None
+            Ids of the raster already factorised (e.g. from the polygonised units). Units not in it are left out. The ids
+            are collected from the raster when None
+
+        Returns:
+        --------
+        graph   :   (AdjacencyGraph)
+        """
+        ids, a, b, w = [], [], [], []
+        with rasterio.open(raster) as src:
+            nodata = src.nodata
+            edge_x = abs(src.transform.a) #Length of horizontal pixel edge
+            edge_y = abs(src.transform.e) #Length of vertical pixel edge
+            for window in iter_windows(src, max_pixels):
+                #Read one extra row/column so pairs crossing the window seam are counted exactly once
+                arr = src.read(1, window=expand_window(src, window)).astype(np.int64)
+                valid = arr != nodata if nodata is not None else np.ones(arr.shape, dtype=bool)
+                if index is None:
+                    ids.append(np.unique(arr[:window.height, :window.width][valid[:window.height, :window.width]]))
+                for pa, pb, length in _pixel_pairs(arr, valid, window.height, window.width, diagonal, edge_x, edge_y):
+                    pa, pb = np.minimum(pa, pb), np.maximum(pa, pb)
+                    pa, pb, length = _reduce_pairs(pa, pb, np.full(len(pa), length))
+                    a.append(pa)
+                    b.append(pb)
+                    w.append(length)
+        if index is None:
+            index = IdIndex(np.concatenate(ids) if ids else np.empty(0, dtype=np.int64))
+        a = index.codes(np.concatenate(a)) if a else np.empty(0, dtype=np.int64)
+        b = index.codes(np.concatenate(b)) if b else np.empty(0, dtype=np.int64)
+        w = np.concatenate(w) if w else np.empty(0)
+        keep = (a >= 0) & (b >= 0)
+        return cls.from_pairs(index.ids, a[keep], b[keep], w[keep] if boundary_length else None)
+
+    @classmethod
+    def from_geodataframe(cls, gdf):
+        """
+        Returns graph of the touching geometries in gdf (indexed by admin unit id) using a single bulk spatial index query
+
+        Parameters:
+        -----------
+        gdf :   (gpd.GeoDataFrame)
+            Geodataframe of admin units indexed by admin unit id
+
+        Returns:
+        --------
+        graph   :   (AdjacencyGraph)
+        """
+        index = IdIndex(gdf.index)
+        codes = index.codes(gdf.index)
+        left, right = gdf.sindex.query(gdf.geometry, predicate='touches')
+        return cls.from_pairs(index.ids, codes[left], codes[right])
+
+
+def _pixel_pairs(arr, valid, height, width, diagonal, edge_x, edge_y):
+    """
+    Yields (ids_a, ids_b, shared_edge_length) for pixel pairs anchored inside the top-left height x width part of arr
+    that hold different, valid ids
+    """
+    n_h = min(width, arr.shape[1] - 1) #Columns with a right-hand neighbour
+    n_v = min(height, arr.shape[0] - 1) #Rows with a neighbour below
+    offsets = [
+        ((slice(0, height), slice(0, n_h)), (slice(0, height), slice(1, n_h + 1)), edge_y),
+        ((slice(0, n_v), slice(0, width)), (slice(1, n_v + 1), slice(0, width)), edge_x),
+    ]
+    if diagonal:
+        offsets += [
+            ((slice(0, n_v), slice(0, n_h)), (slice(1, n_v + 1), slice(1, n_h + 1)), 0.0),
+            ((slice(0, n_v), slice(1, n_h + 1)), (slice(1, n_v + 1), slice(0, n_h)), 0.0),
+        ]
+    for first, second, length in offsets:
+        ids_a, ids_b = arr[first], arr[second]
+        keep = valid[first] & valid[second] & (ids_a != ids_b)
+        yield ids_a[keep], ids_b[keep], length
+
+
+def _reduce_pairs(a, b, w):
+    """Returns unique (a, b) pairs sorted by a then b, with the weights of duplicate pairs summed"""
+    if len(a) == 0:
+        return a, b, w
+    order = np.lexsort((b, a))
+    a, b, w = a[order], b[order], w[order]
+    starts = np.flatnonzero(np.concatenate([[True], (a[1:] != a[:-1]) | (b[1:] != b[:-1])]))
+    return a[starts], b[starts], np.add.reduceat(w, starts)
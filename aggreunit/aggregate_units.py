@@ -1,14 +1,35 @@
 """
 Class to wrap up functions in utilities to process the aggregation of admin units for validataion
 """
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+import json
+import os
 from pathlib import Path 
+import tempfile
+import threading
+
+import pandas as pd
+
 import aggreunit
 
+#Stages in run order. Intermediates run on demand when an output needs them, outputs are written when selected
+PIPELINE_STAGES = ['units', 'density', 'labels', 'dissolve', 'admin_shape', 'table', 'label_map', 'shapefile', 'raster', 'constrained',
+                   'validation']
+OUTPUT_STAGES = ['admin_shape', 'table', 'label_map', 'shapefile', 'raster', 'constrained', 'validation']
+OUTPUT_RECORDS = {'admin_shape': 'save_admin_shape', 'table': 'aggr_table', 'label_map': 'save_label_map', 'shapefile': 'save_shapefile',
+                  'raster': 'rasterize', 'constrained': 'constrained', 'validation': 'validation'}
+APPLY_STAGES = ['labels', 'dissolve', 'table', 'shapefile', 'raster', 'constrained', 'validation']
+
 class AggregateUnits:
     """
     Class to wrap up functions in utilities to process the aggregation of admin units for validataion
     """
-    def __init__(self, admin_raster, population_table, area_raster, out_admin_raster, out_population_table, out_admin_shapefile, save_admin_shape=False):
+    def __init__(self, admin_raster, population_table, area_raster, out_admin_raster, out_population_table, out_admin_shapefile, save_admin_shape=False, max_pixels=None, raster_method='rasterize', num_threads=None, target_units=None, coverage_dissolve=False,
+                 cache_dir=None, cache_max_bytes=None, profile_path=None, hooks=None, shape_format='.shp', output_workers=None,
+                 pop_col='B_Tot', table_columns=None, table_pattern=None,
+                 constrained_raster=None, out_constrained_raster=None, constrained_value_raster=None, out_constrained_table=None,
+                 out_label_map=None, label_map=None, ppp_raster=None, out_validation_table=None, units=None,
+                 shape_tolerance=None, shape_precision=None, shape_lods=None):
         """
         Instantiation
 
@@ -21,14 +42,81 @@ class AggregateUnits:
         area_raster     :   (Path/str) 
             Path to pixel area raster matching extent of admin_raster
         out_admin_raster    :   (Path/str)
-            Path to output raster with aggregated units
+            Path to output raster with aggregated units (not written when None)
         out_population_table    :   (Path/str)
-            Path to output csv of aggregated population counts
+            Path to output csv of aggregated population counts (not written when None)
         out_admin_shapefile     :   (Path/str)
-            Path to output shapefile of aggregated admin_units
+            Path to output shapefile of aggregated admin_units (not written when None). The format is picked from the suffix (.shp, .gpkg, .fgb,
+            .geojson, .parquet)
         save_admin_rastershape   :   (Boolean)
             Indicates whether or not to save shapfile of admin_raster to same folder/name (with different suffix) as admin_raster
+        max_pixels  :   (int)
+            Window budget (pixels) used to stream admin_raster when polygonising. Whole raster is read at once when None
+        raster_method   :   (str)
+            How out_admin_raster is made: 'rasterize' burns the dissolved geometries, 'tiled' burns them block by block into a
+            tiled raster on a thread pool, 'remap' writes admin_raster through an adm_id -> label lookup table block by block
+            (pixel-exact, no dissolved geometries needed)
+        num_threads :   (int)
+            Number of threads used by threaded stages (Default = all cores)
+        target_units    :   (int/float)
+            Number (or fraction, if between 0 and 1) of aggregated units to make. Units are merged hierarchically until the
+            target is reached and the full merge hierarchy is kept in self.hierarchy. A single pairing pass (~50%) when None
+        coverage_dissolve   :   (Boolean)
+            Dissolve polygons with parallel coverage union instead of general unary union (polygons derived from the raster
+            always form a coverage, noded along pixel edges when polygonised)
+        cache_dir   :   (Path/str)
+            Directory of an ArtifactCache. Polygonised units, per-unit area and adjacency are reused from it when the admin and
+            area rasters are unchanged (by content), so a new population table skips straight to labelling
+        cache_max_bytes :   (int)
+            Size bound of the cache (least recently used artifacts are evicted). Unbounded when None
+        profile_path    :   (Path/str)
+            JSON-lines file every stage's timing/memory record is appended to (the records are always kept in self.report)
+        hooks   :   (list)
+            Callables receiving every finished aggreunit.StageRecord (more can be added with self.profiler.add_hook)
+        shape_format    :   (str)
+            Suffix (format) of the polygonised admin_raster saved when save_admin_shape is True (e.g. '.gpkg', '.fgb')
+        output_workers  :   (int)
+            Threads writing the outputs (table, shapefile, raster...) concurrently (Default = one per output, 1 = in turn)
+        pop_col :   (str)
+            Population column used for density (and target labelling)
+        table_columns   :   (list)
+            Columns of population_table summed into out_population_table (Default = pop_col only)
+        table_pattern   :   (str)
+            Regular expression selecting more columns to sum into out_population_table (e.g. every age/sex band and year)
+        constrained_raster  :   (Path/str)
+            Constrained (built-area) mastergrid. Its ids are remapped to the unconstrained aggregation block by block
+            through the adm_id -> label lookup table and written to out_constrained_raster (no polygonisation)
+        out_constrained_raster  :   (Path/str)
+            Path to output constrained raster with aggregated units (required with constrained_raster)
+        constrained_value_raster    :   (Path/str)
+            Raster on the constrained grid (e.g. constrained population) summed per aggregated unit in the same pass
+        out_constrained_table   :   (Path/str)
+            Path to output csv of the constrained_value_raster sums (column pop_col) per aggregated unit
+        out_label_map   :   (Path/str)
+            Path to save the adm_id -> label mapping (and its provenance) to as an .npz LabelMap
+        label_map   :   (Path/str/LabelMap)
+            Apply mode: reuse a stored LabelMap of the same mastergrid instead of labelling. Only the population table,
+            the remapped raster and the dissolved units (polygonised from the remapped raster) are made, so no density,
+            sorting or neighbour search runs. area_raster is not read
+        ppp_raster  :   (Path/str)
+            People-per-pixel raster on the admin_raster grid. Enables the validation stage: the raster is summed per
+            aggregated unit (in the same block-wise pass as the remapped raster when raster_method='remap') and compared
+            with the census pop_col totals. The summary is kept in self.validation
+        out_validation_table    :   (Path/str)
+            Path to output csv of per-unit census/modelled totals and errors (Default = '<out_population_table>_validation.csv'
+            when ppp_raster is set). The summary (RMSE, %MAE) is saved next to it as .json
+        units   :   (tuple)
+            Prepared (l1_gdf, unit_area, adjacency) of admin_raster/area_raster (see _prepare_units), e.g. kept warm by a
+            Worker. Polygonisation, area and adjacency are skipped. Units made by a run are kept in self.units
+        shape_tolerance :   (float)
+            Coverage simplification tolerance (CRS units) of out_admin_shapefile. Shared borders stay identical
+        shape_precision :   (float)
+            Grid size (CRS units) the coordinates of out_admin_shapefile and its levels of detail are snapped to
+        shape_lods  :   (list)
+            Tolerances of coarser levels of detail saved next to out_admin_shapefile as <stem>_lod1, <stem>_lod2...
         """
+        if raster_method not in ('rasterize', 'tiled', 'remap'):
+            raise ValueError(f"raster_method must be 'rasterize', 'tiled' or 'remap', got {raster_method}")
         self.admin_raster = admin_raster
         self.population_table = population_table
         self.area_raster = area_raster
@@ -36,6 +124,87 @@ class AggregateUnits:
         self.out_population_table = out_population_table
         self.out_admin_shapefile = out_admin_shapefile
         self.save_admin_shape = save_admin_shape
+        self.shape_format = shape_format
+        self.output_workers = output_workers
+        self._state_lock = threading.Lock()
+        self.pop_col = pop_col
+        self.table_columns = table_columns
+        self.table_pattern = table_pattern
+        if constrained_raster is not None and out_constrained_raster is None:
+            raise ValueError("out_constrained_raster is required with constrained_raster")
+        if out_constrained_table is not None and constrained_value_raster is None:
+            raise ValueError("constrained_value_raster is required with out_constrained_table")
+        self.constrained_raster = constrained_raster
+        self.out_constrained_raster = out_constrained_raster
+        self.constrained_value_raster = constrained_value_raster
+        self.out_constrained_table = out_constrained_table
+        self.out_label_map = out_label_map
+        self.label_map = label_map
+        self.ppp_raster = ppp_raster
+        if out_validation_table is None and ppp_raster is not None and out_population_table is not None:
+            out_validation_table = Path(out_population_table).with_name(f'{Path(out_population_table).stem}_validation.csv')
+        self.out_validation_table = out_validation_table
+        self.validation = None
+        self.units = units
+        self.shape_tolerance = shape_tolerance
+        self.shape_precision = shape_precision
+        self.shape_lods = shape_lods
+        self.max_pixels = max_pixels
+        self.raster_method = raster_method
+        self.num_threads = num_threads
+        self.target_units = target_units
+        self.hierarchy = None
+        self.coverage_dissolve = coverage_dissolve
+        self.cache = aggreunit.ArtifactCache(cache_dir, cache_max_bytes) if cache_dir is not None else None
+        self.profiler = aggreunit.Profiler(pipeline=Path(admin_raster).stem, jsonl_path=profile_path, hooks=hooks)
+
+    @property
+    def report(self):
+        """PipelineReport of the stages run so far"""
+        return self.profiler.report
+
+    def _prepare_units(self, out_shp=None):
+        """
+        Returns polygonised admin units, area per unit and adjacency of admin_raster, reusing them from the cache if one is set
+
+        Parameters:
+        ----------
+        out_shp :   (Path/str)
+            Path to save the polygonised units to (optional)
+
+        Returns:
+        --------
+        l1_gdf  :   (gpd.GeoDataFrame)
+            Polygonised admin units
+        unit_area   :   (tuple)
+            (ids, sums) of area per unit, or None if it has to be computed from the polygons (rasters not aligned)
+        adjacency   :   (AdjacencyGraph)
+            Neighbour graph of the admin units
+        """
+        polygonise = lambda out: aggreunit.raster_to_polygon(self.admin_raster, out_shp=out, max_pixels=self.max_pixels,
+                                                             coverage=self.coverage_dissolve, n_jobs=self.num_threads)
+        pixels = aggreunit.raster_size(self.admin_raster)
+        aligned = aggreunit.grids_align(self.admin_raster, self.area_raster)
+        with self.profiler.stage('raster_to_polygon', pixels=pixels) as record:
+            if self.cache is None:
+                l1_gdf = polygonise(out_shp)
+            else:
+                l1_gdf = self.cache.units(self.admin_raster, lambda: polygonise(None), coverage=self.coverage_dissolve)
+                if out_shp:
+                    aggreunit.save_shapefile(l1_gdf, out_shp)
+            record.rows = len(l1_gdf)
+        index = aggreunit.IdIndex(l1_gdf['adm_id']) #Mastergrid ids factorised once, area and adjacency work on dense codes
+        unit_area = None
+        if aligned:
+            with self.profiler.stage('zonal_area', pixels=pixels) as record:
+                compute = lambda: aggreunit.zonal_sum(self.admin_raster, self.area_raster, num_threads=self.num_threads, index=index)
+                unit_area = compute() if self.cache is None else self.cache.area(self.admin_raster, self.area_raster, compute)
+                record.rows = len(unit_area[0])
+        with self.profiler.stage('adjacency', pixels=pixels) as record:
+            compute = lambda: aggreunit.AdjacencyGraph.from_raster(self.admin_raster, index=index)
+            adjacency = compute() if self.cache is None else self.cache.adjacency(self.admin_raster, compute)
+            record.rows = len(adjacency)
+        return l1_gdf, unit_area, adjacency
 
     def _aggregate(self):
         """
@@ -49,19 +218,347 @@ class AggregateUnits:
         --------
         None
         """
-        if self.save_admin_shape == True:
-            out_shp = self.admin_raster.parent.joinpath(f'{self.admin_raster.stem}.shp')
+        self.run()
+
+    def run(self, stages=None, work_dir=None, resume=False):
+        """
+        Runs the selected pipeline stages. Intermediate stages ('units', 'density', 'labels', 'dissolve') run only when an
+        output needs them (or when selected). Outputs whose path is None are skipped. With a work_dir every intermediate
+        is persisted there (units/area/adjacency in an ArtifactCache, the rest as GeoParquet) and finished stages are
+        recorded, so resume=True picks a crashed or partial run up where it stopped
+
+        Parameters:
+        ----------
+        stages  :   (list)
+            Names from PIPELINE_STAGES (Default = OUTPUT_STAGES, i.e. every output)
+        work_dir    :   (Path/str)
+            Directory for intermediates and the run state (optional)
+        resume  :   (Boolean)
+            Reuse intermediates and skip outputs already finished in work_dir
+
+        Returns:
+        --------
+        None
+        """
+        stages = list(OUTPUT_STAGES) if stages is None else list(stages)
+        unknown = [x for x in stages if x not in PIPELINE_STAGES]
+        if unknown:
+            raise ValueError(f"Unknown stages {unknown}. Use some of {PIPELINE_STAGES}")
+        self._results = {}
+        self._tmp_dir = None
+        self._work_dir = Path(work_dir) if work_dir is not None else None
+        self._done = []
+        if self._work_dir is not None:
+            self._work_dir.mkdir(parents=True, exist_ok=True)
+            if self.cache is None:
+                self.cache = aggreunit.ArtifactCache(self._work_dir.joinpath('cache'))
+            self._done = self._load_state() if resume else []
+            self._save_state()
+        if self.label_map is not None:
+            stages = [x for x in stages if x in APPLY_STAGES]
+        stages = [x for x in PIPELINE_STAGES if x in stages] #Always in pipeline order
+        try:
+            for stage in stages:
+                if stage not in OUTPUT_STAGES:
+                    getattr(self, f'_stage_{stage}')()
+            self._write_outputs([x for x in stages if x in OUTPUT_STAGES and x not in self._done])
+        finally:
+            if self._tmp_dir is not None: #Remapped raster of apply mode, only needed by the dissolve
+                self._tmp_dir.cleanup()
+                self._tmp_dir = None
+                self._results.pop('raster', None)
+
+    def _write_outputs(self, outputs):
+        """
+        Computes what the outputs need, then writes the independent outputs concurrently on a thread pool (the writes are
+        I/O or compression bound and GDAL/GEOS release the GIL). If a write fails, writes not yet started are cancelled and
+        the first error is raised once the running ones are done
+
+        Parameters:
+        ----------
+        outputs :   (list)
+            Output stage names in pipeline order
+
+        Returns:
+        --------
+        None
+        """
+        needs = {'admin_shape': self._stage_density, 'table': self._stage_labels, 'label_map': self._stage_labels,
+                 'constrained': self._stage_labels, 'raster': self._stage_labels, 'shapefile': self._stage_labels,
+                 'validation': self._stage_labels}
+        if self.label_map is None:
+            needs['shapefile'] = self._stage_dissolve
+            if self.raster_method != 'remap':
+                needs['raster'] = self._stage_dissolve
+        enabled = {'admin_shape': self.save_admin_shape == True, 'table': self.out_population_table is not None,
+                   'label_map': self.out_label_map is not None and self.label_map is None, 'shapefile': self.out_admin_shapefile is not None,
+                   'raster': self.out_admin_raster is not None, 'constrained': self.constrained_raster is not None,
+                   'validation': self.ppp_raster is not None}
+        outputs = [x for x in outputs if enabled[x]]
+        for stage in outputs:
+            needs[stage]()
+        #Apply mode polygonises the remapped raster and joins the table, so its shapefile is written after them. Validation
+        #reuses the census totals of the table and the PPP sums of the remap pass
+        last = [x for x in ('shapefile', 'validation') if x in outputs and (x != 'shapefile' or self.label_map is not None)]
+        outputs = [x for x in outputs if x not in last]
+        start = len(self.profiler.report)
+        workers = self.output_workers or len(outputs)
+        if workers <= 1 or len(outputs) <= 1:
+            for stage in outputs:
+                getattr(self, f'_stage_{stage}')()
         else:
-            out_shp = None 
-        l1_gdf = aggreunit.raster_to_polygon(self.admin_raster, out_shp=out_shp)
-        gdf_pop = aggreunit.join_population_to_shp(l1_gdf, self.population_table, pop_col='B_Tot')
-        gdf_density = aggreunit.get_pop_density(gdf_pop, self.area_raster, out_shp=out_shp, pop_col='B_Tot')
-        gdf_sorted = aggreunit.sort_by_density(gdf_density)
-        unconstr_gdf = aggreunit.get_labels(gdf_sorted)
-        gdf_diss = aggreunit.dissolve_admin_units(unconstr_gdf)
-        aggreunit.aggr_table(self.population_table, unconstr_gdf, self.out_population_table, pop_col='B_Tot')
-        aggreunit.save_shapefile(gdf_diss, self.out_admin_shapefile)
-        aggreunit.rasterize(gdf_diss,self.admin_raster, self.out_admin_raster)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(getattr(self, f'_stage_{stage}')) for stage in outputs]
+                wait(futures, return_when=FIRST_EXCEPTION)
+                for future in futures:
+                    future.cancel()
+            for future in futures:
+                if not future.cancelled() and future.exception() is not None:
+                    raise future.exception()
+            #Keep the report in pipeline order whatever order the writes finished in
+            order = {record: i for i, record in enumerate(OUTPUT_RECORDS[x] for x in outputs)}
+            self.profiler.report.stages[start:] = sorted(self.profiler.report.stages[start:], key=lambda x: order.get(x.name, len(order)))
+        for stage in last:
+            getattr(self, f'_stage_{stage}')()
+
+    def _fingerprint(self):
+        """Returns the inputs/options a work dir's intermediates and finished outputs depend on"""
+        path = lambda x: None if x is None else str(x)
+        listed = lambda x: list(x) if isinstance(x, (list, tuple)) else x #As read back from state.json
+        return {'admin_raster': str(self.admin_raster), 'population_table': str(self.population_table),
+                'area_raster': path(self.area_raster), 'pop_col': self.pop_col, 'target_units': self.target_units,
+                'label_map': path(self.label_map), 'table_columns': listed(self.table_columns), 'table_pattern': self.table_pattern,
+                'coverage_dissolve': bool(self.coverage_dissolve), 'max_pixels': self.max_pixels, 'raster_method': self.raster_method,
+                'constrained_raster': path(self.constrained_raster), 'constrained_value_raster': path(self.constrained_value_raster),
+                'ppp_raster': path(self.ppp_raster), 'shape_format': self.shape_format, 'shape_tolerance': self.shape_tolerance,
+                'shape_precision': self.shape_precision, 'shape_lods': listed(self.shape_lods)}
+
+    def _load_state(self):
+        """Returns stages finished in the work dir (ValueError if it was made from other inputs)"""
+        path = self._work_dir.joinpath('state.json')
+        if not path.exists():
+            return []
+        state = json.loads(path.read_text())
+        if state['inputs'] != self._fingerprint():
+            raise ValueError(f"{self._work_dir} holds a run of other inputs {state['inputs']}. Use another work dir or resume=False")
+        return state['done']
+
+    def _save_state(self):
+        path = self._work_dir.joinpath('state.json')
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(json.dumps({'inputs': self._fingerprint(), 'done': self._done}))
+        os.replace(tmp, path)
+
+    def _finish(self, stage):
+        """Records stage as finished in the work dir"""
+        with self._state_lock: #Outputs finish on several threads
+            if self._work_dir is not None and stage not in self._done:
+                self._done.append(stage)
+                self._save_state()
+
+    def _intermediate(self, name, compute):
+        """
+        Returns result (geodataframe) of an intermediate stage, from memory, from the work dir (if finished there) or by
+        computing and persisting it
+
+        Parameters:
+        ----------
+        name    :   (str)
+            Stage name
+        compute :   (callable)
+            Returns the geodataframe
+
+        Returns:
+        --------
+        gdf :   (gpd.GeoDataFrame)
+        """
+        if name not in self._results:
+            path = self._work_dir.joinpath(f'{name}.parquet') if self._work_dir is not None else None
+            if path is not None and name in self._done and path.exists():
+                self._results[name] = aggreunit.read_vector(path)
+            else:
+                self._results[name] = compute()
+                if path is not None:
+                    aggreunit.write_vector(self._results[name], path)
+                    self._finish(name)
+        return self._results[name]
+
+    def _stage_units(self):
+        """Returns (l1_gdf, unit_area, adjacency) (see _prepare_units)"""
+        if 'units' not in self._results:
+            if self.units is None:
+                self.units = self._prepare_units()
+            self._results['units'] = self.units
+            self._finish('units')
+        return self._results['units']
 
+    def _stage_density(self):
+        """Returns units joined with population, density and sorted by density"""
+        def compute():
+            l1_gdf, unit_area, adjacency = self._stage_units()
+            with self.profiler.stage('join_population', rows=len(l1_gdf)):
+                gdf_pop = aggreunit.join_population_to_shp(l1_gdf, self.population_table, pop_col=self.pop_col)
+            with self.profiler.stage('pop_density', rows=len(gdf_pop)):
+                gdf_density = aggreunit.get_pop_density(gdf_pop, self.area_raster, pop_col=self.pop_col, admin_raster=self.admin_raster,
+                                                        unit_area=unit_area, num_threads=self.num_threads)
+            with self.profiler.stage('sort_by_density', rows=len(gdf_density)):
+                return aggreunit.sort_by_density(gdf_density)
+        return self._intermediate('density', compute)
 
+    def _stage_labels(self):
+        """Returns labelled units (index adm_id, column 'labels'), from a stored LabelMap in apply mode"""
+        if self.label_map is not None:
+            if 'labels' not in self._results:
+                with self.profiler.stage('load_label_map') as record:
+                    label_map = self.label_map if isinstance(self.label_map, aggreunit.LabelMap) else aggreunit.LabelMap.load(self.label_map)
+                    label_map.check(self.admin_raster, digest=self.cache.digest(self.admin_raster) if self.cache is not None else None)
+                    record.rows = len(label_map)
+                self._results['labels'] = label_map.to_frame()
+            return self._results['labels']
 
+        def compute():
+            gdf_sorted = self._stage_density()
+            adjacency = self._stage_units()[2]
+            with self.profiler.stage('labels', rows=len(gdf_sorted)):
+                if self.target_units is None:
+                    return aggreunit.get_labels(gdf_sorted, adjacency=adjacency)
+                unconstr_gdf, self.hierarchy = aggreunit.get_target_labels(gdf_sorted, self.target_units, adjacency=adjacency, pop_col=self.pop_col)
+                return unconstr_gdf
+        return self._intermediate('labels', compute)
+
+    def _stage_dissolve(self):
+        """Returns dissolved aggregated units (in apply mode polygonised from the remapped raster, pixel-exact)"""
+        if self.label_map is not None:
+            if 'dissolve' not in self._results:
+                out_raster = self._stage_raster()
+                with self.profiler.stage('dissolve', pixels=aggreunit.raster_size(self.admin_raster)) as record:
+                    gdf_diss = aggreunit.raster_to_polygon(out_raster, max_pixels=self.max_pixels, coverage=self.coverage_dissolve,
+                                                           n_jobs=self.num_threads).set_index('adm_id')
+                    gdf_diss['labels'] = gdf_diss.index
+                    if self._results.get('table') is not None:
+                        gdf_diss = gdf_diss.join(self._results['table'])
+                    record.rows = len(gdf_diss)
+                self._results['dissolve'] = gdf_diss
+            return self._results['dissolve']
+
+        def compute():
+            unconstr_gdf = self._stage_labels()
+            with self.profiler.stage('dissolve', rows=len(unconstr_gdf)) as record:
+                gdf_diss = aggreunit.dissolve_admin_units(unconstr_gdf, coverage=self.coverage_dissolve, n_jobs=self.num_threads)
+                record.rows = len(gdf_diss)
+            return gdf_diss
+        return self._intermediate('dissolve', compute)
+
+    def _stage_admin_shape(self):
+        """Saves the polygonised admin_raster with population and density next to it (save_admin_shape)"""
+        if self.save_admin_shape != True:
+            return
+        gdf_density = self._stage_density()
+        with self.profiler.stage('save_admin_shape', rows=len(gdf_density)):
+            aggreunit.write_vector(gdf_density, Path(self.admin_raster).parent.joinpath(f'{Path(self.admin_raster).stem}{self.shape_format}'))
+        self._finish('admin_shape')
+
+    def _stage_table(self):
+        if self.out_population_table is None:
+            return
+        labelled = self._stage_labels()
+        with self.profiler.stage('aggr_table', rows=len(labelled)):
+            self._results['table'] = aggreunit.aggr_table(self.population_table, labelled, self.out_population_table,
+                                                          pop_col=self.table_columns or self.pop_col, pattern=self.table_pattern)
+        self._finish('table')
+
+    def _stage_label_map(self):
+        if self.out_label_map is None or self.label_map is not None:
+            return
+        unconstr_gdf = self._stage_labels()
+        with self.profiler.stage('save_label_map', rows=len(unconstr_gdf)):
+            digest = self.cache.digest(self.admin_raster) if self.cache is not None else None
+            label_map = aggreunit.LabelMap.from_gdf(unconstr_gdf, admin_raster=self.admin_raster, digest=digest,
+                                                    population_table=str(self.population_table), pop_col=self.pop_col,
+                                                    target_units=self.target_units)
+            label_map.save(self.out_label_map)
+        self._finish('label_map')
+
+    def _stage_shapefile(self):
+        if self.out_admin_shapefile is None:
+            return
+        gdf_diss = self._stage_dissolve()
+        with self.profiler.stage('save_shapefile', rows=len(gdf_diss)):
+            aggreunit.save_shapefile(gdf_diss, self.out_admin_shapefile, tolerance=self.shape_tolerance, precision=self.shape_precision,
+                                     lods=self.shape_lods)
+        self._finish('shapefile')
+
+    def _stage_raster(self):
+        """
+        Returns path of the aggregated raster (in apply mode without out_admin_raster, written to the work dir or to a
+        temporary directory removed at the end of the run)
+        """
+        if 'raster' in self._results:
+            return self._results['raster']
+        out_raster = self.out_admin_raster
+        if out_raster is None:
+            if self.label_map is None:
+                return
+            if self._work_dir is None:
+                self._tmp_dir = tempfile.TemporaryDirectory(prefix='aggreunit_')
+            out_raster = Path(self._tmp_dir.name if self._work_dir is None else self._work_dir).joinpath('remapped.tif')
+        labelled = self._stage_labels()
+        remap = self.raster_method == 'remap' or self.label_map is not None
+        with self.profiler.stage('rasterize', rows=len(labelled), pixels=aggreunit.raster_size(self.admin_raster)):
+            if remap:
+                #PPP totals for validation come from the same pass over the mastergrid
+                self._results['ppp'] = aggreunit.remap_raster(self.admin_raster, labelled.index, labelled['labels'], out_raster,
+                                                              max_pixels=self.max_pixels or aggreunit.DEFAULT_WINDOW_PIXELS,
+                                                              value_raster=self.ppp_raster)
+            else:
+                aggreunit.rasterize(self._stage_dissolve(), self.admin_raster, out_raster, tiled=self.raster_method == 'tiled',
+                                    num_threads=self.num_threads)
+        self._results['raster'] = out_raster
+        if out_raster == self.out_admin_raster:
+            self._finish('raster')
+        return out_raster
+
+    def _stage_constrained(self):
+        """
+        Remaps constrained_raster (if set) through the adm_id -> label lookup table and saves the constrained table
+        """
+        if self.constrained_raster is None:
+            return
+        labelled = self._stage_labels()
+        with self.profiler.stage('constrained', pixels=aggreunit.raster_size(self.constrained_raster)) as record:
+            zonal = aggreunit.remap_raster(self.constrained_raster, labelled.index, labelled['labels'], self.out_constrained_raster,
+                                           max_pixels=self.max_pixels or aggreunit.DEFAULT_WINDOW_PIXELS, value_raster=self.constrained_value_raster)
+            if zonal is not None:
+                record.rows = len(zonal[0])
+                if self.out_constrained_table is not None:
+                    pd.DataFrame({self.pop_col: zonal[1]}, index=pd.Index(zonal[0], name='adm_id')).to_csv(self.out_constrained_table)
+        self._finish('constrained')
+
+    def _stage_validation(self):
+        """
+        Compares the PPP raster (if set) summed per aggregated unit with the census pop_col totals and saves the per-unit
+        errors and their summary. The sums of the remap pass are reused, otherwise the PPP raster is summed per admin
+        unit on a thread pool (zonal_reduce) and the unit sums are added up per label
+        """
+        if self.ppp_raster is None:
+            return
+        labelled = self._stage_labels()
+        census = self._results.get('table')
+        with self.profiler.stage('validation', pixels=aggreunit.raster_size(self.admin_raster)) as record:
+            if census is None or self.pop_col not in census.columns:
+                census = aggreunit.aggr_table(self.population_table, labelled, None, pop_col=self.pop_col)
+            zonal = self._results.get('ppp')
+            if zonal is None:
+                ids, sums, counts = aggreunit.zonal_reduce(self.admin_raster, [self.ppp_raster], num_threads=self.num_threads,
+                                                           max_pixels=self.max_pixels or aggreunit.DEFAULT_WINDOW_PIXELS)
+                units = pd.DataFrame({'sum': sums[:, 0], 'count': counts[:, 0]}, index=ids).join(labelled['labels'], how='inner')
+                labels = units.groupby('labels')[['sum', 'count']].sum()
+                zonal = labels.index.to_numpy(), labels['sum'].where(labels['count'] > 0).to_numpy()
+            df = pd.DataFrame({'census': census[self.pop_col].astype('float64')})
+            df['modelled'] = pd.Series(zonal[1], index=zonal[0]).reindex(df.index)
+            df['abs_error'], df['rel_error'], self.validation = aggreunit.validation_metrics(df['census'], df['modelled'])
+            record.rows = len(df)
+            if self.out_validation_table is not None:
+                df.to_csv(self.out_validation_table)
+                Path(self.out_validation_table).with_suffix('.json').write_text(json.dumps(self.validation, indent=2))
+        self._finish('validation')
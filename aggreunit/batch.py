@@ -0,0 +1,193 @@
+"""
+Run many AggregateUnits jobs (e.g. one per country) from a manifest on a process pool
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import csv
+import json
+import os
+from pathlib import Path
+import time
+import traceback
+
+import rasterio
+
+PATH_FIELDS = ['admin_raster', 'population_table', 'area_raster', 'out_admin_raster', 'out_population_table', 'out_admin_shapefile']
+OPTION_FIELDS = ['save_admin_shape', 'max_pixels', 'raster_method', 'num_threads', 'target_units', 'coverage_dissolve', 'shape_format',
+                 'pop_col', 'table_columns', 'table_pattern', 'constrained_raster', 'out_constrained_raster', 'constrained_value_raster',
+                 'out_constrained_table', 'out_label_map', 'label_map', 'ppp_raster', 'out_validation_table',
+                 'shape_tolerance', 'shape_precision', 'shape_lods']
+STATUS_FIELDS = ['job_id', 'status', 'attempts', 'seconds', 'error']
+
+
+def read_manifest(manifest):
+    """
+    Returns list of jobs from a CSV or JSON manifest. Every job needs the AggregateUnits paths (PATH_FIELDS) and may set
+    job_id and any of OPTION_FIELDS. A JSON manifest is a list of job objects (or {"jobs": [...]}); a CSV manifest has one
+    job per row with the field names as header (empty cells are left at the AggregateUnits default). Only option cells are
+    converted to bool/int/float; job_id and paths stay strings (e.g. job_id '001')
+
+    Parameters:
+    -----------
+    manifest    :   (Path/str)
+        Path to .csv or .json manifest
+
+    Returns:
+    --------
+    jobs    :   (list)
+        List of job dicts
+    """
+    manifest = Path(manifest)
+    if manifest.suffix.lower() == '.json':
+        with open(manifest) as f:
+            jobs = json.load(f)
+        if isinstance(jobs, dict):
+            jobs = jobs['jobs']
+    else:
+        with open(manifest, newline='') as f:
+            jobs = [{k: _parse_cell(v) if k in OPTION_FIELDS else v for k, v in row.items() if v not in (None, '')}
+                    for row in csv.DictReader(f)]
+    for i, job in enumerate(jobs):
+        missing = [x for x in PATH_FIELDS if x not in job]
+        if missing:
+            raise ValueError(f"Job {i} in {manifest} is missing {missing}")
+        unknown = [x for x in job if x not in PATH_FIELDS + OPTION_FIELDS + ['job_id']]
+        if unknown:
+            raise ValueError(f"Job {i} in {manifest} has unknown fields {unknown}")
+        job['job_id'] = str(job.get('job_id', Path(job['admin_raster']).stem))
+    return jobs
+
+
+def _parse_cell(value):
+    """Returns CSV cell converted to bool/int/float where it looks like one"""
+    if value.lower() in ('true', 'false'):
+        return value.lower() == 'true'
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def job_size(job):
+    """Returns number of pixels in the job's admin raster (0 if it can't be opened), used to schedule largest first"""
+    try:
+        with rasterio.open(job['admin_raster']) as src:
+            return src.width * src.height
+    except rasterio.errors.RasterioIOError:
+        return 0
+
+
+def run_job(job):
+    """
+    Runs a single manifest job and returns its status (runs in the worker process)
+
+    Parameters:
+    -----------
+    job :   (dict)
+        Job from read_manifest
+
+    Returns:
+    --------
+    status  :   (dict)
+        job_id, status ('done'/'failed'), seconds and error (traceback) of the job
+    """
+    from .aggregate_units import AggregateUnits
+    start = time.perf_counter()
+    try:
+        kwargs = {k: Path(v) if v is not None else None for k, v in job.items() if k in PATH_FIELDS} #null outputs are skipped
+        kwargs.update({k: v for k, v in job.items() if k in OPTION_FIELDS})
+        AggregateUnits(**kwargs)._aggregate()
+        status, error = 'done', ''
+    except Exception:
+        status, error = 'failed', traceback.format_exc()
+    return {'job_id': job['job_id'], 'status': status, 'seconds': round(time.perf_counter() - start, 3), 'error': error}
+
+
+def _limit_memory(memory_limit):
+    """Worker initialiser capping the address space of the worker process (bytes)"""
+    import resource
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def run_batch(jobs, max_workers=None, memory_limit=None, retries=1, status_path=None):
+    """
+    Runs jobs on a process pool, largest admin raster first, retrying failed jobs and writing a per-job status summary
+
+    Parameters:
+    -----------
+    jobs    :   (list/Path/str)
+        List of job dicts or path to a manifest (see read_manifest)
+    max_workers :   (int) - Optional: Default = None
+        Number of worker processes (Default = all cores)
+    memory_limit    :   (int) - Optional: Default = None
+        Address space cap per worker process in bytes (jobs exceeding it fail with MemoryError and are retried)
+    retries :   (int) - Optional: Default = 1
+        Number of times a failed job is re-run
+    status_path :   (Path/str) - Optional: Default = None
+        Path to write the status summary to (.json or .csv)
+
+    Returns:
+    --------
+    statuses    :   (list)
+        Status dict of every job (job_id, status, attempts, seconds, error) in manifest order
+    """
+    if not isinstance(jobs, list):
+        jobs = read_manifest(jobs)
+    max_workers = max_workers or os.cpu_count()
+    order = {job['job_id']: i for i, job in enumerate(jobs)}
+    if len(order) != len(jobs):
+        raise ValueError("job_id must be unique within a batch")
+    pending = sorted(jobs, key=job_size, reverse=True)
+    statuses = {}
+    for attempt in range(1, retries + 2):
+        if not pending:
+            break
+        failed = []
+        #New pool per attempt: a worker killed by the OS breaks the whole pool
+        initializer, initargs = (_limit_memory, (memory_limit,)) if memory_limit else (None, ())
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=initializer, initargs=initargs) as pool:
+            futures = {pool.submit(run_job, job): job for job in pending}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    status = future.result()
+                except BrokenProcessPool:
+                    status = {'job_id': job['job_id'], 'status': 'failed', 'seconds': None,
+                              'error': 'Worker process died (out of memory or killed)'}
+                status['attempts'] = attempt
+                statuses[job['job_id']] = status
+                if status['status'] != 'done':
+                    failed.append(job)
+        pending = sorted(failed, key=job_size, reverse=True)
+    statuses = sorted(statuses.values(), key=lambda x: order[x['job_id']])
+    if status_path:
+        write_status(statuses, status_path)
+    return statuses
+
+
+def write_status(statuses, status_path):
+    """
+    Writes status summary of a batch to .json or .csv
+
+    Parameters:
+    -----------
+    statuses    :   (list)
+        Status dicts from run_batch
+    status_path :   (Path/str)
+        Output path
+
+    Returns:
+    --------
+    None
+    """
+    status_path = Path(status_path)
+    if status_path.suffix.lower() == '.json':
+        with open(status_path, 'w') as f:
+            json.dump(statuses, f, indent=2)
+    else:
+        with open(status_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=STATUS_FIELDS)
+            writer.writeheader()
+            writer.writerows(statuses)
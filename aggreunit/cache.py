@@ -0,0 +1,218 @@
+"""
+Content-addressed on-disk cache of intermediate pipeline artifacts (polygonised units, per-unit area, adjacency)
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+
+import numpy as np
+
+from .adjacency import AdjacencyGraph
+
+CHUNK_SIZE = 2 ** 22
+
+
+def file_digest(path, chunk_size=CHUNK_SIZE):
+    """
+    Returns sha256 hex digest of a file's content
+
+    Parameters:
+    -----------
+    path    :   (Path/str)
+        Path to file
+    chunk_size  :   (int)
+        Bytes read at a time
+
+    Returns:
+    --------
+    digest  :   (str)
+    """
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class ArtifactCache:
+    """
+    Cache of pipeline artifacts keyed by content hashes of the input rasters. Units are stored as GeoParquet, area and
+    adjacency as .npz. Digests are remembered by (path, size, mtime) so unchanged rasters are only hashed once, and the
+    least recently used artifacts are evicted once the cache grows past max_bytes.
+    """
+    def __init__(self, directory, max_bytes=None):
+        """
+        Instantiation
+
+        Parameters:
+        -----------
+        directory   :   (Path/str)
+            Cache directory (created if missing)
+        max_bytes   :   (int)
+            Size bound of the cache. Unbounded when None
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def digest(self, path):
+        """
+        Returns content digest of path, reusing the stored digest if the file's size and mtime are unchanged
+
+        Parameters:
+        -----------
+        path    :   (Path/str)
+            Path to input file
+
+        Returns:
+        --------
+        digest  :   (str)
+        """
+        path = Path(path).resolve()
+        stat = path.stat()
+        index_path = self.directory.joinpath('digests.json')
+        with self._lock:
+            index = json.loads(index_path.read_text()) if index_path.exists() else {}
+            entry = index.get(str(path))
+            if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                return entry['digest']
+        digest = file_digest(path)
+        with self._lock:
+            index = json.loads(index_path.read_text()) if index_path.exists() else {}
+            index[str(path)] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'digest': digest}
+            self._write(index_path, lambda f: f.write(json.dumps(index).encode()))
+        return digest
+
+    def key(self, kind, *paths, **params):
+        """
+        Returns cache key of an artifact made from the content of paths with params
+
+        Parameters:
+        -----------
+        kind    :   (str)
+            Artifact kind ('units', 'area', 'adjacency')
+        paths   :   (Path/str)
+            Input files the artifact is computed from
+        params  :   (dict)
+            Parameters changing the artifact
+
+        Returns:
+        --------
+        key :   (str)
+        """
+        payload = json.dumps({'kind': kind, 'inputs': [self.digest(x) for x in paths], 'params': params}, sort_keys=True)
+        return f'{kind}-{hashlib.sha256(payload.encode()).hexdigest()[:32]}'
+
+    def units(self, admin_raster, compute, coverage=False):
+        """
+        Returns polygonised units of admin_raster from the cache, or compute() them and store them
+
+        Parameters:
+        -----------
+        admin_raster    :   (Path/str)
+            Path to admin unit raster
+        compute :   (callable)
+            Called without arguments to make the geodataframe on a cache miss
+        coverage    :   (Boolean)
+            Units are polygonised as a noded coverage (raster_to_polygon(coverage=True)), cached apart from the others
+
+        Returns:
+        --------
+        gdf :   (gpd.GeoDataFrame)
+        """
+        import geopandas as gpd
+        path = self.directory.joinpath(f"{self.key('units', admin_raster, coverage=bool(coverage))}.parquet")
+        if self._hit(path):
+            return gpd.read_parquet(path)
+        gdf = compute()
+        self._store(path, lambda f: gdf.to_parquet(f, index=False))
+        return gdf
+
+    def area(self, admin_raster, area_raster, compute):
+        """
+        Returns (ids, sums) of area per admin unit from the cache, or compute() and store them
+
+        Parameters:
+        -----------
+        admin_raster    :   (Path/str)
+            Path to admin unit raster
+        area_raster :   (Path/str)
+            Path to pixel area raster
+        compute :   (callable)
+            Called without arguments to make (ids, sums) on a cache miss (e.g. zonal_sum)
+
+        Returns:
+        --------
+        ids :   (np.ndarray)
+        sums    :   (np.ndarray)
+        """
+        path = self.directory.joinpath(f"{self.key('area', admin_raster, area_raster)}.npz")
+        if self._hit(path):
+            with np.load(path) as arrays:
+                return arrays['ids'], arrays['sums']
+        ids, sums = compute()
+        self._store(path, lambda f: np.savez(f, ids=ids, sums=sums))
+        return ids, sums
+
+    def adjacency(self, admin_raster, compute):
+        """
+        Returns AdjacencyGraph of admin_raster from the cache, or compute() and store it
+
+        Parameters:
+        -----------
+        admin_raster    :   (Path/str)
+            Path to admin unit raster
+        compute :   (callable)
+            Called without arguments to make the graph on a cache miss
+
+        Returns:
+        --------
+        graph   :   (AdjacencyGraph)
+        """
+        path = self.directory.joinpath(f"{self.key('adjacency', admin_raster)}.npz")
+        if self._hit(path):
+            return AdjacencyGraph.load(path)
+        graph = compute()
+        self._store(path, graph.save)
+        return graph
+
+    def size(self):
+        """Returns total size (bytes) of the cached artifacts"""
+        return sum(x.stat().st_size for x in self._artifacts())
+
+    def _artifacts(self):
+        return [x for x in self.directory.iterdir() if x.suffix in ('.parquet', '.npz')]
+
+    def _hit(self, path):
+        """Returns True if path is cached, marking it as recently used"""
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _write(self, path, write):
+        """Writes path atomically through write(file)"""
+        tmp = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(tmp, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+
+    def _store(self, path, write):
+        """Stores a new artifact then evicts least recently used ones until the cache fits max_bytes"""
+        self._write(path, write)
+        if self.max_bytes is None:
+            return
+        with self._lock:
+            artifacts = sorted(self._artifacts(), key=lambda x: x.stat().st_mtime_ns)
+            total = sum(x.stat().st_size for x in artifacts)
+            for artifact in artifacts:
+                if total <= self.max_bytes:
+                    break
+                if artifact == path:
+                    continue
+                total -= artifact.stat().st_size
+                artifact.unlink(missing_ok=True)
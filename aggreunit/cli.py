@@ -0,0 +1,151 @@
+"""
+Command line entry point (aggreunit run / batch / worker / submit)
+
+Usage:
+    aggreunit run ADMIN_RASTER POPULATION_TABLE AREA_RASTER --out-table pop_A.csv --stages labels table --work-dir work
+    aggreunit run ADMIN_RASTER POPULATION_TABLE AREA_RASTER --out-raster admin_A.tif --work-dir work --resume
+    aggreunit batch manifest.csv --workers 4 --memory-limit 8G --status status.json
+    aggreunit worker spool --max-countries 8 --cache-dir cache --threads 8
+    aggreunit submit spool manifest.csv
+"""
+import argparse
+import os
+from pathlib import Path
+import sys
+
+UNITS = {'': 1, 'K': 2 ** 10, 'M': 2 ** 20, 'G': 2 ** 30, 'T': 2 ** 40}
+
+
+def parse_bytes(value):
+    """Parses a byte count with an optional K/M/G/T suffix (e.g. '8G')"""
+    value = value.strip().upper().rstrip('B')
+    suffix = value[-1] if value and value[-1] in UNITS else ''
+    return int(float(value[:len(value) - len(suffix)]) * UNITS[suffix])
+
+
+def parse_target(value):
+    """Parses target units as an int, or a float fraction between 0 and 1"""
+    number = float(value)
+    return number if 0 < number < 1 else int(number)
+
+
+def set_limits(threads=None, memory_limit=None):
+    """
+    Caps the threads used by GDAL/NumPy backends and the address space of this process
+
+    Parameters:
+    -----------
+    threads :   (int)
+        Number of threads (GDAL_NUM_THREADS, OMP/BLAS thread pools)
+    memory_limit    :   (int)
+        Address space cap in bytes (allocations past it raise MemoryError)
+
+    Returns:
+    --------
+    None
+    """
+    if threads:
+        for name in ('GDAL_NUM_THREADS', 'OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+            os.environ[name] = str(threads)
+    if memory_limit:
+        from .batch import _limit_memory
+        _limit_memory(memory_limit)
+
+
+def build_parser():
+    from .aggregate_units import OUTPUT_STAGES, PIPELINE_STAGES
+    parser = argparse.ArgumentParser(prog='aggreunit', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='Aggregate the admin units of one mastergrid')
+    run.add_argument('admin_raster', type=Path, help='Subnational admin unit raster (mastergrid)')
+    run.add_argument('population_table', type=Path, help='Population csv with a GID column')
+    run.add_argument('area_raster', type=Path, help='Pixel area raster')
+    run.add_argument('--out-raster', type=Path, help='Aggregated admin raster (skipped when omitted)')
+    run.add_argument('--out-table', type=Path, help='Aggregated population csv (skipped when omitted)')
+    run.add_argument('--out-shapefile', type=Path, help='Aggregated admin units, any vector suffix (skipped when omitted)')
+    run.add_argument('--simplify', type=float, help='Coverage simplification tolerance of --out-shapefile (CRS units)')
+    run.add_argument('--precision', type=float, help='Grid size the --out-shapefile coordinates are snapped to (CRS units)')
+    run.add_argument('--lods', type=float, nargs='+', help='Tolerances of coarser levels of detail (<stem>_lod1, <stem>_lod2...)')
+    run.add_argument('--out-label-map', type=Path, help='adm_id -> label LabelMap .npz (skipped when omitted)')
+    run.add_argument('--label-map', type=Path, help='Apply a stored LabelMap instead of labelling')
+    run.add_argument('--ppp-raster', type=Path, help='People-per-pixel raster validated against the census totals')
+    run.add_argument('--out-validation', type=Path, help='Per-unit validation csv (Default = <out-table>_validation.csv)')
+    run.add_argument('--stages', nargs='+', choices=PIPELINE_STAGES, help=f'Stages to run (Default = {" ".join(OUTPUT_STAGES)})')
+    run.add_argument('--work-dir', type=Path, help='Directory intermediates and the run state are persisted to')
+    run.add_argument('--resume', action='store_true', help='Reuse intermediates and finished outputs in --work-dir')
+    run.add_argument('--cache-dir', type=Path, help='ArtifactCache shared between runs')
+    run.add_argument('--raster-method', choices=['rasterize', 'tiled', 'remap'], default='remap')
+    run.add_argument('--target-units', type=parse_target, help='Number (or fraction) of aggregated units')
+    run.add_argument('--pop-col', default='B_Tot', help='Population column used for density')
+    run.add_argument('--table-columns', nargs='+', help='Columns summed into --out-table (Default = --pop-col)')
+    run.add_argument('--table-pattern', help='Regular expression selecting more columns for --out-table')
+    run.add_argument('--max-pixels', type=int, help='Window budget in pixels')
+    run.add_argument('--coverage-dissolve', action='store_true', help='Dissolve with parallel coverage union')
+    run.add_argument('--profile', type=Path, help='JSON-lines file of per-stage timings')
+    run.add_argument('--threads', type=int, help='Threads used by threaded stages and GDAL')
+    run.add_argument('--memory-limit', type=parse_bytes, help='Address space cap, e.g. 8G')
+
+    batch = commands.add_parser('batch', help='Run a manifest of jobs on a process pool')
+    batch.add_argument('manifest', type=Path, help='Manifest (.csv or .json, see aggreunit.read_manifest)')
+    batch.add_argument('--workers', type=int, help='Worker processes (Default = all cores)')
+    batch.add_argument('--memory-limit', type=parse_bytes, help='Address space cap per worker, e.g. 8G')
+    batch.add_argument('--retries', type=int, default=1)
+    batch.add_argument('--status', type=Path, help='Status summary (.json or .csv)')
+    batch.add_argument('--threads', type=int, help='Threads per worker for GDAL/NumPy backends')
+
+    worker = commands.add_parser('worker', help='Serve jobs from a spool directory, keeping prepared mastergrids in memory')
+    worker.add_argument('spool', type=Path, help='Spool directory (see aggreunit.worker)')
+    worker.add_argument('--max-countries', type=int, default=4, help='Prepared mastergrids kept in memory')
+    worker.add_argument('--cache-dir', type=Path, help='ArtifactCache for mastergrids not in memory')
+    worker.add_argument('--max-jobs', type=int, help='Exit after this many jobs')
+    worker.add_argument('--idle-timeout', type=float, help='Exit after this many seconds without jobs')
+    worker.add_argument('--threads', type=int, help='Threads used by threaded stages and GDAL')
+    worker.add_argument('--memory-limit', type=parse_bytes, help='Address space cap, e.g. 8G')
+
+    submit = commands.add_parser('submit', help='Queue the jobs of a manifest in a worker spool')
+    submit.add_argument('spool', type=Path, help='Spool directory of the worker(s)')
+    submit.add_argument('manifest', type=Path, help='Manifest (.csv or .json, see aggreunit.read_manifest)')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == 'batch':
+        set_limits(threads=args.threads) #Inherited by the workers, the memory limit is set per worker
+        from .batch import run_batch
+        statuses = run_batch(args.manifest, max_workers=args.workers, memory_limit=args.memory_limit, retries=args.retries,
+                             status_path=args.status)
+        failed = [x['job_id'] for x in statuses if x['status'] != 'done']
+        print(f"{len(statuses) - len(failed)}/{len(statuses)} jobs done" + (f", failed: {' '.join(map(str, failed))}" if failed else ''))
+        return 1 if failed else 0
+    if args.command == 'submit':
+        from .batch import read_manifest
+        from .worker import submit_job
+        for job in read_manifest(args.manifest):
+            print(submit_job(args.spool, job))
+        return 0
+    set_limits(threads=args.threads, memory_limit=args.memory_limit)
+    if args.command == 'worker':
+        from .worker import Worker
+        statuses = Worker(args.spool, max_countries=args.max_countries, cache_dir=args.cache_dir, num_threads=args.threads).serve(
+            max_jobs=args.max_jobs, idle_timeout=args.idle_timeout)
+        print(f"{sum(x['status'] == 'done' for x in statuses)}/{len(statuses)} jobs done")
+        return 0
+    from .aggregate_units import AggregateUnits
+    agg = AggregateUnits(args.admin_raster, args.population_table, args.area_raster, args.out_raster, args.out_table, args.out_shapefile,
+                         max_pixels=args.max_pixels, raster_method=args.raster_method, num_threads=args.threads,
+                         target_units=args.target_units, coverage_dissolve=args.coverage_dissolve, cache_dir=args.cache_dir,
+                         profile_path=args.profile, pop_col=args.pop_col, table_columns=args.table_columns,
+                         table_pattern=args.table_pattern, out_label_map=args.out_label_map, label_map=args.label_map,
+                         ppp_raster=args.ppp_raster, out_validation_table=args.out_validation, shape_tolerance=args.simplify,
+                         shape_precision=args.precision, shape_lods=args.lods)
+    agg.run(stages=args.stages, work_dir=args.work_dir, resume=args.resume)
+    print(agg.report)
+    if agg.validation is not None:
+        print(' '.join(f'{key}={value:.6g}' for key, value in agg.validation.items()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
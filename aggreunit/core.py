@@ -0,0 +1,18 @@
+"""
+Raster-only core of aggreunit, depending on NumPy and rasterio alone: windowed reading, dense id indexing, zonal sums,
+adjacency graphs, labelling/merge hierarchies, ensembles, lookup-table remapping, label maps, validation metrics, the
+artifact cache and profiling. Importing it (or aggreunit itself) doesn't load pandas, geopandas, shapely or fiona; the
+vector functions are loaded on first use
+"""
+from .windows import *
+from .id_index import *
+from .profiling import *
+from .adjacency import *
+from .labelling import *
+from .hierarchy import *
+from .ensemble import *
+from .zonal import *
+from .remap import *
+from .cache import *
+from .label_map import *
+from .validation import *
@@ -0,0 +1,242 @@
+"""
+Ensembles of randomised aggregations (perturbed densities, random tie-breaking, different targets) run on a process pool
+over a single shared-memory copy of the neighbour graph and unit attributes
+"""
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import os
+
+import numpy as np
+
+from .hierarchy import MergeHierarchy, build_hierarchy
+from .labelling import pair_units
+
+_WORKER = {} #Shared arrays attached by a pool worker
+
+
+class SharedArrays:
+    """
+    Named numpy arrays copied once into shared memory blocks. Workers attach to them through the picklable spec instead
+    of receiving a copy of every array with every task
+    """
+    def __init__(self, arrays):
+        """
+        Instantiation
+
+        Parameters:
+        -----------
+        arrays  :   (dict)
+            Name -> np.ndarray to share
+        """
+        self.arrays = {}
+        self._blocks = []
+        try:
+            for name, arr in arrays.items():
+                arr = np.ascontiguousarray(arr)
+                block = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+                self._blocks.append(block)
+                shared = np.ndarray(arr.shape, dtype=arr.dtype, buffer=block.buf)
+                shared[...] = arr
+                self.arrays[name] = shared
+        except BaseException:
+            self.close()
+            raise
+
+    @property
+    def spec(self):
+        """Picklable {name: (block name, shape, dtype)} used by attach()"""
+        return {name: (block.name, arr.shape, arr.dtype.str) for (name, arr), block in zip(self.arrays.items(), self._blocks)}
+
+    @staticmethod
+    def attach(spec):
+        """
+        Returns (arrays, blocks) viewing the shared blocks of spec (blocks must stay referenced while the arrays are used)
+
+        Parameters:
+        -----------
+        spec    :   (dict)
+            SharedArrays.spec of the owning process
+
+        Returns:
+        --------
+        arrays  :   (dict)
+        blocks  :   (list)
+        """
+        arrays, blocks = {}, []
+        for name, (block_name, shape, dtype) in spec.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks.append(block)
+            arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        return arrays, blocks
+
+    def close(self):
+        """Frees the shared blocks (arrays must not be used afterwards)"""
+        self.arrays = {}
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def reorder_rows(indptr, indices, order):
+    """
+    Returns (indptr, indices) of the neighbour list with rows put in the given order and every neighbour list re-sorted by
+    the new row positions (as expected by pair_units/build_hierarchy)
+
+    Parameters:
+    -----------
+    indptr  :   (np.ndarray)
+        Row pointer of the neighbour list
+    indices :   (np.ndarray)
+        Neighbour row positions
+    order   :   (np.ndarray)
+        Old row position of every new row
+
+    Returns:
+    --------
+    indptr  :   (np.ndarray)
+    indices :   (np.ndarray)
+        int32 neighbour positions in the new row order
+    """
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    degree = np.diff(indptr)
+    new_indptr = np.concatenate([[0], np.cumsum(degree[order])]).astype(np.int64)
+    rows = np.repeat(rank, degree)
+    cols = rank[indices]
+    return new_indptr, cols[np.lexsort((cols, rows))].astype(np.int32)
+
+
+def ensemble_member(arrays, member, seed=0, noise=0.0, target_units=None):
+    """
+    Returns int32 labels (id of the aggregated unit every unit belongs to) of one randomised aggregation. Densities are
+    multiplied by exp(noise * N(0, 1)), ties are broken at random and units are paired once (as get_labels) or merged
+    hierarchically down to target_units (as get_target_labels). The result only depends on (seed, member)
+
+    Parameters:
+    -----------
+    arrays  :   (dict)
+        'ids', 'indptr', 'indices', 'density' (and 'population', 'area' for target_units) of the units
+    member  :   (int)
+        Ensemble member number
+    seed    :   (int)
+        Seed of the ensemble
+    noise   :   (float)
+        Standard deviation of the log-normal density perturbation (0 keeps densities)
+    target_units    :   (int/float)
+        Number (or fraction, if between 0 and 1) of aggregated units. A single pairing pass when None
+
+    Returns:
+    --------
+    labels  :   (np.ndarray)
+    """
+    rng = np.random.default_rng([seed, member])
+    ids = arrays['ids']
+    n = len(ids)
+    density = arrays['density']
+    if noise:
+        density = density * np.exp(noise * rng.standard_normal(n))
+    order = np.lexsort((rng.random(n), -density)) #Most dense first, random tie-breaking
+    indptr, indices = reorder_rows(arrays['indptr'], arrays['indices'], order)
+    ordered_ids = ids[order]
+    if target_units is None:
+        codes = np.arange(n, dtype=np.int32)
+        zero_label = np.flatnonzero(ordered_ids == 0)
+        required_number_of_units = round(n - n * 0.5)
+        positions = pair_units(indptr, indices, codes.copy(), codes, np.zeros(n, dtype=bool), required_number_of_units,
+                               zero_label=zero_label[0] if len(zero_label) else -1)[0]
+    else:
+        if 0 < target_units < 1:
+            target_units = round(n * target_units)
+        merges = build_hierarchy(indptr, indices, arrays['population'][order], arrays['area'][order], target_units=target_units,
+                                 density=density[order], excluded=ordered_ids == 0)
+        hierarchy = MergeHierarchy(ordered_ids, merges)
+        positions = hierarchy.positions(max(int(target_units), hierarchy.min_units))
+    labels = np.empty(n, dtype=np.int32)
+    labels[order] = ordered_ids[positions]
+    return labels
+
+
+def _attach_worker(spec):
+    _WORKER['arrays'], _WORKER['blocks'] = SharedArrays.attach(spec)
+
+
+def _run_members(members, seed, noise, targets):
+    """Writes the labels of members into the shared 'labels' matrix of the worker"""
+    arrays = _WORKER['arrays']
+    for member in members:
+        arrays['labels'][member] = ensemble_member(arrays, member, seed=seed, noise=noise, target_units=targets[member])
+    return len(members)
+
+
+def run_ensemble(ids, indptr, indices, density, n_members, seed=0, noise=0.0, target_units=None, population=None, area=None,
+                 max_workers=None):
+    """
+    Returns (n_members, n_units) int32 matrix of randomised aggregations (see ensemble_member) computed on a process pool.
+    The graph, densities and the output matrix live in shared memory, so every worker reads one copy and writes its rows
+    in place
+
+    Parameters:
+    -----------
+    ids :   (np.ndarray)
+        Admin unit ids (int32 mastergrid values, 0 = water is never paired)
+    indptr  :   (np.ndarray)
+        Row pointer of the neighbour list (e.g. from AdjacencyGraph.row_neighbours(ids))
+    indices :   (np.ndarray)
+        Neighbour positions
+    density :   (np.ndarray)
+        Population density of every unit
+    n_members   :   (int)
+        Number of aggregations
+    seed    :   (int)
+        Seed of the ensemble (member m uses the stream (seed, m), independently of the pool layout)
+    noise   :   (float)
+        Standard deviation of the log-normal density perturbation
+    target_units    :   (int/float/list)
+        Target number (or fraction) of units of every member, or one per member. A single pairing pass when None
+    population  :   (np.ndarray)
+        Population of every unit (required with target_units)
+    area    :   (np.ndarray)
+        Area of every unit (required with target_units)
+    max_workers :   (int)
+        Number of processes (Default = all cores). 1 runs in this process
+
+    Returns:
+    --------
+    labels  :   (np.ndarray)
+        Row m holds the label (aggregated unit id) of every unit in member m
+    """
+    targets = list(target_units) if np.ndim(target_units) else [target_units] * n_members
+    if len(targets) != n_members:
+        raise ValueError(f"Got {len(targets)} target_units for {n_members} members")
+    if any(x is not None for x in targets) and (population is None or area is None):
+        raise ValueError("population and area are required with target_units")
+    n = len(ids)
+    arrays = {
+        'ids': np.asarray(ids, dtype=np.int32),
+        'indptr': np.asarray(indptr, dtype=np.int64),
+        'indices': np.asarray(indices, dtype=np.int32),
+        'density': np.nan_to_num(np.asarray(density, dtype=np.float64), nan=0.0),
+    }
+    if population is not None and area is not None:
+        arrays['population'] = np.asarray(population, dtype=np.float64)
+        arrays['area'] = np.asarray(area, dtype=np.float64)
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or n_members <= 1:
+        return np.stack([ensemble_member(arrays, m, seed=seed, noise=noise, target_units=targets[m]) for m in range(n_members)]
+                        ) if n_members else np.empty((0, n), dtype=np.int32)
+    arrays['labels'] = np.zeros((n_members, n), dtype=np.int32)
+    with SharedArrays(arrays) as shared:
+        chunk = max(1, -(-n_members // (max_workers * 4)))
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_attach_worker, initargs=(shared.spec,)) as pool:
+            futures = [pool.submit(_run_members, range(start, min(start + chunk, n_members)), seed, noise, targets)
+                       for start in range(0, n_members, chunk)]
+            for future in futures:
+                future.result()
+        return shared.arrays['labels'].copy()
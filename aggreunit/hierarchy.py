@@ -0,0 +1,165 @@
+"""
+Target-count hierarchical aggregation of admin units driven by a density keyed priority queue
+"""
+import heapq
+
+import numpy as np
+
+
+class MergeHierarchy:
+    """
+    Sequence of merges of seed admin units. Every merge absorbs one cluster into another and the surviving cluster keeps the
+    label (id) of its anchor seed, so the aggregation at any number of units is the first n_seeds - n_units merges.
+    """
+    def __init__(self, ids, merges):
+        """
+        Instantiation
+
+        Parameters:
+        -----------
+        ids :   (np.ndarray)
+            Seed admin unit ids
+        merges  :   (np.ndarray)
+            (m, 2) array of (anchor position, absorbed anchor position) into ids, in merge order
+        """
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.merges = np.asarray(merges, dtype=np.int32).reshape(-1, 2)
+
+    def __len__(self):
+        return len(self.merges)
+
+    @property
+    def n_seeds(self):
+        return len(self.ids)
+
+    @property
+    def min_units(self):
+        """Smallest number of units reachable (more than 1 if the graph has islands or excluded units)"""
+        return self.n_seeds - len(self.merges)
+
+    def positions(self, n_units=None):
+        """
+        Returns position of the anchor seed of every seed's cluster once the units are reduced to n_units
+
+        Parameters:
+        -----------
+        n_units :   (int) - Optional: Default = None
+            Number of units to cut the hierarchy at (Default = min_units)
+
+        Returns:
+        --------
+        anchors :   (np.ndarray)
+            Anchor position for every seed
+        """
+        n_units = self.min_units if n_units is None else n_units
+        if not self.min_units <= n_units <= self.n_seeds:
+            raise ValueError(f"n_units must be between {self.min_units} and {self.n_seeds}, got {n_units}")
+        merges = self.merges[:self.n_seeds - n_units]
+        parent = np.arange(self.n_seeds, dtype=np.int32)
+        parent[merges[:, 1]] = merges[:, 0]
+        #Pointer jumping until every seed points at its root
+        while True:
+            grand_parent = parent[parent]
+            if np.array_equal(grand_parent, parent):
+                return parent
+            parent = grand_parent
+
+    def labels(self, n_units=None):
+        """
+        Returns the label (anchor id) of every seed once the units are reduced to n_units
+
+        Parameters:
+        -----------
+        n_units :   (int) - Optional: Default = None
+            Number of units to cut the hierarchy at (Default = min_units)
+
+        Returns:
+        --------
+        labels  :   (np.ndarray)
+            Label for every seed in ids order
+        """
+        return self.ids[self.positions(n_units)]
+
+
+def build_hierarchy(indptr, indices, population, area, target_units=1, density=None, excluded=None):
+    """
+    Returns the merge hierarchy of units aggregated round by round until target_units units are left. The heap is keyed on
+    (round, -density): in every round the most dense unmerged cluster is merged with its most dense neighbour that has not
+    been merged in the same round, mirroring get_labels (a single round halves the number of units). Merged clusters get
+    the summed population/area, the union of both neighbour sets and are queued for the next round.
+
+    Parameters:
+    -----------
+    indptr  :   (np.ndarray)
+        Row pointer of the neighbour list of the n units (e.g. from AdjacencyGraph.row_neighbours)
+    indices :   (np.ndarray)
+        Neighbour positions
+    population  :   (np.ndarray)
+        Population of every unit
+    area    :   (np.ndarray)
+        Area of every unit
+    target_units    :   (int) - Optional: Default = 1
+        Stop once this many units are left (1 builds the full hierarchy)
+    density :   (np.ndarray) - Optional: Default = None
+        Seed density of every unit (Default = population / area)
+    excluded    :   (np.ndarray) - Optional: Default = None
+        bool mask of units never merged (e.g. water, id 0)
+
+    Returns:
+    --------
+    merges  :   (np.ndarray)
+        (m, 2) int32 array of (anchor position, absorbed anchor position) in merge order
+    """
+    n = len(population)
+    population = np.asarray(population, dtype=np.float64).copy()
+    area = np.asarray(area, dtype=np.float64).copy()
+    if density is None:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            density = population / area
+    density = np.nan_to_num(np.asarray(density, dtype=np.float64), nan=0.0)
+    excluded = np.zeros(n, dtype=bool) if excluded is None else np.asarray(excluded, dtype=bool)
+    active = ~excluded
+    merged_round = np.full(n, -1, dtype=np.int64) #Round in which a cluster was last formed
+    version = np.zeros(n, dtype=np.int64) #Only the latest heap entry of a cluster is live
+    indptr = indptr.tolist()
+    neighbours = [set(indices[indptr[i]:indptr[i + 1]].tolist()) for i in range(n)]
+    for i in np.flatnonzero(excluded):
+        for j in neighbours[i]:
+            neighbours[j].discard(i)
+        neighbours[i] = set()
+    heap = [(0, -density[i], i, 0) for i in np.flatnonzero(active).tolist()]
+    heapq.heapify(heap)
+    merges = []
+    n_units = n
+    while heap and n_units > target_units:
+        current_round, _, c, entry_version = heapq.heappop(heap)
+        if not active[c] or entry_version != version[c]:
+            continue #Stale entry
+        candidates = [p for p in neighbours[c] if merged_round[p] < current_round]
+        if not candidates:
+            if neighbours[c]:
+                version[c] += 1
+                heapq.heappush(heap, (current_round + 1, -density[c], c, version[c])) #Wait for the next round
+            continue
+        partner = min(candidates, key=lambda p: (-density[p], p))
+        #Absorb partner into c: repoint partner's neighbours, then union into the larger of the two sets
+        absorbed = neighbours[partner]
+        for q in absorbed:
+            if q != c:
+                neighbours[q].discard(partner)
+                neighbours[q].add(c)
+        if len(absorbed) > len(neighbours[c]):
+            absorbed, neighbours[c] = neighbours[c], absorbed
+        neighbours[c] |= absorbed
+        neighbours[c] -= {c, partner}
+        neighbours[partner] = set()
+        active[partner] = False
+        population[c] += population[partner]
+        area[c] += area[partner]
+        density[c] = population[c] / area[c] if area[c] else 0.0
+        merged_round[c] = current_round
+        merges.append((c, partner))
+        n_units -= 1
+        version[c] += 1
+        heapq.heappush(heap, (current_round + 1, -density[c], c, version[c]))
+    return np.array(merges, dtype=np.int32).reshape(-1, 2)
@@ -0,0 +1,104 @@
+"""
+Dense indexing of sparse admin unit ids: ids (e.g. 9-digit codes) are factorised once into codes 0..n-1 held in a sorted
+array, so per-unit arrays, bincounts and joins are sized by the number of units rather than by the largest id
+"""
+import numpy as np
+
+
+class IdIndex:
+    """Sorted unique admin unit ids; the dense code of an id is its position, looked up with np.searchsorted"""
+    def __init__(self, ids, assume_unique=False):
+        """
+        Instantiation
+
+        Parameters:
+        -----------
+        ids :   (array-like)
+            Admin unit ids (any order, repeats allowed)
+        assume_unique   :   (Boolean)
+            ids are already sorted and unique (e.g. AdjacencyGraph.ids), so they are not factorised again
+        """
+        ids = np.asarray(ids).astype(np.int64, copy=False).ravel()
+        self.ids = ids if assume_unique else np.unique(ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def find(self, ids):
+        """
+        Returns (codes, found) of every id (codes are only meaningful where found)
+
+        Parameters:
+        -----------
+        ids :   (array-like)
+            Admin unit ids of any shape
+
+        Returns:
+        --------
+        codes   :   (np.ndarray)
+            Dense code of every id
+        found   :   (np.ndarray)
+            Boolean array, True where the id is in the index
+        """
+        ids = np.asarray(ids).astype(np.int64, copy=False)
+        if len(self.ids) == 0:
+            return np.zeros(ids.shape, dtype=np.int64), np.zeros(ids.shape, dtype=bool)
+        codes = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+        return codes, self.ids[codes] == ids
+
+    def codes(self, ids):
+        """
+        Returns dense code of every id (-1 where the id is not in the index)
+
+        Parameters:
+        -----------
+        ids :   (array-like)
+            Admin unit ids of any shape
+
+        Returns:
+        --------
+        codes   :   (np.ndarray)
+        """
+        codes, found = self.find(ids)
+        return np.where(found, codes, -1)
+
+    def rows(self, ids):
+        """
+        Returns position in ids of every indexed id (-1 where it is missing from ids). Indexing a column of a table
+        whose key column is ids with it aligns the column to the dense codes
+
+        Parameters:
+        -----------
+        ids :   (array-like)
+            Key column of a table (unique)
+
+        Returns:
+        --------
+        rows    :   (np.ndarray)
+        """
+        codes = self.codes(ids)
+        rows = np.full(len(self.ids), -1, dtype=np.int64)
+        keep = codes >= 0
+        rows[codes[keep]] = np.flatnonzero(keep)
+        return rows
+
+
+def join_rows(left, right):
+    """
+    Returns row of right holding every value of left (-1 where missing): a left join of two key columns as integer
+    array lookups
+
+    Parameters:
+    -----------
+    left    :   (array-like)
+        Keys to look up
+    right   :   (array-like)
+        Key column of the joined table (unique)
+
+    Returns:
+    --------
+    rows    :   (np.ndarray)
+    """
+    index = IdIndex(right)
+    rows = np.append(index.rows(right), -1) #Code -1 (missing) picks the trailing -1
+    return rows[index.codes(left)]
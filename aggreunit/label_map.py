@@ -0,0 +1,125 @@
+"""
+Stored aggregation (old admin unit id -> aggregated label) with provenance, so the same aggregation can be reapplied to
+new population releases of the same mastergrid
+"""
+import datetime
+import json
+
+import numpy as np
+
+from .cache import file_digest
+
+
+class LabelMap:
+    """Old admin unit id -> aggregated label mapping plus provenance (mastergrid digest, options, creation time)"""
+    def __init__(self, ids, labels, provenance=None):
+        """
+        Instantiation
+
+        Parameters:
+        -----------
+        ids :   (array-like)
+            Admin unit ids of the mastergrid (unique)
+        labels  :   (array-like)
+            Aggregated label of every id
+        provenance  :   (dict)
+            JSON-serialisable description of how the labels were made
+        """
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.labels = np.asarray(labels, dtype=np.int64)
+        if self.ids.shape != self.labels.shape:
+            raise ValueError("ids and labels must have the same length")
+        if len(np.unique(self.ids)) != len(self.ids):
+            raise ValueError("Label map ids must be unique")
+        self.provenance = dict(provenance or {})
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def n_units(self):
+        """Number of aggregated units"""
+        return len(np.unique(self.labels))
+
+    @classmethod
+    def from_gdf(cls, gdf, admin_raster=None, digest=None, **provenance):
+        """
+        Returns label map of a labelled geodataframe (index = adm_id, column 'labels', e.g. from get_labels)
+
+        Parameters:
+        -----------
+        gdf :   (gpd.GeoDataFrame)
+            Labelled admin units
+        admin_raster    :   (Path/str)
+            Mastergrid the units were polygonised from, recorded with its content digest
+        digest  :   (str)
+            Precomputed sha256 of admin_raster (hashed when None)
+        provenance  :   (dict)
+            Any further JSON-serialisable details (population table, options...)
+
+        Returns:
+        --------
+        label_map   :   (LabelMap)
+        """
+        provenance['created'] = datetime.datetime.now().isoformat(timespec='seconds')
+        if admin_raster is not None:
+            provenance['admin_raster'] = str(admin_raster)
+            provenance['admin_digest'] = digest or file_digest(admin_raster)
+        return cls(gdf.index.to_numpy(), gdf['labels'].to_numpy(), provenance)
+
+    def to_frame(self):
+        """Returns pd.DataFrame with index adm_id and column 'labels' (accepted by aggr_table)"""
+        import pandas as pd
+        return pd.DataFrame({'labels': self.labels}, index=pd.Index(self.ids, name='adm_id'))
+
+    def check(self, admin_raster, digest=None):
+        """
+        Raises ValueError if admin_raster is not the mastergrid the label map was made from (by content)
+
+        Parameters:
+        -----------
+        admin_raster    :   (Path/str)
+            Mastergrid the labels are about to be applied to
+        digest  :   (str)
+            Precomputed sha256 of admin_raster (hashed when None)
+
+        Returns:
+        --------
+        None
+        """
+        expected = self.provenance.get('admin_digest')
+        if expected is not None and (digest or file_digest(admin_raster)) != expected:
+            raise ValueError(f"{admin_raster} differs from the mastergrid the label map was made from "
+                             f"({self.provenance.get('admin_raster')})")
+
+    def save(self, path):
+        """
+        Saves ids, labels and provenance to an .npz file
+
+        Parameters:
+        -----------
+        path    :   (Path/str)
+            Output path
+
+        Returns:
+        --------
+        None
+        """
+        np.savez_compressed(path, ids=self.ids, labels=self.labels, provenance=np.array(json.dumps(self.provenance)))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Returns label map saved with save()
+
+        Parameters:
+        -----------
+        path    :   (Path/str)
+            Path to .npz file
+
+        Returns:
+        --------
+        label_map   :   (LabelMap)
+        """
+        with np.load(path) as arrays:
+            return cls(arrays['ids'], arrays['labels'], json.loads(str(arrays['provenance'])))
@@ -0,0 +1,67 @@
+"""
+Array-backed pairing of admin units with their most dense neighbours
+"""
+import numpy as np
+
+
+def pair_units(indptr, indices, labels, own_labels, paired, required_number_of_units, zero_label=-1):
+    """
+    Returns labels/paired arrays after greedily pairing every unpaired unit (in row order) with its first unpaired neighbour.
+    Rows are expected to be sorted by density (most dense first) and every neighbour list sorted by row position, so the
+    first unpaired neighbour is the most dense one.
+
+    Parameters:
+    -----------
+    indptr  :   (np.ndarray)
+        Row pointer of the neighbour list (length n + 1)
+    indices :   (np.ndarray)
+        Neighbour row positions, sorted within every row
+    labels  :   (np.ndarray)
+        int32 label code of every row (updated in place)
+    own_labels  :   (np.ndarray)
+        int32 label code each row gives to itself and its neighbour when it is paired (i.e. the code of the row's id)
+    paired  :   (np.ndarray)
+        bool flag of every row (updated in place)
+    required_number_of_units    :   (int)
+        Pairing stops once the number of distinct labels has dropped to this value
+    zero_label  :   (int) - Optional: Default = -1
+        Label code of id 0 (water). Rows with this label are never paired
+
+    Returns:
+    --------
+    labels  :   (np.ndarray)
+        Label code of every row
+    paired  :   (np.ndarray)
+        Paired flag of every row
+    n_units :   (int)
+        Number of distinct labels left
+    finished    :   (Boolean)
+        True if pairing stopped because the required number of units was reached
+    """
+    #Running count of rows per label code so the number of distinct labels is tracked in O(1)
+    counts = np.bincount(labels, minlength=max(int(labels.max(initial=-1)), int(own_labels.max(initial=-1))) + 1)
+    n_units = int(np.count_nonzero(counts))
+    paired[labels == zero_label] = True
+    indptr = indptr.tolist()
+    for row in range(len(labels)):
+        if n_units <= required_number_of_units:
+            return labels, paired, n_units, True
+        if labels[row] == zero_label or paired[row]:
+            continue
+        for neighbour in indices[indptr[row]:indptr[row + 1]]:
+            #Join up unit with neighbour if not paired before
+            if not paired[neighbour]:
+                paired[row] = True
+                paired[neighbour] = True
+                for member in (row, neighbour):
+                    old, new = labels[member], own_labels[row]
+                    if old != new:
+                        counts[old] -= 1
+                        if counts[old] == 0:
+                            n_units -= 1
+                        if counts[new] == 0:
+                            n_units += 1
+                        counts[new] += 1
+                        labels[member] = new
+                break
+    return labels, paired, n_units, False
@@ -0,0 +1,183 @@
+"""
+Per-stage timing and memory instrumentation of the aggregation pipeline
+"""
+from contextlib import contextmanager
+import json
+import sys
+import threading
+import time
+import warnings
+
+try:
+    import resource
+except ImportError: #Windows
+    resource = None
+
+
+def peak_rss():
+    """Returns peak resident set size of the process in bytes (None where it can't be measured)"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024 #kB on Linux
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return getattr(info, 'peak_wset', info.rss)
+
+
+class StageRecord:
+    """Measurements of one pipeline stage"""
+    def __init__(self, name, pipeline=None):
+        """
+        Instantiation
+
+        Parameters:
+        -----------
+        name    :   (str)
+            Stage name
+        pipeline    :   (str)
+            Name of the pipeline run the stage belongs to (e.g. admin raster name)
+        """
+        self.name = name
+        self.pipeline = pipeline
+        self.started = time.time()
+        self.seconds = None
+        self.process_peak_rss = None #Peak RSS of the whole process when the stage ended
+        self.rss_growth = None #How much the stage raised that peak (0 if it stayed below an earlier stage's peak)
+        self.rows = None
+        self.pixels = None
+        self.error = None
+
+    def to_dict(self):
+        return {
+            'pipeline': self.pipeline,
+            'stage': self.name,
+            'started': self.started,
+            'seconds': self.seconds,
+            'process_peak_rss': self.process_peak_rss,
+            'rss_growth': self.rss_growth,
+            'rows': self.rows,
+            'pixels': self.pixels,
+            'error': self.error,
+        }
+
+
+class PipelineReport:
+    """Ordered stage records of a pipeline run"""
+    def __init__(self, stages=None):
+        self.stages = list(stages or [])
+
+    def __iter__(self):
+        return iter(self.stages)
+
+    def __len__(self):
+        return len(self.stages)
+
+    def __getitem__(self, name):
+        for record in self.stages:
+            if record.name == name:
+                return record
+        raise KeyError(name)
+
+    @property
+    def total_seconds(self):
+        return sum(x.seconds or 0 for x in self.stages)
+
+    def to_dicts(self):
+        return [x.to_dict() for x in self.stages]
+
+    def __str__(self):
+        lines = [f"{'stage':<20}{'seconds':>10}{'peak MB':>10}{'+MB':>8}{'rows':>10}{'pixels':>14}"]
+        for x in self.stages:
+            peak = f'{x.process_peak_rss / 2 ** 20:.0f}' if x.process_peak_rss else '-'
+            growth = f'{x.rss_growth / 2 ** 20:.0f}' if x.rss_growth is not None else '-'
+            lines.append(f"{x.name:<20}{x.seconds or 0:>10.2f}{peak:>10}{growth:>8}{x.rows if x.rows is not None else '-':>10}"
+                         f"{x.pixels if x.pixels is not None else '-':>14}")
+        lines.append(f"{'total':<20}{self.total_seconds:>10.2f}")
+        return '\n'.join(lines)
+
+
+class Profiler:
+    """
+    Records wall time, process peak RSS (and how much each stage raised it) and row/pixel counts of pipeline stages into a
+    PipelineReport, optionally appending every record to a JSON-lines file and passing it to registered hooks (e.g. to
+    feed a metrics system). The peak is a process high-water mark: stages running at the same time (concurrent output
+    writes) share their growth, and a stage below an earlier peak shows no growth
+    """
+    def __init__(self, pipeline=None, jsonl_path=None, hooks=None):
+        """
+        Instantiation
+
+        Parameters:
+        -----------
+        pipeline    :   (str)
+            Name written with every record
+        jsonl_path  :   (Path/str)
+            File every finished stage is appended to as one JSON line (optional)
+        hooks   :   (list)
+            Callables receiving each finished StageRecord
+        """
+        self.pipeline = pipeline
+        self.jsonl_path = jsonl_path
+        self.hooks = list(hooks or [])
+        self.report = PipelineReport()
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        """
+        Registers hook(record) called after every stage
+
+        Parameters:
+        -----------
+        hook    :   (callable)
+            Receives the finished StageRecord
+        """
+        self.hooks.append(hook)
+
+    @contextmanager
+    def stage(self, name, rows=None, pixels=None):
+        """
+        Context manager timing a stage. The yielded StageRecord can be updated in the block (e.g. record.rows = len(gdf))
+
+        Parameters:
+        -----------
+        name    :   (str)
+            Stage name
+        rows    :   (int)
+            Number of rows (units) processed, if known up front
+        pixels  :   (int)
+            Number of pixels processed, if known up front
+
+        Returns:
+        --------
+        record  :   (StageRecord)
+        """
+        record = StageRecord(name, self.pipeline)
+        record.rows, record.pixels = rows, pixels
+        peak_before = peak_rss()
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record.error = repr(e)
+            raise
+        finally:
+            record.seconds = time.perf_counter() - start
+            record.process_peak_rss = peak_rss()
+            if record.process_peak_rss is not None and peak_before is not None:
+                record.rss_growth = max(0, record.process_peak_rss - peak_before)
+            with self._lock: #Stages may run on several threads (e.g. concurrent output writes)
+                self.report.stages.append(record)
+                self._emit(record)
+
+    def _emit(self, record):
+        if self.jsonl_path:
+            with open(self.jsonl_path, 'a') as f:
+                f.write(json.dumps(record.to_dict()) + '\n')
+        for hook in self.hooks:
+            try:
+                hook(record)
+            except Exception as e: #A broken metrics hook shouldn't kill a long aggregation
+                warnings.warn(f"Profiler hook {hook!r} failed: {e!r}")
@@ -1,13 +1,21 @@
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import os
+import threading
+
 import geopandas as gpd
 import pandas as pd 
 from rasterstats import zonal_stats 
 import fiona
 from rasterio import features
+from rasterio.windows import bounds as window_bounds, transform as window_transform
+from shapely.geometry import box
 
 import rasterio
 import numpy as np
 
+from .vector_io import read_vector
+
 class RasterizeAdminUnits:
     """Rasterize input gdf, snapping to input raster and saving to output name"""
     def __init__(self, gdf, raster, out_name):
@@ -27,7 +35,7 @@ class RasterizeAdminUnits:
         self.out_name = out_name
         if not isinstance(self.gdf, gpd.GeoDataFrame):
             try:
-                self.gdf = gpd.read_file(self.gdf)
+                self.gdf = read_vector(self.gdf)
             except:
                 raise Error("There is a problem with the input Shapefile/geodataframe")
 
@@ -69,4 +77,53 @@ class RasterizeAdminUnits:
                 out_arr = dst.read(1)
                 out_arr = out_arr.astype(np.int32)
                 burned = features.rasterize(shapes=geometries, fill=src.nodata, out=out_arr, out_shape=(kwargs['height'],kwargs['width']), transform=src.transform)
-                dst.write(burned, 1)
\ No newline at end of file
+                dst.write(burned, 1)
+
+    def rasterize_tiled(self, blocksize=256, num_threads=None):
+        """
+        Rasterizes geometries into a tiled output block by block. Only geometries intersecting a block (found with the
+        spatial index) are burned into it, blocks are processed on a thread pool and GDAL compresses tiles in parallel, so
+        memory stays flat whatever the raster size
+
+        Parameters:
+        blocksize (int) : Tile width/height of the output raster (multiple of 16)
+        num_threads (int) : Number of worker threads (Default = os.cpu_count())
+
+        Returns:
+        None
+        """
+        num_threads = num_threads or os.cpu_count()
+        self.gdf = self.gdf.reset_index()
+        geometries = self.gdf['geometry'].values
+        values = self.gdf['adm_id'].to_numpy()
+        sindex = self.gdf.sindex #Build once before the threads query it
+        with rasterio.open(str(self.raster)) as src:
+            kwargs = src.meta.copy()
+            kwargs.update({
+                'driver': 'GTiff',
+                'compress': 'lzw',
+                'dtype': 'int32',
+                'tiled': True,
+                'blockxsize': blocksize,
+                'blockysize': blocksize,
+                'num_threads': str(num_threads)
+            })
+            fill = src.nodata if src.nodata is not None else 0
+            transform = src.transform
+            with rasterio.open(str(self.out_name), 'w', **kwargs) as dst:
+                lock = threading.Lock()
+                windows = [window for _, window in dst.block_windows(1)]
+
+                def burn(window):
+                    #Keep gdf order so overlapping geometries burn as in rasterize_geometries
+                    hits = np.sort(sindex.query(box(*window_bounds(window, transform))))
+                    if len(hits):
+                        burned = features.rasterize(shapes=zip(geometries[hits], values[hits]), fill=fill, out_shape=(window.height, window.width),
+                                                    transform=window_transform(window, transform), dtype='int32')
+                    else:
+                        burned = np.full((window.height, window.width), fill, dtype=np.int32)
+                    with lock: #Dataset handles are not thread safe, only touch dst under the lock
+                        dst.write(burned, 1, window=window)
+
+                with ThreadPoolExecutor(max_workers=num_threads) as pool:
+                    list(pool.map(burn, windows))
@@ -0,0 +1,142 @@
+"""
+Write aggregated admin rasters by remapping mastergrid ids through a lookup table (no vector round-trip)
+"""
+from contextlib import ExitStack
+
+import numpy as np
+import rasterio
+
+from .id_index import IdIndex
+from .windows import DEFAULT_WINDOW_PIXELS, iter_windows
+from .zonal import _valid, grids_align
+
+
+class LookupTable:
+    """Old id -> new label lookup applied to whole arrays: ids are dense coded by an IdIndex, labels held per code"""
+    def __init__(self, ids, labels):
+        """
+        Instantiation
+
+        Parameters:
+        -----------
+        ids :   (array-like)
+            Admin unit ids of the input mastergrid (unique)
+        labels  :   (array-like)
+            Aggregated label of every id
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        self.index = IdIndex(ids)
+        if len(self.index) != len(ids):
+            raise ValueError("Lookup table ids must be unique")
+        self.ids = self.index.ids
+        self.labels = np.asarray(labels, dtype=np.int64)[self.index.rows(ids)]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def apply(self, arr, fill):
+        """
+        Returns arr with every id replaced by its label. Values missing from the table are set to fill
+
+        Parameters:
+        -----------
+        arr :   (np.ndarray)
+            Array of admin unit ids
+        fill    :   (int)
+            Value used for ids not in the table
+
+        Returns:
+        --------
+        out :   (np.ndarray)
+            Array of labels (int64)
+        """
+        positions, found = self.find(arr)
+        if positions is None:
+            return np.full(arr.shape, fill, dtype=np.int64)
+        return np.where(found, self.labels[positions], fill)
+
+    def find(self, arr):
+        """
+        Returns (positions, found) of every value of arr in the sorted ids (positions is None if the table is empty)
+
+        Parameters:
+        -----------
+        arr :   (np.ndarray)
+            Array of admin unit ids
+
+        Returns:
+        --------
+        positions   :   (np.ndarray)
+            Index into self.ids/self.labels (only meaningful where found)
+        found   :   (np.ndarray)
+            Boolean array, True where the value is in the table
+        """
+        if len(self.ids) == 0:
+            return None, np.zeros(arr.shape, dtype=bool)
+        return self.index.find(arr)
+
+
+def remap_raster(admin_raster, ids, labels, out_raster, max_pixels=DEFAULT_WINDOW_PIXELS, value_raster=None):
+    """
+    Writes out_raster with every pixel of admin_raster replaced by the label of its id, window by window. Pixel-exact:
+    no geometries are dissolved or rasterised. Nodata pixels and ids missing from ids are written as nodata.
+    If value_raster is given, its valid pixels are summed per label in the same pass (e.g. population of a constrained
+    mastergrid remapped to the unconstrained aggregation)
+
+    Parameters:
+    -----------
+    admin_raster    :   (Path/str)
+        Path to admin unit raster (mastergrid)
+    ids :   (array-like)
+        Admin unit ids
+    labels  :   (array-like)
+        Aggregated label of every id
+    out_raster  :   (Path/str)
+        Path to output raster (None only sums value_raster per label)
+    max_pixels  :   (int) - Optional: Default = DEFAULT_WINDOW_PIXELS
+        Pixel budget of each window
+    value_raster    :   (Path/str) - Optional: Default = None
+        Path to raster on the same grid as admin_raster whose values are summed per label
+
+    Returns:
+    --------
+    zonal   :   (tuple/None)
+        (labels, sums) of value_raster per label (sorted, NaN where a label has no valid pixels), None without value_raster
+    """
+    lookup = LookupTable(ids, labels)
+    if value_raster is not None and not grids_align(admin_raster, value_raster):
+        raise ValueError(f"{value_raster} is not on the same grid as {admin_raster}")
+    label_set = np.unique(lookup.labels)
+    sums = np.zeros(len(label_set), dtype=np.float64)
+    counts = np.zeros(len(label_set), dtype=np.int64)
+    with ExitStack() as stack:
+        src = stack.enter_context(rasterio.open(str(admin_raster)))
+        values = stack.enter_context(rasterio.open(str(value_raster))) if value_raster is not None else None
+        kwargs = src.meta.copy()
+        kwargs.update({
+            'driver': 'GTiff',
+            'compress': 'lzw',
+            'dtype': 'int32',
+            'count': 1
+        })
+        nodata = src.nodata
+        fill = nodata if nodata is not None else 0
+        dst = stack.enter_context(rasterio.open(str(out_raster), 'w', **kwargs)) if out_raster is not None else None
+        for window in iter_windows(src, max_pixels):
+            arr = src.read(1, window=window)
+            positions, found = lookup.find(arr)
+            if nodata is not None:
+                found &= arr != nodata
+            out_arr = np.where(found, lookup.labels[positions], fill) if positions is not None else np.full(arr.shape, fill)
+            if dst is not None:
+                dst.write(out_arr.astype(np.int32), 1, window=window)
+            if values is not None:
+                value_arr = values.read(1, window=window)
+                valid = found & _valid(value_arr, values.nodata)
+                label_pos = np.searchsorted(label_set, out_arr[valid])
+                sums += np.bincount(label_pos, weights=value_arr[valid].astype(np.float64), minlength=len(label_set))
+                counts += np.bincount(label_pos, minlength=len(label_set))
+    if value_raster is None:
+        return None
+    sums[counts == 0] = np.nan
+    return label_set, sums
@@ -1,7 +1,10 @@
 """
 Helper functions
 """
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path 
+import os
+import re
 import warnings
 
 import geopandas as gpd
@@ -12,10 +15,20 @@ with warnings.catch_warnings():
     from rasterstats import zonal_stats #Deprecation warning for collections.abc import in this module
 import rasterio
 from rasterio.features import shapes
+from rasterio.transform import Affine
+import shapely
 
+from .adjacency import AdjacencyGraph
+from .ensemble import run_ensemble
+from .hierarchy import MergeHierarchy, build_hierarchy
+from .id_index import IdIndex, join_rows
+from .labelling import pair_units
 from .rasterize_geoms import RasterizeAdminUnits
+from .vector_io import DEFAULT_BATCH_SIZE, read_vector, write_vector
+from .windows import iter_windows
+from .zonal import grids_align, zonal_sum
 
-def raster_to_polygon(raster, out_shp=None):
+def raster_to_polygon(raster, out_shp=None, max_pixels=None, coverage=False, n_jobs=None):
     """
     Returns GeoDataFrame of polygonisation of raster and saves GeoDataFrame to out_shp
 
@@ -24,25 +37,51 @@ def raster_to_polygon(raster, out_shp=None):
     raster: (Path/str)
         Path to input raster to polygonise
     out_shp:    (Path/str) - Optional: Default = None
-        Path to output polygone shape
+        Path to output polygone shape. The format is picked from the suffix (.shp, .gpkg, .fgb, .geojson, .parquet)
+    max_pixels  :   (int) - Optional: Default = None
+        If set, the first band is streamed through windows of at most ~max_pixels pixels (aligned to the raster blocks) and
+        pieces of the same adm_id split by window seams are merged by the dissolve. Bounds peak memory by the window budget
+        rather than the raster size
+    coverage    :   (Boolean) - Optional: Default = False
+        Node the polygons along pixel edges and dissolve with coverage union (see coverage_dissolve) instead of a general
+        unary union. The output is a noded coverage too, so it can be dissolved again with coverage=True
+    n_jobs  :   (int) - Optional: Default = None
+        Number of threads used by the coverage dissolve (Default = all cores)
 
     Returns:
     --------
     gdf :   (gpd.GeoDataFrame)
         Geodataframe of polygonised version of input raster 
     """
-    mask = None
     with rasterio.Env():
         with rasterio.open(raster) as src:
-            image = src.read().astype(np.int32)# first band
-            mask = image != src.nodata
-            results = ({'properties': {'adm_id': v}, 'geometry': s}   for i, (s, v) in enumerate(shapes(image, mask=mask, transform=src.transform)))
-            geoms = list(results)
-    gdf = gpd.GeoDataFrame.from_features(geoms, crs='EPSG:4326').dissolve(by='adm_id')
+            transform = src.transform
+            #Polygonised in pixel coordinates, so every pixel corner has one exact value across windows
+            if max_pixels is None:
+                image = src.read().astype(np.int32)# first band
+                mask = image != src.nodata
+                geoms = [{'properties': {'adm_id': v}, 'geometry': s} for s, v in shapes(image, mask=mask)]
+            else:
+                geoms = []
+                for window in iter_windows(src, max_pixels):
+                    image = src.read(1, window=window).astype(np.int32)
+                    mask = image != src.nodata
+                    offset = Affine.translation(window.col_off, window.row_off)
+                    geoms.extend({'properties': {'adm_id': v}, 'geometry': s} for s, v in shapes(image, mask=mask, transform=offset))
+    gdf = gpd.GeoDataFrame.from_features(geoms, columns=['adm_id', 'geometry'], crs='EPSG:4326')
+    pixel_geoms = np.asarray(gdf.geometry.values)
+    if coverage:
+        pixel_geoms = _node_coverage(pixel_geoms) #Noded along pixel edges, as the coverage union expects
+    world = lambda xy: np.column_stack(transform * (xy[:, 0], xy[:, 1]))
+    gdf = gdf.set_geometry(gpd.GeoSeries(shapely.transform(pixel_geoms, world), index=gdf.index, crs=gdf.crs))
+    if coverage:
+        gdf = coverage_dissolve(gdf, 'adm_id', n_jobs=n_jobs)
+    else:
+        gdf = gdf.dissolve(by='adm_id')
     gdf = gdf.reset_index()
     if out_shp:
-        if not out_shp.exists():
-            gdf.to_file(out_shp, index=False)
+        if not Path(out_shp).exists():
+            write_vector(gdf, out_shp, index=False)
         else:
             raise FileExistsError(f"{out_shp} exists. Please delete before creating new shapefile")
     return gdf
@@ -60,24 +99,27 @@ def join_population_to_shp(shp, csv, shp_id='adm_id', csv_id='GID', pop_col='P_2
         Column in shapefile used for join (Default -> 'adm_id')
     csv_id  :   (str)
         Column in csv used for join (Default -> 'GID')
+    pop_col :   (str/list)
+        Population column (or list of columns) joined (Default -> 'P_2020')
 
     """
     if not isinstance(shp, gpd.GeoDataFrame):
-        gdf = gpd.read_file(shp)
+        gdf = read_vector(shp)
     else:
         gdf = shp
-    gdf = gdf[[x for x in gdf.columns if not x == pop_col]].set_index(shp_id)
-    df = pd.read_csv(csv)
-    df[shp_id] = df[csv_id]
-    df_cols = [shp_id, pop_col]
-    df = df[df_cols].set_index(shp_id)
-    gdf_pop = gpd.GeoDataFrame(gdf.join(df))
+    df, cols = read_population_table(csv, csv_id, pop_col)
+    gdf = gdf[[x for x in gdf.columns if not x in cols]].set_index(shp_id)
+    rows = join_rows(gdf.index, df[csv_id]) #Table row of every unit (-1 = not in table)
+    joined = df[cols].iloc[np.maximum(rows, 0)].set_axis(gdf.index) if len(df) else pd.DataFrame(np.nan, index=gdf.index, columns=cols)
+    if (rows < 0).any():
+        joined = joined.where(pd.Series(rows >= 0, index=gdf.index), axis=0)
+    gdf_pop = gpd.GeoDataFrame(pd.concat([gdf, joined], axis=1), geometry=gdf.geometry.name, crs=gdf.crs)
     if not isinstance(shp, gpd.GeoDataFrame):
-        gdf_pop.to_file(shp)
+        write_vector(gdf_pop, shp)
     return gdf_pop
 
 #density to gdf
-def get_pop_density(shp, raster, out_shp=None, shp_index_col='adm_id', pop_col='P_2020'):
+def get_pop_density(shp, raster, out_shp=None, shp_index_col='adm_id', pop_col='P_2020', admin_raster=None, unit_area=None, num_threads=None):
     """
     Returns Geodataframe of admin units with population density appended
 
@@ -93,6 +135,13 @@ def get_pop_density(shp, raster, out_shp=None, shp_index_col='adm_id', pop_col='
         Shape column used in join (Default = 'adm_id')
     pop_col :   (str)
         Population column in shapefile
+    admin_raster    :   (Path/str) - Optional: Default = None
+        Path to admin unit raster the geometries were polygonised from. If it is aligned with raster, area is summed per unit
+        directly on the rasters (np.bincount) instead of re-rasterising every polygon with zonal_stats
+    unit_area   :   (tuple) - Optional: Default = None
+        Precomputed (ids, sums) of area per admin unit id (e.g. from zonal_sum or a cache). raster is not read when given
+    num_threads :   (int) - Optional: Default = None
+        Number of threads reading the raster blocks on the admin_raster path (Default = all cores)
 
     Returns:
     --------
@@ -100,22 +149,27 @@ def get_pop_density(shp, raster, out_shp=None, shp_index_col='adm_id', pop_col='
         Input geodataframe with population density column appended
     """
     if not isinstance(shp, gpd.GeoDataFrame):
-        gdf = gpd.read_file(shp)
+        gdf = read_vector(shp)
     else:
         gdf = shp
     gdf = gdf[[x for x in gdf.columns if not x in ['area', 'density', 'sum']]].reset_index()
-    with warnings.catch_warnings():
-        warnings.simplefilter('ignore') #Collections.abc deprecation warning in below function call
-        gdf_sum = zonal_stats(gdf, raster, stats=['sum'], geojson_out=True)
-    gdf_sum = gpd.GeoDataFrame.from_features(gdf_sum, crs="EPSG:4326")[['adm_id', 'sum']]
-    gdf_sum['area'] = gdf_sum['sum']
-    gdf_density = gpd.GeoDataFrame(gdf.set_index(shp_index_col).join(gdf_sum.set_index(shp_index_col)))
+    if unit_area is not None or (admin_raster is not None and grids_align(admin_raster, raster)):
+        unit_ids, unit_sums = unit_area if unit_area is not None else zonal_sum(admin_raster, raster, num_threads=num_threads)
+    else:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore') #Collections.abc deprecation warning in below function call
+            gdf_sum = zonal_stats(gdf, raster, stats=['sum'], geojson_out=True)
+        gdf_sum = gpd.GeoDataFrame.from_features(gdf_sum, crs="EPSG:4326")[['adm_id', 'sum']]
+        unit_ids, unit_sums = gdf_sum['adm_id'].to_numpy(), gdf_sum['sum'].to_numpy(dtype=np.float64)
+    gdf_density = gdf.set_index(shp_index_col)
+    rows = join_rows(gdf_density.index, unit_ids) #Area row of every unit (-1 = no area)
+    gdf_density['area'] = np.append(np.asarray(unit_sums, dtype=np.float64), np.nan)[rows]
     gdf_density['density'] = gdf_density[pop_col] / gdf_density['area']
     cols = [pop_col, 'area', 'density', 'geometry']
     gdf_density = gdf_density[cols]
     gdf_density = gdf_density.fillna(0)
     if out_shp:
-        gdf_density.to_file(out_shp)
+        write_vector(gdf_density, out_shp)
     return gdf_density
 
 def sort_by_density(gdf):
@@ -137,7 +191,7 @@ def sort_by_density(gdf):
     gdf['paired'] = False
     return gdf
 
-def get_labels(gdf):
+def get_labels(gdf, adjacency=None):
     """
     Returns geodataframe with 'labels' and 'columns' set according to most dense neighbours. Will loop through rows will complete once number of units have been reduced by ~50%
 
@@ -145,39 +199,169 @@ def get_labels(gdf):
     -----------
     gdf     :   (gpd.GeoDataFrame)
         Dataframe in which units will be matched with dense neighbours 
+    adjacency   :   (AdjacencyGraph) - Optional: Default = None
+        Neighbour graph of the admin units (e.g. AdjacencyGraph.from_raster(admin_raster)). Built from the geometries in gdf when None
 
     Returns:
     ---------
     gdf     :   (gpd.GeoDataFrame)
         Dataframe with units matched with their neighbours.
     """
+    if adjacency is None:
+        adjacency = AdjacencyGraph.from_geodataframe(gdf)
+    indptr, indices = adjacency.row_neighbours(gdf.index)
+    #Work on compact label codes and only write the columns back once pairing is done
+    n = len(gdf)
+    label_values, codes = np.unique(np.concatenate([gdf['labels'].to_numpy(), gdf.index.to_numpy()]), return_inverse=True)
+    codes = codes.astype(np.int32)
+    zero_label = np.flatnonzero(label_values == 0)
     required_number_of_units = round(len(gdf.labels.unique()) - (len(gdf.labels.unique()) * 0.5))
-    probs = 0
-    gdf.loc[gdf.labels == 0, 'labels'] = 0
-    gdf.loc[gdf.labels == 0, 'paired'] = True
-    for index, row in gdf.iterrows():
-        if len(gdf.labels.unique()) <= required_number_of_units:
-            print(f'{len(gdf.labels.unique())} admin units made. Finished')
-            break
-        if not gdf.loc[index, 'labels'] == 0:
-            if gdf.loc[index, 'paired'] == False:
-                paired = False
-                neighbour_df = gdf[gdf.geometry.touches(row['geometry'])]
-                #isplay(neighbour_df)
-                for i, neighbour in neighbour_df.iterrows():
-                    #Join up polygon with neighbour if not paired before
-                    if gdf.at[i, 'paired'] == False:
-                        gdf.at[index, 'paired'] = True
-                        gdf.at[i, 'paired'] = True
-                        gdf.at[index, 'labels'] = index
-                        gdf.at[i, 'labels'] = index
-                        paired = True
-                        break
+    labels, paired, n_units, finished = pair_units(indptr, indices, codes[:n].copy(), codes[n:], gdf['paired'].to_numpy(dtype=bool).copy(),
+                                                   required_number_of_units, zero_label=zero_label[0] if len(zero_label) else -1)
+    if finished:
+        print(f'{n_units} admin units made. Finished')
+    gdf['labels'] = label_values[labels]
+    gdf['paired'] = paired
     return gdf
 
-def aggr_table(csv, gdf, out_csv, pop_col='P_2020', index_col='GID'):
+def get_target_labels(gdf, target_units, adjacency=None, pop_col='P_2020'):
+    """
+    Returns geodataframe with 'labels' and 'paired' set by repeatedly merging the most dense units with their most dense
+    neighbours until target_units units are left, along with the full merge hierarchy (any other level can be cut from it
+    without recomputing)
+
+    Parameters:
+    -----------
+    gdf     :   (gpd.GeoDataFrame)
+        Density sorted dataframe (see sort_by_density) with pop_col, 'area' and 'density' columns
+    target_units    :   (int/float)
+        Number of units to aggregate to, or fraction of the seed units if between 0 and 1
+    adjacency   :   (AdjacencyGraph) - Optional: Default = None
+        Neighbour graph of the admin units. Built from the geometries in gdf when None
+    pop_col :   (str)
+        Population column in gdf (Default = 'P_2020')
+
+    Returns:
+    ---------
+    gdf     :   (gpd.GeoDataFrame)
+        Dataframe with units labelled by the aggregated unit they belong to
+    hierarchy   :   (MergeHierarchy)
+        Full merge hierarchy of the units in gdf
+    """
+    if adjacency is None:
+        adjacency = AdjacencyGraph.from_geodataframe(gdf)
+    if 0 < target_units < 1:
+        target_units = round(len(gdf) * target_units)
+    indptr, indices = adjacency.row_neighbours(gdf.index)
+    merges = build_hierarchy(indptr, indices, gdf[pop_col].to_numpy(), gdf['area'].to_numpy(), density=gdf['density'].to_numpy(),
+                             excluded=gdf.index.to_numpy() == 0)
+    hierarchy = MergeHierarchy(gdf.index, merges)
+    n_units = max(int(target_units), hierarchy.min_units)
+    positions = hierarchy.positions(n_units)
+    gdf['labels'] = hierarchy.ids[positions]
+    gdf['paired'] = (np.bincount(positions, minlength=len(positions))[positions] > 1) | (gdf.index.to_numpy() == 0)
+    print(f'{n_units} admin units made. Finished')
+    return gdf, hierarchy
+
+def get_ensemble_labels(gdf, n_members, adjacency=None, pop_col='P_2020', seed=0, noise=0.1, target_units=None, max_workers=None):
+    """
+    Returns (n_members, len(gdf)) int32 matrix of randomised aggregations of gdf (perturbed densities, random tie-breaking
+    and optionally different targets), run on a process pool sharing one copy of the neighbour graph (see run_ensemble)
+
+    Parameters:
+    -----------
+    gdf     :   (gpd.GeoDataFrame)
+        Admin units (index adm_id) with pop_col, 'area' and 'density' columns (e.g. from get_pop_density)
+    n_members   :   (int)
+        Number of aggregations
+    adjacency   :   (AdjacencyGraph) - Optional: Default = None
+        Neighbour graph of the admin units. Built from the geometries in gdf when None
+    pop_col :   (str)
+        Population column in gdf (Default = 'P_2020')
+    seed    :   (int)
+        Seed of the ensemble
+    noise   :   (float)
+        Standard deviation of the log-normal density perturbation (Default = 0.1)
+    target_units    :   (int/float/list)
+        Target number (or fraction) of units, or one per member. A single pairing pass (as get_labels) when None
+    max_workers :   (int)
+        Number of processes (Default = all cores)
+
+    Returns:
+    --------
+    labels  :   (np.ndarray)
+        Row m holds the aggregated unit id of every unit of gdf (in gdf order) in member m
     """
-    Updates population csv by summing populations based on aggregation
+    if adjacency is None:
+        adjacency = AdjacencyGraph.from_geodataframe(gdf)
+    indptr, indices = adjacency.row_neighbours(gdf.index)
+    return run_ensemble(gdf.index.to_numpy(), indptr, indices, gdf['density'].to_numpy(), n_members, seed=seed, noise=noise,
+                        target_units=target_units, population=gdf[pop_col].to_numpy(), area=gdf['area'].to_numpy(),
+                        max_workers=max_workers)
+
+def population_columns(columns, pop_col=None, pattern=None):
+    r"""
+    Returns list of population columns selected by name(s) and/or regex pattern, in table order
+
+    Parameters:
+    -----------
+    columns :   (list)
+        Columns of the population table
+    pop_col :   (str/list) - Optional: Default = None
+        Column name or list of column names
+    pattern :   (str) - Optional: Default = None
+        Regular expression matched (re.fullmatch) against every column name, e.g. r'[MF]_\d+_20(20|25)'
+
+    Returns:
+    --------
+    cols    :   (list)
+    """
+    names = [pop_col] if isinstance(pop_col, str) else list(pop_col or [])
+    missing = [x for x in names if x not in columns]
+    if missing:
+        raise KeyError(f"Population columns {missing} not in table")
+    regex = re.compile(pattern) if pattern is not None else None
+    cols = [x for x in columns if x in names or (regex is not None and regex.fullmatch(x))]
+    if not cols:
+        raise ValueError(f"No population columns selected by pop_col={pop_col!r}, pattern={pattern!r}")
+    return cols
+
+def read_population_table(csv, index_col='GID', pop_col=None, pattern=None):
+    """
+    Returns (df, cols) of the id column and the selected population columns of csv. Only those columns are parsed (with the
+    multi-threaded pyarrow parser when pyarrow is installed), so very wide tables stay cheap
+
+    Parameters:
+    -----------
+    csv :   (Path/str)
+        Path to population table
+    index_col   :   (str)
+        Id column (Default = 'GID')
+    pop_col :   (str/list)
+        Column name or list of column names
+    pattern :   (str)
+        Regular expression selecting more columns (see population_columns)
+
+    Returns:
+    --------
+    df  :   (pd.DataFrame)
+        Table with index_col and cols
+    cols    :   (list)
+        Selected population columns
+    """
+    header = pd.read_csv(csv, nrows=0).columns.tolist()
+    cols = population_columns([x for x in header if x != index_col], pop_col, pattern)
+    usecols = [index_col] + cols
+    try:
+        df = pd.read_csv(csv, usecols=usecols, engine='pyarrow')
+    except ImportError:
+        df = pd.read_csv(csv, usecols=usecols)
+    return df[usecols], cols
+
+def aggr_table(csv, gdf, out_csv, pop_col='P_2020', index_col='GID', pattern=None):
+    """
+    Updates population csv by summing populations based on aggregation. Units are joined by integer id lookups and every
+    selected column is summed with np.bincount over dense label codes
 
     Parameters:
     -----------
@@ -185,24 +369,39 @@ def aggr_table(csv, gdf, out_csv, pop_col='P_2020', index_col='GID'):
         Path to input pop csv
     gdf :   (gpd.GeoDataFrame)
         Geodataframe of aggregated admin units
-    pop_col :   (str)
-        Column in population table used for summing (Default = 'P_2020')
+    out_csv :   (Path/str)
+        Path to output csv (nothing is written when None)
+    pop_col :   (str/list)
+        Column (or list of columns) in population table used for summing (Default = 'P_2020')
     index_col   :   (str)
         Column in pop table used for index to aggregate (Default = 'GID')
+    pattern :   (str) - Optional: Default = None
+        Regular expression selecting more columns to sum (e.g. every age/sex band of every year)
 
     Returns:
     ----------
-    None    
+    df_sums :   (pd.DataFrame)
+        Table written to out_csv (index adm_id = aggregated label)
     """
-    df = pd.read_csv(csv)
-    if not 'adm_id' in df.columns:
-        df['adm_id'] = df[index_col]
-    df = df[['adm_id', pop_col]].set_index('adm_id')
-    gdf = gdf[['labels']]
-    df_joined = df.join(gdf).reset_index()
-    df_joined['adm_id'] = df_joined['labels']
-    df_joined = df_joined[['adm_id', pop_col]].groupby('adm_id').sum() #Aggregate admin units and sum populations
-    df_joined.to_csv(out_csv)
+    if 'adm_id' in pd.read_csv(csv, nrows=0).columns:
+        index_col = 'adm_id'
+    df, cols = read_population_table(csv, index_col, pop_col, pattern)
+    rows = join_rows(df[index_col], gdf.index)
+    found = rows >= 0 #Units not in gdf are dropped, as the join did
+    row_labels = gdf['labels'].to_numpy()[rows[found]]
+    label_index = IdIndex(row_labels) #Dense label codes, so the sums are sized by the number of aggregated units
+    codes = label_index.codes(row_labels)
+    values = np.nan_to_num(df[cols].to_numpy(dtype=np.float64)[found])
+    sums = np.zeros((len(label_index), len(cols)))
+    for i in range(len(cols)): #Aggregate admin units and sum populations
+        sums[:, i] = np.bincount(codes, weights=values[:, i], minlength=len(label_index))
+    df_sums = pd.DataFrame(sums, index=pd.Index(label_index.ids, name='adm_id'), columns=cols)
+    for col in cols:
+        if pd.api.types.is_integer_dtype(df[col].dtype):
+            df_sums[col] = df_sums[col].astype(df[col].dtype)
+    if out_csv is not None:
+        df_sums.to_csv(out_csv)
+    return df_sums
 
 def aggr_constrained_shp(unconstr_gdf, constr_gdf):
     """
@@ -213,22 +412,31 @@ def aggr_constrained_shp(unconstr_gdf, constr_gdf):
     unconstr_gdf    :   (gpd.GeoDataFrame)
         gdf of admin unit polygons with labels indicating how units will be aggregated BEFORE DISSOLVING (unconstr and constr should have the same number of rows)
     constr_gdf  :   (gpd.GeoDataFrame)
-        gdf polygonised from admin units covering ONLY areas that are 'built'.
+        gdf polygonised from admin units covering ONLY areas that are 'built'. If it has an 'adm_id' column, labels are
+        matched on it (units missing from unconstr_gdf are dropped) rather than by row position
 
     Retruns:
     ---------
     constr_gdf    :   (gpd.GeoDataFrame)
         Unconstrained geodataframe aggregated to same level (as indicated by the constrained labels) as constrained geodataframe
+
+    See AggregateUnits(constrained_raster=...) / remap_raster for the raster-domain version that needs no polygonisation
     """
-    constr_gdf = constr_gdf[['geometry']]
     unconstr_gdf = unconstr_gdf.reset_index()
-    constr_gdf['labels'] = unconstr_gdf['labels']
+    if 'adm_id' in constr_gdf.columns and 'adm_id' in unconstr_gdf.columns:
+        labels = constr_gdf['adm_id'].map(unconstr_gdf.set_index('adm_id')['labels'])
+        constr_gdf = constr_gdf[['geometry']].copy()
+        constr_gdf['labels'] = labels
+        constr_gdf = constr_gdf[constr_gdf['labels'].notna()]
+    else:
+        constr_gdf = constr_gdf[['geometry']]
+        constr_gdf['labels'] = unconstr_gdf['labels']
     constr_gdf['adm_id'] = constr_gdf['labels']
     constr_gdf = constr_gdf[['adm_id','geometry']]
     constr_gdf = constr_gdf.dissolve(by='adm_id')
     return constr_gdf
 
-def dissolve_admin_units(gdf):
+def dissolve_admin_units(gdf, coverage=False, n_jobs=None):
     """
     Returns input gdf with dissolved geometries based on identical values in 'adm_id'
 
@@ -236,6 +444,11 @@ def dissolve_admin_units(gdf):
     -----------
     gdf :   (gpd.GeoDataFrame)
         Geodataframe to dissolve with field of 'adm_id'
+    coverage    :   (Boolean) - Optional: Default = False
+        Dissolve with coverage union (see coverage_dissolve) instead of a general unary union. gdf must be a noded
+        coverage, e.g. units from raster_to_polygon(coverage=True)
+    n_jobs  :   (int) - Optional: Default = None
+        Number of threads used by the coverage dissolve (Default = all cores)
 
     Returns:
     ---------
@@ -244,23 +457,197 @@ def dissolve_admin_units(gdf):
     """	
     gdf = gdf.reset_index()
     gdf['adm_id'] = gdf['labels']
-    gdf = gdf.dissolve(by='adm_id')
+    if coverage:
+        gdf = coverage_dissolve(gdf, 'adm_id', n_jobs=n_jobs)
+    else:
+        gdf = gdf.dissolve(by='adm_id')
     return gdf
 
-def save_shapefile(gdf, outname):
-	"""Save shapefile to outname
+def _node_coverage(geoms):
+    """
+    Returns polygons with the vertices of their neighbours that lie on their axis-parallel edges inserted, so shared
+    borders have matching vertices on both sides (as coverage functions expect; GDAL polygonisation only keeps a
+    polygon's own corners along staircase borders). Vertices are matched by exact coordinates, as on pixel corners, and
+    edges that are not axis-parallel are left as they are
+    """
+    geoms = np.asarray(geoms, dtype=object)
+    present = ~(shapely.is_missing(geoms) | shapely.is_empty(geoms))
+    if not present.any():
+        return geoms
+    geom_type, coords, offsets = shapely.to_ragged_array(geoms[present])
+    ring_offsets = offsets[0]
+    #Vertices as ranks of their x and y, keyed row-wise (for horizontal edges) and column-wise (for vertical edges)
+    xs, xi = np.unique(coords[:, 0], return_inverse=True)
+    ys, yi = np.unique(coords[:, 1], return_inverse=True)
+    nx, ny = len(xs), len(ys)
+    row_keys = np.unique(yi * nx + xi)
+    col_keys = np.sort(row_keys % nx * ny + row_keys // nx)
+    #Edge i runs from vertex i to i + 1, except at the closing vertex of every ring
+    starts = np.ones(len(coords), dtype=bool)
+    starts[ring_offsets[1:] - 1] = False
+    edge = np.flatnonzero(starts)
+    a, b = edge, edge + 1
+    horizontal = (yi[a] == yi[b]) & (xi[a] != xi[b])
+    vertical = (xi[a] == xi[b]) & (yi[a] != yi[b])
+    lo = np.zeros(len(edge), dtype=np.int64)
+    hi = np.zeros(len(edge), dtype=np.int64)
+    for mask, keys, major, minor, n in ((horizontal, row_keys, yi, xi, nx), (vertical, col_keys, xi, yi, ny)):
+        low = major[a[mask]] * n + np.minimum(minor[a[mask]], minor[b[mask]])
+        high = major[a[mask]] * n + np.maximum(minor[a[mask]], minor[b[mask]])
+        lo[mask] = np.searchsorted(keys, low, side='right') #Vertices strictly inside the edge
+        hi[mask] = np.searchsorted(keys, high, side='left')
+    counts = np.zeros(len(coords), dtype=np.int64)
+    counts[edge] = hi - lo
+    if not counts.any():
+        return geoms
+    #Every vertex is followed by those inserted on the edge it starts, in the direction of the edge
+    position = np.concatenate([[0], np.cumsum(1 + counts)])
+    out = np.empty((position[-1], coords.shape[1]))
+    out[position[:-1]] = coords
+    inserted = np.repeat(np.arange(len(edge)), hi - lo)
+    rank = np.arange(len(inserted)) - np.repeat(np.cumsum(hi - lo) - (hi - lo), hi - lo)
+    forward = np.where(horizontal, xi[a] < xi[b], yi[a] < yi[b])[inserted]
+    key = np.where(forward, lo[inserted] + rank, hi[inserted] - 1 - rank)
+    row = horizontal[inserted]
+    key = np.where(row, row_keys[np.minimum(key, len(row_keys) - 1)], col_keys[np.minimum(key, len(col_keys) - 1)])
+    out_rows = position[edge[inserted]] + 1 + rank
+    out[out_rows, 0] = np.where(row, xs[key % nx], xs[key // ny])
+    out[out_rows, 1] = np.where(row, ys[key // nx], ys[key % ny])
+    noded = shapely.from_ragged_array(geom_type, out, (position[ring_offsets],) + tuple(offsets[1:]))
+    single = shapely.get_type_id(geoms[present]) == shapely.GeometryType.POLYGON
+    if geom_type == shapely.GeometryType.MULTIPOLYGON and single.any(): #Mixed input comes back as multipolygons
+        noded[single] = shapely.get_geometry(noded[single], 0)
+    geoms = geoms.copy()
+    geoms[present] = noded
+    return geoms
+
+def coverage_dissolve(gdf, by, n_jobs=None):
+    """
+    Returns gdf dissolved by column 'by' using coverage union, for polygons that tile the plane without overlaps and
+    whose shared edges match vertex for vertex (e.g. raster_to_polygon(coverage=True) output, noded along pixel edges).
+    Shared edges are dropped instead of running a general overlay, and groups are unioned in parallel chunks. Other
+    columns keep their first value (as in GeoDataFrame.dissolve)
+
+    Parameters:
+    -----------
+    gdf :   (gpd.GeoDataFrame)
+        Geodataframe forming a noded polygon coverage
+    by  :   (str)
+        Column to dissolve by
+    n_jobs  :   (int) - Optional: Default = None
+        Number of threads (Default = all cores)
+
+    Returns:
+    ---------
+    gdf :   (gpd.GeoDataFrame)
+        Dissolved geodataframe indexed by 'by'
+
+    Raises:
+    -------
+    ValueError
+        If GEOS rejects a group (polygons not noded or overlapping). Use GeoDataFrame.dissolve for such input
+    """
+    n_jobs = n_jobs or os.cpu_count()
+    gdf = gdf[gdf[by].notna()]
+    codes = pd.factorize(gdf[by], sort=True)[0]
+    order = np.argsort(codes, kind='stable')
+    geoms = np.asarray(gdf.geometry.values)
+    groups = np.split(geoms[order], np.flatnonzero(np.diff(codes[order])) + 1)
+
+    def union_chunk(chunk):
+        try:
+            return [shapely.coverage_union_all(group) for group in chunk]
+        except shapely.errors.GEOSException as err:
+            raise ValueError(f"Polygons do not form a noded coverage ({err})") from err
+
+    chunk_size = max(1, len(groups) // (n_jobs * 4))
+    chunks = [groups[i:i + chunk_size] for i in range(0, len(groups), chunk_size)]
+    with ThreadPoolExecutor(max_workers=n_jobs) as pool: #GEOS releases the GIL
+        dissolved = [geom for chunk in pool.map(union_chunk, chunks) for geom in chunk]
+    geom_col = gdf.geometry.name
+    data = pd.DataFrame(gdf.drop(columns=[geom_col])).groupby(by).first() #Sorted by key, same order as groups
+    data.insert(0, geom_col, gpd.GeoSeries(dissolved, index=data.index, crs=gdf.crs))
+    return gpd.GeoDataFrame(data, geometry=geom_col, crs=gdf.crs)
+
+def compact_coverage(gdf, tolerance=None, precision=None, noded=False):
+    """
+    Returns copy of a polygon coverage (e.g. polygonised or dissolved admin units) with fewer vertices: simplified
+    across the whole coverage, so every shared border is simplified once and stays identical on both sides, then snapped
+    to a precision grid. Before simplifying, the neighbours' vertices are inserted along shared axis-parallel borders
+    (coverage simplification needs matching vertices on both sides), so with a tolerance below the pixel size the output
+    can have more vertices than gdf. Only snapping to precision does not node
+
+    Parameters:
+    -----------
+    gdf :   (gpd.GeoDataFrame)
+        Geodataframe forming a polygon coverage
+    tolerance   :   (float) - Optional: Default = None
+        Simplification tolerance in CRS units (not simplified when None)
+    precision   :   (float) - Optional: Default = None
+        Grid size coordinates are snapped to in CRS units (not snapped when None)
+    noded   :   (Boolean) - Optional: Default = False
+        gdf is already noded (e.g. raster_to_polygon(coverage=True) units), so it is simplified as it is
+
+    Returns:
+    --------
+    gdf :   (gpd.GeoDataFrame)
+    """
+    geoms = np.asarray(gdf.geometry.values, dtype=object)
+    present = ~(shapely.is_missing(geoms) | shapely.is_empty(geoms))
+    if tolerance:
+        if not hasattr(shapely, 'coverage_simplify'):
+            raise ImportError("Coverage simplification needs shapely >= 2.1 built against GEOS >= 3.12")
+        geoms = geoms.copy()
+        coverage = geoms[present] if noded else _node_coverage(geoms[present])
+        geoms[present] = shapely.coverage_simplify(coverage, tolerance)
+    if precision:
+        geoms = shapely.set_precision(geoms, precision)
+    gdf = gdf.copy()
+    gdf[gdf.geometry.name] = gpd.GeoSeries(geoms, index=gdf.index, crs=gdf.crs)
+    return gdf
+
+def lod_path(outname, level):
+    """Returns path of level of detail 'level' (1, 2...) written next to outname by save_shapefile (<stem>_lod<level><suffix>)"""
+    outname = Path(outname)
+    return outname.with_name(f'{outname.stem}_lod{level}{outname.suffix}')
+
+def save_shapefile(gdf, outname, batch_size=DEFAULT_BATCH_SIZE, tolerance=None, precision=None, lods=None):
+    """Save shapefile to outname, optionally compacted (see compact_coverage) and with coarser levels of detail
     
     Parameters:
     -----------
     gdf :   (gpd.GeoDataFrame)
         Dataframe to save
     outname :   (Path/str)
-        Path to same outfile
+        Path to same outfile. The format is picked from the suffix (.shp, .gpkg, .fgb, .geojson, .parquet - see write_vector)
+    batch_size  :   (int) - Optional: Default = DEFAULT_BATCH_SIZE
+        Features written per batch
+    tolerance   :   (float) - Optional: Default = None
+        Coverage simplification tolerance of outname in CRS units (shared borders stay identical)
+    precision   :   (float) - Optional: Default = None
+        Grid size every output's coordinates are snapped to in CRS units
+    lods    :   (list) - Optional: Default = None
+        Tolerances of further levels of detail, each simplified from gdf (noded once for all of them) and saved to
+        lod_path(outname, level) for level 1, 2...
+
+    Returns:
+    --------
+    paths   :   (list)
+        Paths written (outname first)
     """
-	gdf.to_file(outname)
+    paths = [Path(outname)] + [lod_path(outname, level) for level in range(1, len(lods or []) + 1)]
+    tolerances = [tolerance] + list(lods or [])
+    if any(tolerances):
+        noded = gdf.copy()
+        noded[gdf.geometry.name] = gpd.GeoSeries(_node_coverage(gdf.geometry.values), index=gdf.index, crs=gdf.crs)
+    for path, level_tolerance in zip(paths, tolerances):
+        source = noded if level_tolerance else gdf
+        out = compact_coverage(source, level_tolerance, precision, noded=True) if level_tolerance or precision else gdf
+        write_vector(out, path, batch_size=batch_size)
+    return paths
 
 
-def rasterize(gdf, raster, out_name):
+def rasterize(gdf, raster, out_name, tiled=False, num_threads=None):
     """
     Rasterises gdf and saves to outname
 
@@ -270,7 +657,14 @@ def rasterize(gdf, raster, out_name):
         Geodataframe to rasterise
     raster  :   (Path/str)
         Path to raster to be used as snap/extent template
+    tiled   :   (Boolean) - Optional: Default = False
+        Write a tiled raster, rasterising block by block on a thread pool (see RasterizeAdminUnits.rasterize_tiled)
+    num_threads :   (int) - Optional: Default = None
+        Number of threads used when tiled (Default = all cores)
     """
     gdf = gdf.reset_index()
-    rasterise = RasterizeAdminUnits(gdf, raster, out_name).rasterize_geometries()
+    if tiled:
+        rasterise = RasterizeAdminUnits(gdf, raster, out_name).rasterize_tiled(num_threads=num_threads)
+    else:
+        rasterise = RasterizeAdminUnits(gdf, raster, out_name).rasterize_geometries()
 
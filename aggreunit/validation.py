@@ -0,0 +1,46 @@
+"""
+Validation of modelled (people-per-pixel raster) totals against census totals per aggregated unit
+"""
+import numpy as np
+
+
+def validation_metrics(census, modelled):
+    """
+    Returns per-unit errors of modelled against census totals and their summary. Units where either total is NaN (e.g. a
+    label without PPP pixels) get NaN errors and are left out of the summary
+
+    Parameters:
+    -----------
+    census  :   (array-like)
+        Census population of every aggregated unit
+    modelled    :   (array-like)
+        Modelled population (PPP raster sum) of the same units
+
+    Returns:
+    --------
+    abs_error   :   (np.ndarray)
+        modelled - census
+    rel_error   :   (np.ndarray)
+        abs_error / census (NaN where census is 0)
+    summary :   (dict)
+        'n_units', 'census_total', 'modelled_total', 'rmse' and 'pct_mae' (mean absolute error as % of the mean census total)
+    """
+    census = np.asarray(census, dtype=np.float64)
+    modelled = np.asarray(modelled, dtype=np.float64)
+    if census.shape != modelled.shape:
+        raise ValueError("census and modelled must have the same length")
+    abs_error = modelled - census
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rel_error = np.where(census != 0, abs_error / census, np.nan)
+    valid = ~np.isnan(abs_error)
+    error = abs_error[valid]
+    n = int(valid.sum())
+    mean_census = census[valid].mean() if n else np.nan
+    summary = {
+        'n_units': n,
+        'census_total': float(census[valid].sum()),
+        'modelled_total': float(modelled[valid].sum()),
+        'rmse': float(np.sqrt(np.mean(error ** 2))) if n else np.nan,
+        'pct_mae': float(np.mean(np.abs(error)) / mean_census * 100) if n and mean_census else np.nan,
+    }
+    return abs_error, rel_error, summary
@@ -0,0 +1,136 @@
+"""
+Vector output drivers picked from the path suffix (Shapefile, GeoPackage, FlatGeobuf, GeoJSON, GeoParquet), written in batches
+"""
+import json
+from pathlib import Path
+
+import geopandas as gpd
+import pandas as pd
+
+DEFAULT_BATCH_SIZE = 50000
+
+
+def _write_ogr(driver, **layer_options):
+    """Returns writer streaming gdf to an OGR driver batch by batch (first batch creates the file, the rest are appended)"""
+    def write(gdf, path, batch_size=DEFAULT_BATCH_SIZE, index=None):
+        if len(gdf) == 0:
+            gdf.to_file(path, driver=driver, index=index, **layer_options)
+            return
+        for start in range(0, len(gdf), batch_size):
+            mode = 'w' if start == 0 else 'a'
+            gdf.iloc[start:start + batch_size].to_file(path, driver=driver, mode=mode, index=index, **layer_options)
+    return write
+
+
+def _write_single(driver, **layer_options):
+    """Returns writer for drivers that can't append (written in one pass, still columnar with pyogrio)"""
+    def write(gdf, path, batch_size=DEFAULT_BATCH_SIZE, index=None):
+        gdf.to_file(path, driver=driver, index=index, **layer_options)
+    return write
+
+
+def _geo_metadata(gdf):
+    """Returns GeoParquet 'geo' metadata of gdf (optional bbox/geometry types left out as batches are written before they are known)"""
+    columns = {}
+    for name in gdf.columns[gdf.dtypes == 'geometry']:
+        crs = gdf[name].crs
+        columns[name] = {'encoding': 'WKB', 'geometry_types': [], 'crs': crs.to_json_dict() if crs is not None else None}
+    return json.dumps({'version': '1.0.0', 'primary_column': gdf.geometry.name, 'columns': columns}).encode()
+
+
+def _write_parquet(gdf, path, batch_size=DEFAULT_BATCH_SIZE, index=None):
+    """
+    Writes GeoParquet one row group per batch with a single pyarrow writer. The index is written as a column unless it
+    is the default range index (as GeoDataFrame.to_parquet; range metadata of one batch would not fit the others)
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    if not hasattr(gdf, 'to_arrow') or len(gdf) == 0:
+        gdf.to_parquet(path, index=index, row_group_size=batch_size)
+        return
+    if index is None:
+        index = not (gdf.index.names == [None] and gdf.index.equals(pd.RangeIndex(len(gdf))))
+    writer = None
+    try:
+        for start in range(0, len(gdf), batch_size):
+            table = pa.table(gdf.iloc[start:start + batch_size].to_arrow(index=index, geometry_encoding='WKB'))
+            if writer is None:
+                schema = table.schema.with_metadata({**(table.schema.metadata or {}), b'geo': _geo_metadata(gdf)})
+                writer = pq.ParquetWriter(str(path), schema)
+            writer.write_table(table.cast(writer.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+VECTOR_WRITERS = {
+    '.shp': _write_ogr('ESRI Shapefile'),
+    '.gpkg': _write_ogr('GPKG'),
+    '.geojson': _write_single('GeoJSON'),
+    '.fgb': _write_single('FlatGeobuf', SPATIAL_INDEX='YES'),
+    '.parquet': _write_parquet,
+    '.geoparquet': _write_parquet,
+}
+
+
+def register_vector_writer(suffix, writer):
+    """
+    Registers writer(gdf, path, batch_size=..., index=None) for paths ending with suffix
+
+    Parameters:
+    -----------
+    suffix  :   (str)
+        File suffix including the dot (e.g. '.gpkg')
+    writer  :   (callable)
+        Function writing a geodataframe to path
+
+    Returns:
+    --------
+    None
+    """
+    VECTOR_WRITERS[suffix.lower()] = writer
+
+
+def write_vector(gdf, path, batch_size=DEFAULT_BATCH_SIZE, index=None):
+    """
+    Writes gdf to path in the format given by the path suffix, in batches of batch_size features so the whole collection is
+    never converted at once. FlatGeobuf is written with a spatial index
+
+    Parameters:
+    -----------
+    gdf :   (gpd.GeoDataFrame)
+        Geodataframe to write
+    path    :   (Path/str)
+        Output path (.shp, .gpkg, .fgb, .geojson, .parquet/.geoparquet or any registered suffix). Paths without a suffix
+        are written as shapefiles, as GeoDataFrame.to_file
+    batch_size  :   (int) - Optional: Default = DEFAULT_BATCH_SIZE
+        Features written per batch
+    index   :   (Boolean) - Optional: Default = None
+        Write the index as a column (None writes it only if it is named, as GeoDataFrame.to_file)
+
+    Returns:
+    --------
+    None
+    """
+    suffix = Path(path).suffix.lower() or '.shp'
+    if suffix not in VECTOR_WRITERS:
+        raise ValueError(f"No vector writer for '{suffix}'. Use one of {sorted(VECTOR_WRITERS)}")
+    VECTOR_WRITERS[suffix](gdf, path, batch_size=batch_size, index=index)
+
+
+def read_vector(path):
+    """
+    Returns geodataframe read from any format written by write_vector
+
+    Parameters:
+    -----------
+    path    :   (Path/str)
+        Input path
+
+    Returns:
+    --------
+    gdf :   (gpd.GeoDataFrame)
+    """
+    if Path(path).suffix.lower() in ('.parquet', '.geoparquet'):
+        return gpd.read_parquet(path)
+    return gpd.read_file(path)
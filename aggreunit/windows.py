@@ -0,0 +1,79 @@
+"""
+Helpers to walk rasters in bounded windows so that no stage has to hold a whole mastergrid in memory
+"""
+import rasterio
+from rasterio.windows import Window
+
+DEFAULT_WINDOW_PIXELS = 2 ** 24 #~16M pixels (64MB of int32) per window
+
+
+def iter_windows(src, max_pixels=DEFAULT_WINDOW_PIXELS):
+    """
+    Yields windows tiling the whole raster, each holding at most ~max_pixels pixels and aligned to the raster's internal blocks
+
+    Parameters:
+    -----------
+    src :   (rasterio.DatasetReader)
+        Opened raster dataset
+    max_pixels  :   (int) - Optional: Default = DEFAULT_WINDOW_PIXELS
+        Budget of pixels per window. A window never holds less than one internal block
+
+    Returns:
+    --------
+    windows :   (generator)
+        Generator of rasterio.windows.Window objects in row-major order
+    """
+    block_height, block_width = src.block_shapes[0]
+    block_height = min(block_height, src.height)
+    block_width = min(block_width, src.width)
+    max_pixels = max(int(max_pixels or src.width * src.height), block_height * block_width)
+    #Grow windows to full rows of blocks first, then down the raster
+    n_cols = max(1, min(max_pixels // (block_height * block_width), -(-src.width // block_width)))
+    width = min(n_cols * block_width, src.width)
+    n_rows = max(1, max_pixels // (block_height * width))
+    height = min(n_rows * block_height, src.height)
+    for row_off in range(0, src.height, height):
+        for col_off in range(0, src.width, width):
+            yield Window(col_off, row_off, min(width, src.width - col_off), min(height, src.height - row_off))
+
+
+def expand_window(src, window, rows=1, cols=1):
+    """
+    Returns window grown by rows/cols at the bottom/right edge, clipped to the raster extent
+
+    Parameters:
+    -----------
+    src :   (rasterio.DatasetReader)
+        Opened raster dataset
+    window  :   (rasterio.windows.Window)
+        Window to expand
+    rows    :   (int)
+        Number of extra rows
+    cols    :   (int)
+        Number of extra columns
+
+    Returns:
+    --------
+    window  :   (rasterio.windows.Window)
+        Expanded window
+    """
+    height = min(window.height + rows, src.height - window.row_off)
+    width = min(window.width + cols, src.width - window.col_off)
+    return Window(window.col_off, window.row_off, width, height)
+
+
+def raster_size(raster):
+    """
+    Returns number of pixels of a raster (width * height)
+
+    Parameters:
+    -----------
+    raster  :   (Path/str)
+        Path to raster
+
+    Returns:
+    --------
+    pixels  :   (int)
+    """
+    with rasterio.open(raster) as src:
+        return src.width * src.height
@@ -0,0 +1,196 @@
+"""
+Long-running aggregation worker serving jobs from a directory spool. Imports, polygonised units, per-unit area and
+adjacency of recently used mastergrids stay in memory, so repeated jobs on a country (other targets, population tables
+or column sets) skip straight to labelling
+
+Spool layout (several workers may share one spool, a job is claimed by an atomic rename):
+    incoming/<job_id>.json  jobs waiting (AggregateUnits paths and options, as in a batch manifest, see submit_job)
+    running/<job_id>.json   jobs being run
+    done/<job_id>.json      status of finished jobs (status 'done' or 'failed')
+    STOP                    makes the workers exit once their current job is finished
+"""
+from collections import OrderedDict
+import json
+import os
+from pathlib import Path
+import time
+import traceback
+
+from .aggregate_units import AggregateUnits
+from .batch import OPTION_FIELDS, PATH_FIELDS
+
+SPOOL_DIRS = ['incoming', 'running', 'done']
+
+
+def _write_json(obj, path):
+    """Writes obj to path atomically (readers never see a partial file)"""
+    tmp = Path(path).with_suffix('.tmp')
+    tmp.write_text(json.dumps(obj, indent=2))
+    os.replace(tmp, path)
+
+
+def submit_job(spool_dir, job):
+    """
+    Queues a job in a worker spool and returns the path of its status file (written once the job is finished)
+
+    Parameters:
+    -----------
+    spool_dir   :   (Path/str)
+        Spool directory of the worker(s)
+    job :   (dict)
+        admin_raster and population_table, any other of PATH_FIELDS/OPTION_FIELDS and an optional job_id (Default =
+        admin_raster stem plus submission time). Outputs not given are not written
+
+    Returns:
+    --------
+    status_path :   (Path)
+    """
+    spool_dir = Path(spool_dir)
+    for name in SPOOL_DIRS:
+        spool_dir.joinpath(name).mkdir(parents=True, exist_ok=True)
+    job = {k: str(v) if isinstance(v, Path) else v for k, v in job.items()}
+    job.setdefault('job_id', f"{Path(job['admin_raster']).stem}_{time.time_ns()}")
+    _write_json(job, spool_dir.joinpath('incoming', f"{job['job_id']}.json"))
+    return spool_dir.joinpath('done', f"{job['job_id']}.json")
+
+
+class Worker:
+    """
+    Serves AggregateUnits jobs from a directory spool, keeping the prepared units (polygons, area, adjacency) of the
+    max_countries most recently used mastergrids in memory
+    """
+    def __init__(self, spool_dir, max_countries=4, cache_dir=None, num_threads=None, poll_interval=0.5):
+        """
+        Instantiation
+
+        Parameters:
+        -----------
+        spool_dir   :   (Path/str)
+            Spool directory (created if missing)
+        max_countries   :   (int)
+            Number of prepared mastergrids kept in memory (least recently used are dropped)
+        cache_dir   :   (Path/str)
+            ArtifactCache directory, so mastergrids dropped from memory (or a restarted worker) skip polygonisation too
+        num_threads :   (int)
+            Threads of every job's threaded stages (Default = all cores), unless the job sets num_threads
+        poll_interval   :   (float)
+            Seconds between looks at an empty spool
+        """
+        self.spool_dir = Path(spool_dir)
+        for name in SPOOL_DIRS:
+            self.spool_dir.joinpath(name).mkdir(parents=True, exist_ok=True)
+        self.max_countries = max_countries
+        self.cache_dir = cache_dir
+        self.num_threads = num_threads
+        self.poll_interval = poll_interval
+        self._countries = OrderedDict()
+
+    @staticmethod
+    def _country_key(kwargs):
+        """Returns key of the prepared units of a job (rasters by path, size and mtime, so a rewritten raster is prepared anew)"""
+        key = [bool(kwargs.get('coverage_dissolve'))]
+        for name in ('admin_raster', 'area_raster'):
+            path = kwargs.get(name)
+            if path is None:
+                key.append(None)
+            else:
+                stat = os.stat(path)
+                key.append((str(Path(path).resolve()), stat.st_size, stat.st_mtime_ns))
+        return tuple(key)
+
+    def run_job(self, job):
+        """
+        Runs one job, reusing and keeping its prepared units, and returns its status
+
+        Parameters:
+        -----------
+        job :   (dict)
+            Job as given to submit_job
+
+        Returns:
+        --------
+        status  :   (dict)
+            job_id, status ('done'/'failed'), seconds, warm (prepared units were reused), error (traceback) and the
+            validation summary of the job
+        """
+        start = time.perf_counter()
+        status = {'job_id': job.get('job_id'), 'status': 'failed', 'seconds': None, 'warm': False, 'error': '', 'validation': None}
+        try:
+            unknown = [x for x in job if x not in PATH_FIELDS + OPTION_FIELDS + ['job_id']]
+            if unknown:
+                raise ValueError(f"Unknown job fields {unknown}")
+            kwargs = {k: Path(job[k]) if job.get(k) is not None else None for k in PATH_FIELDS}
+            kwargs.update({k: v for k, v in job.items() if k in OPTION_FIELDS})
+            kwargs.setdefault('num_threads', self.num_threads)
+            key = self._country_key(kwargs)
+            units = self._countries.get(key)
+            status['warm'] = units is not None
+            agg = AggregateUnits(**kwargs, cache_dir=self.cache_dir, units=units)
+            agg.run()
+            if agg.units is not None:
+                self._countries[key] = agg.units
+                self._countries.move_to_end(key)
+                while len(self._countries) > self.max_countries:
+                    self._countries.popitem(last=False)
+            status.update({'status': 'done', 'validation': agg.validation})
+        except Exception:
+            status['error'] = traceback.format_exc()
+        status['seconds'] = round(time.perf_counter() - start, 3)
+        return status
+
+    def _claim(self):
+        """Returns path of the oldest incoming job moved to running/ (None if the spool is empty)"""
+        incoming = sorted(self.spool_dir.joinpath('incoming').glob('*.json'), key=lambda x: (x.stat().st_mtime_ns, x.name))
+        for path in incoming:
+            running = self.spool_dir.joinpath('running', path.name)
+            try:
+                os.replace(path, running)
+            except FileNotFoundError: #Claimed by another worker
+                continue
+            return running
+        return None
+
+    def _process(self, path):
+        """Runs a claimed job file and writes its status to done/"""
+        try:
+            job = json.loads(path.read_text())
+            job.setdefault('job_id', path.stem)
+            status = self.run_job(job)
+        except ValueError: #Unreadable job file
+            status = {'job_id': path.stem, 'status': 'failed', 'seconds': None, 'warm': False, 'error': traceback.format_exc(),
+                      'validation': None}
+        _write_json(status, self.spool_dir.joinpath('done', path.name))
+        path.unlink()
+        return status
+
+    def serve(self, max_jobs=None, idle_timeout=None):
+        """
+        Runs spooled jobs (oldest first) until max_jobs are done, the spool has been empty for idle_timeout seconds or
+        a STOP file appears in the spool
+
+        Parameters:
+        -----------
+        max_jobs    :   (int)
+            Number of jobs to run (Default = no limit)
+        idle_timeout    :   (float)
+            Seconds to wait on an empty spool before returning (Default = wait forever)
+
+        Returns:
+        --------
+        statuses    :   (list)
+            Status of every job run
+        """
+        statuses = []
+        idle_since = time.monotonic()
+        while max_jobs is None or len(statuses) < max_jobs:
+            if self.spool_dir.joinpath('STOP').exists():
+                break
+            path = self._claim()
+            if path is None:
+                if idle_timeout is not None and time.monotonic() - idle_since >= idle_timeout:
+                    break
+                time.sleep(self.poll_interval)
+                continue
+            statuses.append(self._process(path))
+            idle_since = time.monotonic()
+        return statuses
@@ -0,0 +1,187 @@
+"""
+Raster-domain zonal statistics of value rasters per admin unit id, computed with np.bincount over the mastergrid. Blocks
+are read on a thread pool (GDAL decompresses without holding the GIL), every thread with its own dataset handles and
+partial sums that are merged at the end
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+import os
+
+import numpy as np
+import rasterio
+
+from .windows import DEFAULT_WINDOW_PIXELS, iter_windows
+
+
+def grids_align(raster, other):
+    """
+    Returns True if both rasters share size, transform and crs (i.e. pixels line up one to one)
+
+    Parameters:
+    -----------
+    raster  :   (Path/str)
+        Path to first raster
+    other   :   (Path/str)
+        Path to second raster
+
+    Returns:
+    --------
+    aligned :   (Boolean)
+    """
+    with rasterio.open(raster) as src, rasterio.open(other) as src_other:
+        return (src.shape == src_other.shape
+                and src.crs == src_other.crs
+                and src.transform.almost_equals(src_other.transform))
+
+
+def _valid(values, nodata):
+    """Returns boolean array of pixels of values that are neither nodata nor NaN"""
+    valid = ~np.isnan(values) if np.issubdtype(values.dtype, np.floating) else np.ones(values.shape, dtype=bool)
+    if nodata is not None:
+        valid &= values != nodata
+    return valid
+
+
+def _window_sums(src, value_srcs, window, index=None):
+    """
+    Returns (ids, sums, counts) of the valid value pixels of every unit id in one window (of every id of index, by dense
+    code, when given)
+    """
+    units = src.read(1, window=window)
+    valid = units != src.nodata if src.nodata is not None else np.ones(units.shape, dtype=bool)
+    if index is None:
+        window_ids, inverse = np.unique(units[valid], return_inverse=True)
+    else:
+        inverse, found = index.find(units[valid])
+        valid[valid] = found
+        window_ids, inverse = index.ids, inverse[found]
+    sums = np.empty((len(window_ids), len(value_srcs)))
+    counts = np.empty((len(window_ids), len(value_srcs)))
+    for i, src_val in enumerate(value_srcs):
+        values = src_val.read(1, window=window)[valid].astype(np.float64)
+        value_valid = _valid(values, src_val.nodata)
+        sums[:, i] = np.bincount(inverse, weights=np.where(value_valid, values, 0), minlength=len(window_ids))
+        counts[:, i] = np.bincount(inverse, weights=value_valid, minlength=len(window_ids))
+    return window_ids.astype(np.int64), sums, counts
+
+
+def _merge(ids, sums, counts, n_values):
+    """Returns partial (ids, sums, counts) merged into one sorted set of ids"""
+    if not ids:
+        return np.empty(0, dtype=np.int64), np.empty((0, n_values)), np.empty((0, n_values))
+    unit_ids, inverse = np.unique(np.concatenate(ids), return_inverse=True)
+    sums, counts = np.concatenate(sums), np.concatenate(counts)
+    merged = [np.stack([np.bincount(inverse, weights=x[:, i], minlength=len(unit_ids)) for i in range(n_values)], axis=1)
+              if n_values else np.empty((len(unit_ids), 0)) for x in (sums, counts)]
+    return unit_ids, merged[0], merged[1]
+
+
+def _reduce_windows(admin_raster, value_rasters, windows, index=None):
+    """
+    Thread worker: returns merged (ids, sums, counts) of windows, read through dataset handles of its own. With an
+    index the windows are added straight into dense per-code arrays
+    """
+    if index is None:
+        ids, sums, counts = [], [], []
+    else:
+        total_sums, total_counts = np.zeros((len(index), len(value_rasters))), np.zeros((len(index), len(value_rasters)))
+    with ExitStack() as stack:
+        src = stack.enter_context(rasterio.open(admin_raster))
+        value_srcs = [stack.enter_context(rasterio.open(x)) for x in value_rasters]
+        for window in windows:
+            window_ids, window_sums, window_counts = _window_sums(src, value_srcs, window, index)
+            if index is None:
+                ids.append(window_ids)
+                sums.append(window_sums)
+                counts.append(window_counts)
+            else:
+                total_sums += window_sums
+                total_counts += window_counts
+    if index is None:
+        return _merge(ids, sums, counts, len(value_rasters))
+    return index.ids, total_sums, total_counts
+
+
+def zonal_reduce(admin_raster, value_rasters, max_pixels=DEFAULT_WINDOW_PIXELS, num_threads=None, index=None):
+    """
+    Returns sums and counts of valid pixels of every value raster per admin unit id of admin_raster (rasters must be
+    aligned, see grids_align), reading the blocks on num_threads threads. Every thread opens its own dataset handles and accumulates its
+    windows into thread-local arrays, merged once at the end. Nodata/NaN pixels are skipped
+
+    Parameters:
+    -----------
+    admin_raster    :   (Path/str)
+        Path to admin unit raster (mastergrid)
+    value_rasters   :   (list)
+        Paths to rasters of values to sum (e.g. pixel area, population)
+    max_pixels  :   (int) - Optional: Default = DEFAULT_WINDOW_PIXELS
+        Pixel budget held in memory at once, split between the threads (a window never holds less than one block)
+    num_threads :   (int) - Optional: Default = None
+        Number of reading threads (Default = all cores)
+    index   :   (IdIndex) - Optional: Default = None
+        Ids of admin_raster already factorised (e.g. from AdjacencyGraph.index). Pixels are added into dense per-code
+        arrays (ids not in index are skipped) instead of being factorised window by window
+
+    Returns:
+    --------
+    ids :   (np.ndarray)
+        Sorted unique admin unit ids (index.ids when given)
+    sums    :   (np.ndarray)
+        (n_ids, n_value_rasters) sums of every value raster
+    counts  :   (np.ndarray)
+        (n_ids, n_value_rasters) numbers of valid value pixels
+
+    Raises:
+    -------
+    ValueError
+        If a value raster is not on the same grid as admin_raster
+    """
+    value_rasters = [str(x) for x in value_rasters]
+    for value_raster in value_rasters:
+        if not grids_align(admin_raster, value_raster):
+            raise ValueError(f"{value_raster} is not on the same grid as {admin_raster}")
+    num_threads = max(1, num_threads or os.cpu_count() or 1)
+    with rasterio.open(admin_raster) as src:
+        windows = list(iter_windows(src, max(1, (max_pixels or src.width * src.height) // num_threads)))
+    num_threads = min(num_threads, len(windows))
+    if num_threads <= 1:
+        return _reduce_windows(str(admin_raster), value_rasters, windows, index)
+    with ThreadPoolExecutor(max_workers=num_threads) as pool:
+        #Interleaved windows keep the threads busy on rasters whose blocks compress unevenly
+        parts = list(pool.map(_reduce_windows, [str(admin_raster)] * num_threads, [value_rasters] * num_threads,
+                              [windows[i::num_threads] for i in range(num_threads)], [index] * num_threads))
+    ids, sums, counts = zip(*parts)
+    if index is not None:
+        return index.ids, sum(sums), sum(counts)
+    return _merge(list(ids), list(sums), list(counts), len(value_rasters))
+
+
+def zonal_sum(admin_raster, value_raster, max_pixels=DEFAULT_WINDOW_PIXELS, num_threads=None, index=None):
+    """
+    Returns sum of value_raster per admin unit id of admin_raster (rasters must be aligned). Nodata/NaN pixels of either
+    raster are skipped; units without a single valid value pixel get a sum of NaN.
+
+    Parameters:
+    -----------
+    admin_raster    :   (Path/str)
+        Path to admin unit raster (mastergrid)
+    value_raster    :   (Path/str)
+        Path to raster of values to sum (e.g. pixel area)
+    max_pixels  :   (int) - Optional: Default = DEFAULT_WINDOW_PIXELS
+        Pixel budget of the windows read from the rasters
+    num_threads :   (int) - Optional: Default = None
+        Number of reading threads (Default = all cores, see zonal_reduce)
+    index   :   (IdIndex) - Optional: Default = None
+        Ids of admin_raster already factorised (see zonal_reduce)
+
+    Returns:
+    --------
+    ids :   (np.ndarray)
+        Sorted unique admin unit ids
+    sums    :   (np.ndarray)
+        Sum of value_raster for every id
+    """
+    ids, sums, counts = zonal_reduce(admin_raster, [value_raster], max_pixels=max_pixels, num_threads=num_threads, index=index)
+    sums = sums[:, 0]
+    sums[counts[:, 0] == 0] = np.nan
+    return ids, sums
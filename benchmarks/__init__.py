@@ -0,0 +1 @@
+"""Benchmark suite run on synthetic mastergrids (see run_benchmarks.py)"""
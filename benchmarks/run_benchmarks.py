@@ -0,0 +1,231 @@
+"""
+Times every public function in aggreunit.util_functions and the full AggregateUnits pipeline on synthetic mastergrids of
+increasing size, and saves the results so runs from different commits can be compared.
+
+Usage:
+    python -m benchmarks.run_benchmarks --sizes 250x250:500 1000x1000:5000
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+import argparse
+import datetime
+import json
+from pathlib import Path
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import aggreunit
+
+from .synthetic import make_dataset
+
+RESULTS_DIR = Path(__file__).resolve().parent.joinpath('results')
+
+
+def measure(func, *args, memory=False, repeat=1, **kwargs):
+    """
+    Returns (result, best seconds, peak traced bytes) of calling func repeat times
+
+    Parameters:
+    -----------
+    func    :   (callable)
+        Function to time
+    memory  :   (Boolean)
+        Trace peak Python/NumPy allocations with tracemalloc (slows the call down)
+    repeat  :   (int)
+        Number of calls, the fastest is reported
+
+    Returns:
+    --------
+    result  :   (object)
+        Return value of the last call
+    seconds :   (float)
+    peak_bytes  :   (int/None)
+    """
+    best, peak = None, None
+    for _ in range(repeat):
+        if memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        if memory:
+            peak = max(peak or 0, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        best = seconds if best is None else min(best, seconds)
+    return result, best, peak
+
+
+def bench_dataset(paths, out_dir, memory=False, repeat=1):
+    """
+    Returns list of {'name', 'seconds', 'peak_bytes', 'rows'} for every benchmarked function on one dataset. A function
+    that raises is recorded with its 'error' (and seconds None) and the suite goes on, so the results are still saved
+
+    Parameters:
+    -----------
+    paths   :   (dict)
+        Dataset paths from make_dataset
+    out_dir :   (Path)
+        Scratch directory for outputs
+    memory  :   (Boolean)
+        Trace peak allocations
+    repeat  :   (int)
+        Calls per function
+
+    Returns:
+    --------
+    results :   (list)
+    """
+    results = []
+
+    def run(name, func, *args, **kwargs):
+        try:
+            result, seconds, peak = measure(func, *args, memory=memory, repeat=repeat, **kwargs)
+        except Exception as error:
+            results.append({'name': name, 'seconds': None, 'peak_bytes': None, 'rows': None, 'error': repr(error)})
+            print(f"  {name:<36}    FAILED {error!r}")
+            return None
+        first = result[0] if isinstance(result, tuple) else result
+        rows = len(first) if hasattr(first, '__len__') else None
+        results.append({'name': name, 'seconds': seconds, 'peak_bytes': peak, 'rows': rows})
+        print(f"  {name:<36}{seconds:>10.3f}s")
+        return result
+
+    admin, area, table = paths['admin_raster'], paths['area_raster'], paths['population_table']
+    out = lambda name: out_dir.joinpath(name)
+    l1_gdf = run('raster_to_polygon', aggreunit.raster_to_polygon, admin)
+    run('raster_to_polygon[streamed]', aggreunit.raster_to_polygon, admin, max_pixels=2 ** 18)
+    noded_gdf = run('raster_to_polygon[coverage]', aggreunit.raster_to_polygon, admin, coverage=True)
+    gdf_pop = run('join_population_to_shp', aggreunit.join_population_to_shp, l1_gdf, table, pop_col='B_Tot')
+    run('get_pop_density[zonal_stats]', aggreunit.get_pop_density, gdf_pop, area, pop_col='B_Tot')
+    gdf_density = run('get_pop_density[bincount]', aggreunit.get_pop_density, gdf_pop, area, pop_col='B_Tot', admin_raster=admin)
+    gdf_sorted = run('sort_by_density', aggreunit.sort_by_density, gdf_density)
+    adjacency = run('AdjacencyGraph.from_raster', aggreunit.AdjacencyGraph.from_raster, admin)
+    run('AdjacencyGraph.from_geodataframe', aggreunit.AdjacencyGraph.from_geodataframe, gdf_sorted)
+    labelled = run('get_labels', lambda: aggreunit.get_labels(gdf_sorted.copy(), adjacency=adjacency))
+    run('get_target_labels[10%]', lambda: aggreunit.get_target_labels(gdf_sorted.copy(), 0.1, adjacency=adjacency, pop_col='B_Tot'))
+    run('aggr_table', aggreunit.aggr_table, table, labelled, out('pop_A.csv'), pop_col='B_Tot')
+    gdf_diss = run('dissolve_admin_units', aggreunit.dissolve_admin_units, labelled)
+    if noded_gdf is not None and labelled is not None: #The coverage dissolve needs the units noded along pixel edges
+        noded = labelled.set_geometry(noded_gdf.set_index('adm_id').geometry.reindex(labelled.index).to_numpy(), crs=labelled.crs)
+        run('dissolve_admin_units[coverage]', aggreunit.dissolve_admin_units, noded, coverage=True)
+    run('save_shapefile', aggreunit.save_shapefile, gdf_diss, out('admin_A.shp'))
+    run('rasterize', aggreunit.rasterize, gdf_diss, admin, out('admin_A.tif'))
+    run('rasterize[tiled]', aggreunit.rasterize, gdf_diss, admin, out('admin_A_tiled.tif'), tiled=True)
+    run('remap_raster', lambda: aggreunit.remap_raster(admin, labelled.index, labelled['labels'], out('admin_A_remap.tif')))
+    constr_gdf = aggreunit.raster_to_polygon(paths['constrained_raster'])
+    run('aggr_constrained_shp', aggreunit.aggr_constrained_shp, labelled, constr_gdf)
+    for method in ('rasterize', 'remap'):
+        agg = aggreunit.AggregateUnits(admin, table, area, out(f'pipeline_{method}.tif'), out(f'pipeline_{method}.csv'),
+                                       out(f'pipeline_{method}.shp'), raster_method=method)
+        run(f'AggregateUnits[{method}]', agg._aggregate)
+        if results[-1]['seconds'] is not None:
+            results[-1]['stages'] = agg.report.to_dicts()
+    return results
+
+
+def git_commit():
+    """Returns short hash of HEAD (or 'unknown' outside a git checkout)"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=Path(__file__).parent, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_suite(sizes, memory=False, repeat=1, seed=0, output=None):
+    """
+    Runs the benchmarks for every (height, width, n_units) in sizes and saves them to output (JSON)
+
+    Parameters:
+    -----------
+    sizes   :   (list)
+        List of (height, width, n_units)
+    memory  :   (Boolean)
+        Trace peak allocations
+    repeat  :   (int)
+        Calls per function
+    seed    :   (int)
+        Random seed of the synthetic data
+    output  :   (Path/str)
+        Output JSON (Default = benchmarks/results/<timestamp>_<commit>.json)
+
+    Returns:
+    --------
+    output  :   (Path)
+    """
+    commit = git_commit()
+    stamp = datetime.datetime.now().strftime('%Y%m%dT%H%M%S')
+    report = {'commit': commit, 'timestamp': stamp, 'python': platform.python_version(), 'machine': platform.machine(), 'datasets': []}
+    for height, width, n_units in sizes:
+        print(f'{height}x{width} pixels, {n_units} units')
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            paths = make_dataset(tmp.joinpath('data'), height=height, width=width, n_units=n_units, seed=seed)
+            out_dir = tmp.joinpath('out')
+            out_dir.mkdir()
+            results = bench_dataset(paths, out_dir, memory=memory, repeat=repeat)
+        report['datasets'].append({'height': height, 'width': width, 'n_units': n_units, 'results': results})
+    output = Path(output) if output else RESULTS_DIR.joinpath(f'{stamp}_{commit}.json')
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f'Saved {output}')
+    return output
+
+
+def compare(baseline, candidate):
+    """
+    Prints the time ratio candidate/baseline of every function benchmarked on the same dataset size in both files
+
+    Parameters:
+    -----------
+    baseline    :   (Path/str)
+        Earlier results JSON
+    candidate   :   (Path/str)
+        Later results JSON
+
+    Returns:
+    --------
+    ratios  :   (dict)
+        {(height, width, n_units, name): ratio}
+    """
+    def load(path):
+        report = json.loads(Path(path).read_text())
+        return report['commit'], {(d['height'], d['width'], d['n_units'], r['name']): r['seconds'] for d in report['datasets'] for r in d['results']
+                                  if r['seconds'] is not None}
+    base_commit, base = load(baseline)
+    cand_commit, cand = load(candidate)
+    ratios = {key: cand[key] / base[key] for key in base if key in cand and base[key] > 0}
+    print(f'{base_commit} -> {cand_commit}')
+    for (height, width, n_units, name), ratio in sorted(ratios.items()):
+        flag = '  <-- slower' if ratio > 1.2 else ''
+        print(f'{height}x{width}/{n_units:<8}{name:<36}{base[(height, width, n_units, name)]:>10.3f}s{cand[(height, width, n_units, name)]:>10.3f}s'
+              f'{ratio:>8.2f}x{flag}')
+    return ratios
+
+
+def parse_size(value):
+    """Parses HEIGHTxWIDTH:UNITS"""
+    shape, units = value.split(':')
+    height, width = shape.lower().split('x')
+    return int(height), int(width), int(units)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', type=parse_size, default=[(250, 250, 500), (500, 500, 2000)],
+                        help='Dataset sizes as HEIGHTxWIDTH:UNITS')
+    parser.add_argument('--repeat', type=int, default=1, help='Calls per function (fastest is kept)')
+    parser.add_argument('--memory', action='store_true', help='Trace peak allocations with tracemalloc')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Results JSON (Default = benchmarks/results/<timestamp>_<commit>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CANDIDATE'), help='Compare two results files and exit')
+    args = parser.parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run_suite(args.sizes, memory=args.memory, repeat=args.repeat, seed=args.seed, output=args.output)
+
+
+if __name__ == '__main__':
+    main()
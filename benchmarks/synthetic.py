@@ -0,0 +1,114 @@
+"""
+Synthetic mastergrids (Voronoi-style admin units), pixel area rasters and population tables of configurable size
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio.transform import from_origin
+
+NODATA = -99999
+ID_OFFSET = 100000000 #Sparse 9-digit ids like the real mastergrids
+RESOLUTION = 0.000833333 #~100m
+
+
+def voronoi_labels(height, width, n_units, rng, chunk_rows=64):
+    """
+    Returns (height, width) array with the index (0..n_units-1) of the nearest random seed point of every pixel
+
+    Parameters:
+    -----------
+    height  :   (int)
+        Number of rows
+    width   :   (int)
+        Number of columns
+    n_units :   (int)
+        Number of Voronoi regions
+    rng :   (np.random.Generator)
+        Random generator
+    chunk_rows  :   (int)
+        Rows labelled at a time when scipy is not installed
+
+    Returns:
+    --------
+    labels  :   (np.ndarray)
+    """
+    seeds = np.column_stack([rng.uniform(0, height, n_units), rng.uniform(0, width, n_units)])
+    try:
+        from scipy.spatial import cKDTree
+    except ImportError:
+        cKDTree = None
+    labels = np.empty((height, width), dtype=np.int32)
+    cols = np.arange(width) + 0.5
+    for row_off in range(0, height, chunk_rows):
+        rows = np.arange(row_off, min(row_off + chunk_rows, height)) + 0.5
+        points = np.column_stack([np.repeat(rows, width), np.tile(cols, len(rows))])
+        if cKDTree is not None:
+            nearest = cKDTree(seeds).query(points)[1]
+        else:
+            nearest = np.empty(len(points), dtype=np.int64)
+            for i in range(0, len(points), 4096):
+                d = ((points[i:i + 4096, None, :] - seeds[None, :, :]) ** 2).sum(axis=2)
+                nearest[i:i + 4096] = d.argmin(axis=1)
+        labels[row_off:row_off + len(rows)] = nearest.reshape(len(rows), width)
+    return labels
+
+
+def make_dataset(directory, height=500, width=500, n_units=1000, water_fraction=0.05, built_fraction=0.3, seed=0, blocksize=256):
+    """
+    Writes a synthetic mastergrid, constrained (built) mastergrid, pixel area raster and population table to directory
+
+    Parameters:
+    -----------
+    directory   :   (Path/str)
+        Output directory (created if missing)
+    height  :   (int)
+        Rows of the rasters
+    width   :   (int)
+        Columns of the rasters
+    n_units :   (int)
+        Number of admin units
+    water_fraction  :   (float)
+        Fraction of units turned into water (id 0)
+    built_fraction  :   (float)
+        Fraction of pixels kept in the constrained mastergrid
+    seed    :   (int)
+        Random seed
+    blocksize   :   (int)
+        Tile size of the rasters
+
+    Returns:
+    --------
+    paths   :   (dict)
+        'admin_raster', 'constrained_raster', 'area_raster', 'population_table' paths
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    regions = voronoi_labels(height, width, n_units, rng)
+    ids = ID_OFFSET + np.arange(n_units, dtype=np.int64) * 7
+    ids[rng.random(n_units) < water_fraction] = 0
+    admin = ids[regions].astype(np.int32)
+    admin[:, :max(1, width // 50)] = NODATA #Outside the country
+    constrained = np.where(rng.random(admin.shape) < built_fraction, admin, NODATA).astype(np.int32)
+    transform = from_origin(-10.0, 10.0, RESOLUTION, RESOLUTION)
+    lat = 10.0 - (np.arange(height) + 0.5) * RESOLUTION
+    area = np.repeat((np.cos(np.radians(lat)) * (RESOLUTION * 111320) ** 2)[:, None], width, axis=1).astype(np.float32)
+    profile = {
+        'driver': 'GTiff', 'height': height, 'width': width, 'count': 1, 'crs': 'EPSG:4326', 'transform': transform,
+        'tiled': True, 'blockxsize': blocksize, 'blockysize': blocksize, 'compress': 'lzw',
+    }
+    paths = {
+        'admin_raster': directory.joinpath('synthetic_mastergrid.tif'),
+        'constrained_raster': directory.joinpath('synthetic_constrained.tif'),
+        'area_raster': directory.joinpath('synthetic_px_area.tif'),
+        'population_table': directory.joinpath('synthetic_pop.csv'),
+    }
+    for key, arr, nodata in (('admin_raster', admin, NODATA), ('constrained_raster', constrained, NODATA), ('area_raster', area, -1)):
+        with rasterio.open(paths[key], 'w', dtype=arr.dtype, nodata=nodata, **profile) as dst:
+            dst.write(arr, 1)
+    land = np.unique(ids[ids != 0])
+    population = rng.lognormal(mean=7, sigma=1.2, size=len(land)).round()
+    pd.DataFrame({'GID': land, 'B_Tot': population, 'P_2020': population * 1.02}).to_csv(paths['population_table'], index=False)
+    return paths
@@ -0,0 +1,24 @@
+from setuptools import find_packages, setup
+
+setup(
+    name='aggreunit',
+    version='0.1.0',
+    description='Aggregate administrative units based on population density',
+    packages=find_packages(include=['aggreunit', 'aggreunit.*']),
+    python_requires='>=3.8',
+    install_requires=[
+        'numpy',
+        'pandas',
+        'geopandas',
+        'shapely>=2.0',
+        'rasterio',
+        'rasterstats',
+        'fiona',
+        'pyarrow',
+    ],
+    entry_points={
+        'console_scripts': [
+            'aggreunit = aggreunit.cli:main',
+        ],
+    },
+)
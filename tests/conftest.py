@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+#Small admin grid: 4 units plus a water unit (0) and a nodata corner
+GRID = np.array([
+    [1, 1, 2, 2, 0],
+    [1, 3, 3, 2, 0],
+    [4, 4, 3, 5, 0],
+    [4, 6, 6, 5, -99],
+], dtype=np.int32)
+NODATA = -99
+TRANSFORM = from_origin(10.0, 20.0, 0.5, 0.5)
+
+
+def write_raster(path, arr, nodata=NODATA, transform=TRANSFORM, **kwargs):
+    """Writes arr as a single band GeoTIFF on the test grid and returns path"""
+    profile = {
+        'driver': 'GTiff',
+        'height': arr.shape[0],
+        'width': arr.shape[1],
+        'count': 1,
+        'dtype': arr.dtype,
+        'crs': 'EPSG:4326',
+        'transform': transform,
+        'nodata': nodata,
+    }
+    profile.update(kwargs)
+    with rasterio.open(path, 'w', **profile) as dst:
+        dst.write(arr, 1)
+    return path
+
+
+@pytest.fixture
+def admin_raster(tmp_path):
+    yield write_raster(tmp_path.joinpath('admin.tif'), GRID)
+
+
+@pytest.fixture
+def sorted_gdf(admin_raster):
+    """Polygonised test grid with made up densities, sorted as in AggregateUnits"""
+    from aggreunit import raster_to_polygon, sort_by_density
+    gdf = raster_to_polygon(admin_raster).set_index('adm_id')
+    gdf['density'] = [0.0, 5.0, 1.0, 9.0, 3.0, 2.0, 7.0]
+    yield sort_by_density(gdf)
+
+
+@pytest.fixture
+def area_raster(tmp_path):
+    area = (np.arange(GRID.size, dtype=np.float32).reshape(GRID.shape) + 1) / 10
+    area[0, 0] = -1 #nodata pixel inside unit 1
+    yield write_raster(tmp_path.joinpath('area.tif'), area, nodata=-1)
+
+
+@pytest.fixture
+def pop_table(tmp_path):
+    import pandas as pd
+    df = pd.DataFrame({'GID': [1, 2, 3, 4, 5, 6], 'B_Tot': [50.0, 20.0, 90.0, 30.0, 10.0, 70.0]})
+    df['P_2020'] = df['B_Tot'] * 2
+    path = tmp_path.joinpath('pop.csv')
+    df.to_csv(path, index=False)
+    yield path
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from aggreunit import AdjacencyGraph, get_labels, raster_to_polygon
+
+
+def neighbour_sets(graph):
+    return {int(i): set(graph.neighbours(i).tolist()) for i in graph.ids}
+
+
+def test_from_raster_neighbours(admin_raster):
+    graph = AdjacencyGraph.from_raster(admin_raster)
+    assert graph.ids.tolist() == [0, 1, 2, 3, 4, 5, 6]
+    assert set(graph.neighbours(1).tolist()) == {2, 3, 4}
+    assert set(graph.neighbours(5).tolist()) == {0, 2, 3, 6}
+    assert graph.neighbours(99).size == 0
+
+
+def test_from_raster_windows_match_whole_raster(admin_raster):
+    whole = AdjacencyGraph.from_raster(admin_raster, boundary_length=True)
+    windowed = AdjacencyGraph.from_raster(admin_raster, boundary_length=True, max_pixels=1)
+    assert np.array_equal(whole.indptr, windowed.indptr)
+    assert np.array_equal(whole.indices, windowed.indices)
+    assert np.allclose(whole.weights, windowed.weights)
+
+
+def test_boundary_length(admin_raster):
+    graph = AdjacencyGraph.from_raster(admin_raster, boundary_length=True)
+    lengths = dict(zip(graph.neighbours(3).tolist(), graph.boundary_lengths(3).tolist()))
+    assert lengths[1] == pytest.approx(1.0) #Two pixel edges of 0.5
+    assert lengths[6] == pytest.approx(0.5)
+    with pytest.raises(ValueError):
+        AdjacencyGraph.from_raster(admin_raster).boundary_lengths(3)
+
+
+def test_from_raster_matches_touches(admin_raster):
+    gdf = raster_to_polygon(admin_raster).set_index('adm_id')
+    assert neighbour_sets(AdjacencyGraph.from_raster(admin_raster)) == neighbour_sets(AdjacencyGraph.from_geodataframe(gdf))
+
+
+def test_get_labels_with_raster_graph(admin_raster, sorted_gdf):
+    expected = get_labels(sorted_gdf.copy())
+    got = get_labels(sorted_gdf.copy(), adjacency=AdjacencyGraph.from_raster(admin_raster))
+    assert got.labels.to_dict() == expected.labels.to_dict()
+    assert got.paired.to_dict() == expected.paired.to_dict()
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggreunit import aggr_table, join_population_to_shp, population_columns
+
+
+@pytest.fixture
+def wide_table(tmp_path):
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame({'GID': [1, 2, 3, 4, 5, 6, 99]})
+    for year in (2000, 2020):
+        for band in ('M_0', 'F_0', 'M_5'):
+            df[f'{band}_{year}'] = rng.integers(0, 100, len(df))
+    df['B_Tot'] = rng.random(len(df)) * 100
+    df.loc[2, 'B_Tot'] = np.nan
+    path = tmp_path.joinpath('wide.csv')
+    df.to_csv(path, index=False)
+    yield path
+
+
+def legacy_aggr_table(csv, gdf, pop_col):
+    df = pd.read_csv(csv)
+    df['adm_id'] = df['GID']
+    df = df[['adm_id', pop_col]].set_index('adm_id').join(gdf[['labels']]).reset_index()
+    df['adm_id'] = df['labels']
+    return df[['adm_id', pop_col]].groupby('adm_id').sum()
+
+
+def test_aggr_table_matches_groupby(tmp_path, sorted_gdf, wide_table):
+    labelled = sorted_gdf.copy()
+    labelled['labels'] = [3, 3, 1, 1, 5, 5, 0]
+    out = tmp_path.joinpath('out.csv')
+    aggr_table(wide_table, labelled, out, pop_col='B_Tot', pattern=r'[MF]_\d+_2020')
+    got = pd.read_csv(out, index_col='adm_id')
+    assert got.columns.tolist() == ['M_0_2020', 'F_0_2020', 'M_5_2020', 'B_Tot']
+    for col in got.columns:
+        expected = legacy_aggr_table(wide_table, labelled, col)[col]
+        assert np.allclose(got[col], expected)
+        assert got.index.tolist() == expected.index.tolist()
+
+
+def test_population_columns():
+    columns = ['M_0_2000', 'F_0_2000', 'B_Tot']
+    assert population_columns(columns, ['B_Tot'], r'M_.*') == ['M_0_2000', 'B_Tot']
+    with pytest.raises(KeyError):
+        population_columns(columns, 'P_2020')
+    with pytest.raises(ValueError):
+        population_columns(columns, pattern='X_.*')
+
+
+def test_join_population_columns(sorted_gdf, wide_table):
+    gdf = sorted_gdf.reset_index()[['adm_id', 'geometry']]
+    joined = join_population_to_shp(gdf, wide_table, pop_col=['M_0_2000', 'B_Tot'])
+    assert joined.columns.tolist() == ['geometry', 'M_0_2000', 'B_Tot']
+    assert joined.loc[3, 'B_Tot'] != joined.loc[3, 'B_Tot'] #NaN in the table stays NaN
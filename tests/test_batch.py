@@ -0,0 +1,53 @@
+import json
+
+import pandas as pd
+import pytest
+
+from aggreunit import read_manifest, run_batch
+
+
+@pytest.fixture
+def manifest(tmp_path, admin_raster, area_raster, pop_table):
+    jobs = []
+    for name in ('good', 'bad'):
+        out_dir = tmp_path.joinpath(name)
+        out_dir.mkdir()
+        jobs.append({
+            'job_id': name,
+            'admin_raster': str(admin_raster),
+            'population_table': str(pop_table if name == 'good' else tmp_path.joinpath('missing.csv')),
+            'area_raster': str(area_raster),
+            'out_admin_raster': str(out_dir.joinpath('admin_A.tif')),
+            'out_population_table': str(out_dir.joinpath('pop_A.csv')),
+            'out_admin_shapefile': str(out_dir.joinpath('admin_A.shp')),
+            'raster_method': 'remap',
+        })
+    yield jobs
+
+
+def test_read_manifest_csv(tmp_path, manifest):
+    path = tmp_path.joinpath('manifest.csv')
+    pd.DataFrame(manifest).drop(columns='job_id').assign(target_units=[2, None]).to_csv(path, index=False)
+    jobs = read_manifest(path)
+    assert jobs[0]['job_id'] == 'admin'
+    assert jobs[0]['target_units'] == 2
+    assert 'target_units' not in jobs[1]
+    pd.DataFrame(manifest).assign(job_id=['001', '7']).to_csv(path, index=False)
+    jobs = read_manifest(path)
+    assert [x['job_id'] for x in jobs] == ['001', '7'] #Ids and paths are not cast like options
+    assert all(isinstance(x['admin_raster'], str) for x in jobs)
+    path.write_text('admin_raster\nx.tif\n')
+    with pytest.raises(ValueError):
+        read_manifest(path)
+
+
+def test_run_batch(tmp_path, manifest):
+    path = tmp_path.joinpath('manifest.json')
+    path.write_text(json.dumps({'jobs': manifest}))
+    statuses = run_batch(path, max_workers=2, retries=1, status_path=tmp_path.joinpath('status.csv'))
+    assert [x['job_id'] for x in statuses] == ['good', 'bad']
+    assert statuses[0]['status'] == 'done' and statuses[0]['attempts'] == 1
+    assert statuses[1]['status'] == 'failed' and statuses[1]['attempts'] == 2
+    assert 'missing.csv' in statuses[1]['error']
+    assert tmp_path.joinpath('good', 'pop_A.csv').exists()
+    assert pd.read_csv(tmp_path.joinpath('status.csv')).status.tolist() == ['done', 'failed']
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from aggreunit import AdjacencyGraph, AggregateUnits, ArtifactCache, raster_to_polygon, zonal_sum
+
+
+def test_cache_hits_and_misses(tmp_path, admin_raster, area_raster):
+    cache = ArtifactCache(tmp_path.joinpath('cache'))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return zonal_sum(admin_raster, area_raster)
+
+    ids, sums = cache.area(admin_raster, area_raster, compute)
+    ids_cached, sums_cached = cache.area(admin_raster, area_raster, compute)
+    assert len(calls) == 1
+    assert np.array_equal(ids, ids_cached) and np.allclose(sums, sums_cached, equal_nan=True)
+    graph = cache.adjacency(admin_raster, lambda: AdjacencyGraph.from_raster(admin_raster, boundary_length=True))
+    cached_graph = cache.adjacency(admin_raster, lambda: None)
+    assert np.array_equal(graph.indices, cached_graph.indices) and np.allclose(graph.weights, cached_graph.weights)
+    units = cache.units(admin_raster, lambda: raster_to_polygon(admin_raster))
+    assert cache.units(admin_raster, lambda: None).adm_id.tolist() == units.adm_id.tolist()
+    #Changing the content of the raster misses
+    area_raster.write_bytes(area_raster.read_bytes() + b'\0')
+    cache.area(admin_raster, area_raster, compute)
+    assert len(calls) == 2
+
+
+def test_cache_evicts_least_recently_used(tmp_path, admin_raster, area_raster):
+    cache = ArtifactCache(tmp_path.joinpath('cache'))
+    cache.area(admin_raster, area_raster, lambda: zonal_sum(admin_raster, area_raster))
+    one_artifact = cache.size()
+    cache.max_bytes = one_artifact
+    cache.adjacency(admin_raster, lambda: AdjacencyGraph.from_raster(admin_raster))
+    assert len(cache._artifacts()) == 1
+    assert cache.adjacency(admin_raster, lambda: None) is not None
+
+
+def test_aggregate_with_cache(tmp_path, admin_raster, area_raster, pop_table):
+    tables = []
+    for run in range(2):
+        out = tmp_path.joinpath(f'pop_A_{run}.csv')
+        AggregateUnits(admin_raster, pop_table, area_raster, tmp_path.joinpath(f'admin_A_{run}.tif'), out,
+                       tmp_path.joinpath(f'admin_A_{run}.shp'), raster_method='remap', cache_dir=tmp_path.joinpath('cache'))._aggregate()
+        tables.append(pd.read_csv(out))
+    pd.testing.assert_frame_equal(tables[0], tables[1])
+    assert len(list(tmp_path.joinpath('cache').glob('*.parquet'))) == 1
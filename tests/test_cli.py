@@ -0,0 +1,59 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+import rasterio
+
+from aggreunit.cli import main, parse_bytes
+
+
+def test_parse_bytes():
+    assert parse_bytes('8G') == 8 * 2 ** 30
+    assert parse_bytes('512mb') == 512 * 2 ** 20
+    assert parse_bytes('1000') == 1000
+
+
+def test_run_stage_subset_and_resume(tmp_path, admin_raster, area_raster, pop_table):
+    work = tmp_path.joinpath('work')
+    common = [str(admin_raster), str(pop_table), str(area_raster), '--work-dir', str(work)]
+    assert main(['run', *common, '--out-table', str(tmp_path.joinpath('pop_A.csv')), '--stages', 'labels', 'table']) == 0
+    state = json.loads(work.joinpath('state.json').read_text())
+    assert state['done'] == ['units', 'density', 'labels', 'table']
+    assert not tmp_path.joinpath('admin_A.tif').exists()
+    #Resume: labels are read back from the work dir, only the raster is made
+    out_raster = tmp_path.joinpath('admin_A.tif')
+    from aggreunit import AggregateUnits
+    agg = AggregateUnits(admin_raster, pop_table, area_raster, out_raster, tmp_path.joinpath('pop_A.csv'), None, raster_method='remap')
+    agg.run(work_dir=work, resume=True)
+    assert [x.name for x in agg.report] == ['rasterize']
+    fresh = AggregateUnits(admin_raster, pop_table, area_raster, tmp_path.joinpath('fresh.tif'), None, None, raster_method='remap')
+    fresh.run()
+    with rasterio.open(out_raster) as a, rasterio.open(fresh.out_admin_raster) as b:
+        assert np.array_equal(a.read(1), b.read(1))
+    #A work dir of other inputs is refused
+    other_table = tmp_path.joinpath('other.csv')
+    pd.read_csv(pop_table).to_csv(other_table, index=False)
+    with pytest.raises(ValueError):
+        AggregateUnits(admin_raster, other_table, area_raster, out_raster, None, None).run(work_dir=work, resume=True)
+
+
+def test_batch_reports_failed_numeric_job(tmp_path, capsys, area_raster, pop_table):
+    manifest = tmp_path.joinpath('m.json')
+    manifest.write_text(json.dumps([{'job_id': 7, 'admin_raster': str(tmp_path.joinpath('missing.tif')), 'population_table': str(pop_table),
+                                     'area_raster': str(area_raster), 'out_admin_raster': None,
+                                     'out_population_table': str(tmp_path.joinpath('pop_A.csv')), 'out_admin_shapefile': None}]))
+    assert main(['batch', str(manifest), '--workers', '1', '--retries', '0']) == 1
+    assert capsys.readouterr().out.strip().endswith('failed: 7')
+
+
+@pytest.mark.parametrize('option', [{'coverage_dissolve': True}, {'max_pixels': 16}, {'table_columns': ['B_Tot']},
+                                    {'table_pattern': 'B_.*'}, {'raster_method': 'tiled'}])
+def test_resume_refuses_other_options(tmp_path, admin_raster, area_raster, pop_table, option):
+    work = tmp_path.joinpath('work')
+    outputs = [tmp_path.joinpath('admin_A.tif'), tmp_path.joinpath('pop_A.csv'), tmp_path.joinpath('admin_A.gpkg')]
+    from aggreunit import AggregateUnits
+    AggregateUnits(admin_raster, pop_table, area_raster, *outputs, raster_method='remap').run(work_dir=work)
+    AggregateUnits(admin_raster, pop_table, area_raster, *outputs, raster_method='remap').run(work_dir=work, resume=True)
+    with pytest.raises(ValueError):
+        AggregateUnits(admin_raster, pop_table, area_raster, *outputs, **{'raster_method': 'remap', **option}).run(work_dir=work, resume=True)
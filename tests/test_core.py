@@ -0,0 +1,18 @@
+import subprocess
+import sys
+
+
+def test_import_is_raster_only():
+    code = ("import sys, aggreunit, aggreunit.core\n"
+            "heavy = [m for m in ('pandas', 'geopandas', 'shapely', 'fiona', 'rasterstats') if m in sys.modules]\n"
+            "assert not heavy, heavy\n"
+            "aggreunit.raster_to_polygon\n"
+            "assert 'geopandas' in sys.modules\n")
+    subprocess.run([sys.executable, '-c', code], check=True)
+
+
+def test_lazy_names():
+    import aggreunit
+    assert 'AggregateUnits' in dir(aggreunit) and 'AggregateUnits' in aggreunit.__all__
+    from aggreunit import AggregateUnits, write_vector
+    assert aggreunit.AggregateUnits is AggregateUnits
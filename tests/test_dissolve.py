@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+import shapely
+
+from aggreunit import compact_coverage, coverage_dissolve, dissolve_admin_units, lod_path, raster_to_polygon, read_vector, save_shapefile
+from aggreunit import util_functions
+
+from .conftest import write_raster
+
+
+def assert_same_dissolve(got, expected):
+    assert got.index.tolist() == expected.index.tolist()
+    assert got.columns.tolist() == expected.columns.tolist()
+    for key, geom in expected.geometry.items():
+        assert geom.symmetric_difference(got.geometry[key]).area < 1e-9
+
+
+def voronoi_grid(n_units=6, size=40, seed=5):
+    """Voronoi units with staircase borders (GDAL only keeps each polygon's own corners along them)"""
+    rng = np.random.default_rng(seed)
+    seeds = rng.random((n_units, 2)) * size
+    rows, cols = np.mgrid[:size, :size]
+    distance = np.hypot(rows[..., None] - seeds[:, 0], cols[..., None] - seeds[:, 1])
+    return (distance.argmin(axis=-1) + 1).astype(np.int32)
+
+
+def test_coverage_raster_to_polygon(tmp_path):
+    rng = np.random.default_rng(4)
+    grid = rng.integers(1, 8, size=(20, 20)).astype(np.int32)
+    raster = write_raster(tmp_path.joinpath('grid.tif'), grid)
+    assert_same_dissolve(raster_to_polygon(raster, coverage=True, n_jobs=2), raster_to_polygon(raster))
+
+
+def test_coverage_dissolve_admin_units(sorted_gdf):
+    labelled = sorted_gdf.copy()
+    labelled['labels'] = [3, 3, 1, 1, 5, 5, 0]
+    expected = dissolve_admin_units(labelled)
+    assert_same_dissolve(dissolve_admin_units(labelled, coverage=True, n_jobs=3), expected)
+    assert len(coverage_dissolve(labelled.reset_index(), 'labels')) == 4
+
+
+def test_coverage_dissolve_voronoi_units(tmp_path):
+    raster = write_raster(tmp_path.joinpath('grid.tif'), voronoi_grid(n_units=30, size=60, seed=0))
+    raw = raster_to_polygon(raster).set_index('adm_id')
+    assert not shapely.coverage_is_valid(raw.geometry.values) #Not noded as GEOS expects
+    raw['labels'] = raw.index.to_numpy() % 2 #Groups of touching units along mismatched edges
+    with pytest.raises(ValueError):
+        dissolve_admin_units(raw, coverage=True)
+    expected = dissolve_admin_units(raw)
+    for max_pixels in (None, 256):
+        units = raster_to_polygon(raster, max_pixels=max_pixels, coverage=True).set_index('adm_id')
+        assert shapely.coverage_is_valid(units.geometry.values) #Noded along pixel edges
+        assert_same_dissolve(units, raw[['geometry']])
+        units['labels'] = units.index.to_numpy() % 2
+        assert_same_dissolve(dissolve_admin_units(units, coverage=True, n_jobs=2), expected)
+
+
+def test_compact_coverage_keeps_shared_borders(tmp_path):
+    gdf = raster_to_polygon(write_raster(tmp_path.joinpath('grid.tif'), voronoi_grid()), coverage=True).set_index('adm_id')
+    paths = save_shapefile(gdf, tmp_path.joinpath('units.gpkg'), tolerance=0.5, precision=0.01, lods=[1.0, 3.0])
+    assert paths == [tmp_path.joinpath('units.gpkg'), lod_path(tmp_path.joinpath('units.gpkg'), 1), tmp_path.joinpath('units_lod2.gpkg')]
+    counts = [shapely.get_num_coordinates(gdf.geometry.values).sum()]
+    for path in paths:
+        level = read_vector(path)
+        assert len(level) == len(gdf)
+        assert shapely.coverage_is_valid(level.geometry.values) #Borders still shared exactly, no gaps/overlaps
+        coords = shapely.get_coordinates(level.geometry.values)
+        assert np.allclose(coords, np.round(coords / 0.01) * 0.01)
+        counts.append(shapely.get_num_coordinates(level.geometry.values).sum())
+    assert counts[0] > counts[1] >= counts[2] >= counts[3]
+    compact = compact_coverage(gdf, tolerance=0.5)
+    assert np.isclose(compact.area.sum(), gdf.area.sum()) and compact.index.tolist() == gdf.index.tolist()
+
+
+def test_save_shapefile_nodes_once(tmp_path, monkeypatch):
+    gdf = raster_to_polygon(write_raster(tmp_path.joinpath('grid.tif'), voronoi_grid())).set_index('adm_id')
+    calls = []
+    node = util_functions._node_coverage
+    monkeypatch.setattr(util_functions, '_node_coverage', lambda geoms: calls.append(1) or node(geoms))
+    save_shapefile(gdf, tmp_path.joinpath('units.gpkg'), tolerance=0.5, lods=[1.0, 3.0])
+    save_shapefile(gdf, tmp_path.joinpath('snapped.gpkg'), precision=0.01)
+    assert len(calls) == 1 #Levels of detail share one noding, precision alone doesn't node
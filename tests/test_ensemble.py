@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from aggreunit import AdjacencyGraph, get_ensemble_labels, get_labels, get_target_labels, reorder_rows, run_ensemble, sort_by_density
+
+from .conftest import write_raster
+
+
+@pytest.fixture
+def random_units(tmp_path):
+    """Polygonised random grid with unique densities, sorted as in AggregateUnits"""
+    from aggreunit import raster_to_polygon
+    rng = np.random.default_rng(7)
+    grid = rng.integers(1, 40, size=(24, 24)).astype(np.int32)
+    raster = write_raster(tmp_path.joinpath('grid.tif'), grid)
+    gdf = raster_to_polygon(raster).set_index('adm_id')
+    gdf['P_2020'] = rng.random(len(gdf)) * 100
+    gdf['area'] = 1.0
+    gdf['density'] = gdf['P_2020']
+    yield sort_by_density(gdf), AdjacencyGraph.from_raster(raster)
+
+
+def test_reorder_rows():
+    graph = AdjacencyGraph.from_pairs(np.arange(4), np.array([0, 0, 1]), np.array([1, 2, 3]))
+    indptr, indices = reorder_rows(graph.indptr, graph.indices, np.array([3, 2, 1, 0]))
+    #Old rows 3, 2, 1, 0 -> new rows 0..3 and neighbours renumbered and sorted
+    assert indptr.tolist() == [0, 1, 2, 4, 6]
+    assert indices.tolist() == [2, 3, 0, 3, 1, 2]
+
+
+def test_member_without_noise_matches_get_labels(random_units):
+    gdf, adjacency = random_units
+    expected = get_labels(gdf.copy(), adjacency=adjacency)['labels'].to_numpy()
+    labels = get_ensemble_labels(gdf, 2, adjacency=adjacency, noise=0, max_workers=1)
+    assert labels.dtype == np.int32 and labels.shape == (2, len(gdf))
+    assert (labels == expected).all()
+    target, _ = get_target_labels(gdf.copy(), 0.25, adjacency=adjacency)
+    labels = get_ensemble_labels(gdf, 1, adjacency=adjacency, noise=0, target_units=0.25, max_workers=1)
+    assert (labels[0] == target['labels'].to_numpy()).all()
+
+
+def test_ensemble_pool_matches_serial(random_units):
+    gdf, adjacency = random_units
+    serial = get_ensemble_labels(gdf, 6, adjacency=adjacency, seed=3, noise=0.5, target_units=[None, None, 10, 20, 0.5, None], max_workers=1)
+    pooled = get_ensemble_labels(gdf, 6, adjacency=adjacency, seed=3, noise=0.5, target_units=[None, None, 10, 20, 0.5, None], max_workers=2)
+    assert np.array_equal(serial, pooled)
+    assert len(np.unique(serial[2])) == 10 and len(np.unique(serial[3])) == 20
+    assert not (serial[0] == serial[1]).all() #Members differ
+    with pytest.raises(ValueError):
+        run_ensemble(gdf.index.to_numpy(), adjacency.indptr, adjacency.indices, gdf['density'].to_numpy(), 2, target_units=[5])
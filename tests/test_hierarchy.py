@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggreunit import AdjacencyGraph, AggregateUnits, MergeHierarchy, build_hierarchy, get_labels, get_target_labels, raster_to_polygon, sort_by_density
+
+from .conftest import write_raster
+
+
+@pytest.fixture
+def random_gdf(tmp_path):
+    rng = np.random.default_rng(3)
+    grid = rng.integers(0, 60, size=(12, 12)).repeat(2, axis=0).repeat(2, axis=1).astype(np.int32)
+    raster = write_raster(tmp_path.joinpath('random.tif'), grid)
+    gdf = raster_to_polygon(raster).set_index('adm_id')
+    gdf['P_2020'] = rng.random(len(gdf)) * 100
+    gdf['area'] = 1.0
+    gdf['density'] = gdf['P_2020'] / gdf['area']
+    yield sort_by_density(gdf), AdjacencyGraph.from_raster(raster)
+
+
+def test_single_round_matches_get_labels(random_gdf):
+    gdf, graph = random_gdf
+    expected = get_labels(gdf.copy(), adjacency=graph)
+    got, hierarchy = get_target_labels(gdf.copy(), expected.labels.nunique(), adjacency=graph)
+    assert got.labels.to_dict() == expected.labels.to_dict()
+
+
+def test_every_level_has_requested_units(random_gdf):
+    gdf, graph = random_gdf
+    gdf, hierarchy = get_target_labels(gdf, 0.1, adjacency=graph)
+    assert gdf.labels.nunique() == round(hierarchy.n_seeds * 0.1)
+    for n_units in range(hierarchy.min_units, hierarchy.n_seeds + 1):
+        labels = hierarchy.labels(n_units)
+        assert len(np.unique(labels)) == n_units
+        assert labels[gdf.index == 0].tolist() == [0] #Water is never merged
+    with pytest.raises(ValueError):
+        hierarchy.labels(hierarchy.min_units - 1)
+
+
+def test_build_hierarchy_chain():
+    #Chain 0 - 1 - 2 - 3
+    indptr = np.array([0, 1, 3, 5, 6])
+    indices = np.array([1, 0, 2, 1, 3, 2])
+    merges = build_hierarchy(indptr, indices, np.array([1.0, 8.0, 2.0, 4.0]), np.ones(4))
+    #Round 0: 1 takes its densest neighbour 2, 3 and 0 only touch the new cluster so wait. Round 1: 1 (density 5) takes 3
+    assert merges.tolist() == [[1, 2], [1, 3], [1, 0]]
+    assert MergeHierarchy([10, 11, 12, 13], merges).labels(2).tolist() == [10, 11, 11, 11]
+
+
+def test_aggregate_to_target(tmp_path, admin_raster, area_raster, pop_table):
+    agg = AggregateUnits(admin_raster, pop_table, area_raster, tmp_path.joinpath('admin_A.tif'), tmp_path.joinpath('pop_A.csv'),
+                         tmp_path.joinpath('admin_A.shp'), raster_method='remap', target_units=2)
+    agg._aggregate()
+    df = pd.read_csv(agg.out_population_table)
+    assert agg.hierarchy.min_units == 2
+    assert len(df) == 1 #Every populated unit merged into one, water (0) has no population row
+    assert df.B_Tot.sum() == pytest.approx(pd.read_csv(pop_table).B_Tot.sum())
@@ -0,0 +1,32 @@
+import numpy as np
+
+from aggreunit import AdjacencyGraph, IdIndex, join_rows, zonal_reduce, zonal_sum
+
+from .conftest import GRID, NODATA, write_raster
+
+SPARSE = np.where(GRID == NODATA, NODATA, GRID * 123456789 + 900000000 * (GRID > 0)).astype(np.int64)
+
+
+def test_id_index():
+    index = IdIndex([987654321, 5, 123456789, 5])
+    assert index.ids.tolist() == [5, 123456789, 987654321] and len(index) == 3
+    assert index.codes([[123456789, 7], [5, 987654321]]).tolist() == [[1, -1], [0, 2]]
+    assert index.rows([987654321, 42, 5]).tolist() == [2, -1, 0]
+    assert join_rows([5, 6, 987654321], [987654321, 5]).tolist() == [1, -1, 0]
+    assert join_rows([1, 2], []).tolist() == [-1, -1]
+    assert IdIndex([]).codes([1]).tolist() == [-1]
+
+
+def test_dense_zonal_and_adjacency_match_sparse_ids(tmp_path, area_raster):
+    admin = write_raster(tmp_path.joinpath('sparse.tif'), SPARSE, dtype='int64')
+    ids, sums = zonal_sum(admin, area_raster, num_threads=1)
+    index = IdIndex(ids)
+    ids_d, sums_d = zonal_sum(admin, area_raster, max_pixels=1, num_threads=2, index=index)
+    assert np.array_equal(ids, ids_d) and np.allclose(sums, sums_d, equal_nan=True)
+    assert ids.max() > 10 ** 9 #Dense arrays are sized by the units, not the largest id
+    partial = IdIndex(ids[:3])
+    assert zonal_reduce(admin, [area_raster], index=partial)[1].shape == (3, 1)
+    graph = AdjacencyGraph.from_raster(admin)
+    dense = AdjacencyGraph.from_raster(admin, index=index)
+    assert np.array_equal(graph.ids, dense.ids) and np.array_equal(graph.indices, dense.indices)
+    assert np.array_equal(graph.index_of(ids[::-1]), np.arange(len(ids))[::-1])
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+import rasterio
+
+from aggreunit import AggregateUnits, LabelMap, read_vector
+
+from .conftest import GRID, write_raster
+
+
+def test_label_map_round_trip(tmp_path, sorted_gdf, admin_raster):
+    labelled = sorted_gdf.copy()
+    labelled['labels'] = [3, 3, 1, 1, 5, 5, 0]
+    label_map = LabelMap.from_gdf(labelled, admin_raster=admin_raster, pop_col='B_Tot')
+    label_map.save(tmp_path.joinpath('labels.npz'))
+    loaded = LabelMap.load(tmp_path.joinpath('labels.npz'))
+    assert loaded.ids.tolist() == labelled.index.tolist()
+    assert loaded.labels.tolist() == [3, 3, 1, 1, 5, 5, 0]
+    assert loaded.n_units == 4
+    assert loaded.provenance == label_map.provenance and loaded.provenance['pop_col'] == 'B_Tot'
+    loaded.check(admin_raster)
+    other = write_raster(tmp_path.joinpath('other.tif'), GRID[::-1].copy())
+    with pytest.raises(ValueError):
+        loaded.check(other)
+    with pytest.raises(ValueError):
+        LabelMap([1, 1], [2, 3])
+
+
+def test_apply_label_map(tmp_path, admin_raster, area_raster, pop_table):
+    first = AggregateUnits(admin_raster, pop_table, area_raster, tmp_path.joinpath('admin_A.tif'), tmp_path.joinpath('pop_A.csv'),
+                           tmp_path.joinpath('admin_A.shp'), raster_method='remap', out_label_map=tmp_path.joinpath('labels.npz'))
+    first._aggregate()
+    #New release with different populations: labels must stay those of the first run
+    new_table = tmp_path.joinpath('pop_2025.csv')
+    df = pd.read_csv(pop_table)
+    df['B_Tot'] = df['B_Tot'][::-1].to_numpy()
+    df.to_csv(new_table, index=False)
+    apply = AggregateUnits(admin_raster, new_table, None, tmp_path.joinpath('admin_B.tif'), tmp_path.joinpath('pop_B.csv'),
+                           tmp_path.joinpath('admin_B.gpkg'), label_map=tmp_path.joinpath('labels.npz'))
+    apply._aggregate()
+    assert [x.name for x in apply.report] == ['load_label_map', 'aggr_table', 'rasterize', 'dissolve', 'save_shapefile']
+    with rasterio.open(first.out_admin_raster) as a, rasterio.open(apply.out_admin_raster) as b:
+        assert np.array_equal(a.read(1), b.read(1))
+    label_map = LabelMap.load(tmp_path.joinpath('labels.npz'))
+    expected = df.set_index('GID')['B_Tot'].groupby(label_map.to_frame()['labels']).sum()
+    got = pd.read_csv(apply.out_population_table, index_col='adm_id')['B_Tot']
+    assert np.allclose(got.loc[expected.index], expected)
+    dissolved = read_vector(apply.out_admin_shapefile)
+    assert sorted(dissolved['adm_id']) == sorted(np.unique(label_map.labels))
+
+
+def test_apply_label_map_removes_remapped_raster(tmp_path, monkeypatch, admin_raster, area_raster, pop_table):
+    first = AggregateUnits(admin_raster, pop_table, area_raster, None, tmp_path.joinpath('pop_A.csv'), None,
+                           out_label_map=tmp_path.joinpath('labels.npz'))
+    first.run()
+    scratch = tmp_path.joinpath('scratch')
+    scratch.mkdir()
+    monkeypatch.setattr('tempfile.tempdir', str(scratch))
+    apply = AggregateUnits(admin_raster, pop_table, None, None, None, tmp_path.joinpath('admin_B.gpkg'),
+                           label_map=tmp_path.joinpath('labels.npz'))
+    apply.run()
+    assert read_vector(apply.out_admin_shapefile)['adm_id'].nunique() == LabelMap.load(tmp_path.joinpath('labels.npz')).n_units
+    assert not list(scratch.iterdir())
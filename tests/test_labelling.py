@@ -0,0 +1,59 @@
+import numpy as np
+
+from aggreunit import AdjacencyGraph, get_labels, pair_units, raster_to_polygon, sort_by_density
+
+from .conftest import write_raster
+
+
+def legacy_get_labels(gdf):
+    """Original row-by-row implementation of get_labels, kept as reference for the pairing engine"""
+    required_number_of_units = round(len(gdf.labels.unique()) - (len(gdf.labels.unique()) * 0.5))
+    gdf.loc[gdf.labels == 0, 'labels'] = 0
+    gdf.loc[gdf.labels == 0, 'paired'] = True
+    for index, row in gdf.iterrows():
+        if len(gdf.labels.unique()) <= required_number_of_units:
+            break
+        if not gdf.loc[index, 'labels'] == 0:
+            if gdf.loc[index, 'paired'] == False:
+                neighbour_df = gdf[gdf.geometry.touches(row['geometry'])]
+                for i, neighbour in neighbour_df.iterrows():
+                    if gdf.at[i, 'paired'] == False:
+                        gdf.at[index, 'paired'] = True
+                        gdf.at[i, 'paired'] = True
+                        gdf.at[index, 'labels'] = index
+                        gdf.at[i, 'labels'] = index
+                        break
+    return gdf
+
+
+def test_get_labels_matches_legacy(sorted_gdf):
+    expected = legacy_get_labels(sorted_gdf.copy())
+    got = get_labels(sorted_gdf.copy())
+    assert got.labels.to_dict() == expected.labels.to_dict()
+    assert got.paired.to_dict() == expected.paired.to_dict()
+
+
+def test_get_labels_matches_legacy_random_grid(tmp_path):
+    rng = np.random.default_rng(0)
+    #Blocky random grid with sparse ids and a water unit
+    grid = rng.integers(0, 40, size=(8, 10)).repeat(2, axis=0).repeat(2, axis=1).astype(np.int32) * 1000
+    raster = write_raster(tmp_path.joinpath('random.tif'), grid)
+    gdf = raster_to_polygon(raster).set_index('adm_id')
+    gdf['density'] = rng.random(len(gdf))
+    gdf = sort_by_density(gdf)
+    expected = legacy_get_labels(gdf.copy())
+    got = get_labels(gdf.copy(), adjacency=AdjacencyGraph.from_raster(raster))
+    assert got.labels.to_dict() == expected.labels.to_dict()
+    assert got.paired.to_dict() == expected.paired.to_dict()
+
+
+def test_pair_units_counts_units():
+    #Chain 0 - 1 - 2 - 3 with rows already in density order
+    indptr = np.array([0, 1, 3, 5, 6])
+    indices = np.array([1, 0, 2, 1, 3, 2], dtype=np.int32)
+    codes = np.arange(4, dtype=np.int32)
+    labels, paired, n_units, finished = pair_units(indptr, indices, codes.copy(), codes, np.zeros(4, dtype=bool), 2)
+    assert labels.tolist() == [0, 0, 2, 2]
+    assert paired.all()
+    assert n_units == 2
+    assert finished
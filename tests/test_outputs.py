@@ -0,0 +1,21 @@
+import pytest
+
+from aggreunit import AggregateUnits, read_vector
+
+
+def test_outputs_written_concurrently(tmp_path, admin_raster, area_raster, pop_table):
+    agg = AggregateUnits(admin_raster, pop_table, area_raster, tmp_path.joinpath('admin_A.tif'), tmp_path.joinpath('pop_A.csv'),
+                         tmp_path.joinpath('admin_A.gpkg'), save_admin_shape=True, shape_format='.gpkg', raster_method='tiled')
+    agg.run()
+    names = [x.name for x in agg.report]
+    assert names[-4:] == ['save_admin_shape', 'aggr_table', 'save_shapefile', 'rasterize']
+    assert agg.out_admin_raster.exists() and agg.out_population_table.exists()
+    assert 'density' in read_vector(tmp_path.joinpath('admin.gpkg')).columns
+
+
+def test_output_error_propagates(tmp_path, admin_raster, area_raster, pop_table):
+    agg = AggregateUnits(admin_raster, pop_table, area_raster, tmp_path.joinpath('admin_A.tif'), tmp_path.joinpath('pop_A.csv'),
+                         tmp_path.joinpath('admin_A.xyz'), raster_method='remap')
+    with pytest.raises(ValueError, match='No vector writer'):
+        agg.run()
+    assert agg.report['save_shapefile'].error is not None
@@ -0,0 +1,20 @@
+import numpy as np
+
+from aggreunit import raster_to_polygon
+
+from .conftest import write_raster
+
+
+def test_streamed_polygons_match_whole_raster(tmp_path):
+    rng = np.random.default_rng(1)
+    grid = rng.integers(1, 6, size=(5, 6)).repeat(3, axis=0).repeat(3, axis=1).astype(np.int32)
+    grid[:2, :2] = -99
+    #Tiled raster so windows are smaller than the raster
+    raster = write_raster(tmp_path.joinpath('tiled.tif'), np.pad(grid, ((0, 17), (0, 14)), constant_values=7),
+                          tiled=True, blockxsize=16, blockysize=16)
+    whole = raster_to_polygon(raster).set_index('adm_id')
+    streamed = raster_to_polygon(raster, max_pixels=256).set_index('adm_id')
+    assert sorted(whole.index) == sorted(streamed.index)
+    for adm_id, geom in whole.geometry.items():
+        assert geom.symmetric_difference(streamed.geometry[adm_id]).area < 1e-9
+        assert streamed.geometry[adm_id].area == geom.area
@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from aggreunit import AggregateUnits, Profiler
+
+
+def test_profiler_records_stages(tmp_path):
+    seen = []
+    profiler = Profiler(pipeline='test', jsonl_path=tmp_path.joinpath('profile.jsonl'), hooks=[seen.append])
+    profiler.add_hook(lambda record: 1 / 0)
+    with pytest.warns(UserWarning):
+        with profiler.stage('first', pixels=10) as record:
+            record.rows = 3
+    with pytest.raises(KeyError), pytest.warns(UserWarning):
+        with profiler.stage('second'):
+            raise KeyError('boom')
+    assert [x.name for x in profiler.report] == ['first', 'second']
+    assert profiler.report['first'].rows == 3 and profiler.report['first'].pixels == 10
+    assert profiler.report['second'].error == "KeyError('boom')"
+    assert len(seen) == 2
+    lines = [json.loads(x) for x in tmp_path.joinpath('profile.jsonl').read_text().splitlines()]
+    assert [x['stage'] for x in lines] == ['first', 'second']
+    assert lines[0]['pipeline'] == 'test' and lines[0]['seconds'] >= 0
+    if lines[0]['process_peak_rss'] is not None: #Process high-water mark, and how much the stage raised it
+        assert 0 <= lines[0]['rss_growth'] <= lines[0]['process_peak_rss'] <= lines[1]['process_peak_rss']
+    assert 'total' in str(profiler.report)
+
+
+def test_aggregate_report(tmp_path, admin_raster, area_raster, pop_table):
+    agg = AggregateUnits(admin_raster, pop_table, area_raster, tmp_path.joinpath('admin_A.tif'), tmp_path.joinpath('pop_A.csv'),
+                         tmp_path.joinpath('admin_A.shp'), raster_method='remap', profile_path=tmp_path.joinpath('profile.jsonl'))
+    agg._aggregate()
+    stages = [x.name for x in agg.report]
+    assert stages == ['raster_to_polygon', 'zonal_area', 'adjacency', 'join_population', 'pop_density', 'sort_by_density', 'labels',
+                      'dissolve', 'aggr_table', 'save_shapefile', 'rasterize']
+    assert agg.report['raster_to_polygon'].pixels == 20
+    assert agg.report['labels'].rows == 7
+    assert len(tmp_path.joinpath('profile.jsonl').read_text().splitlines()) == len(stages)
@@ -0,0 +1,22 @@
+import numpy as np
+import rasterio
+
+from aggreunit import raster_to_polygon
+from aggreunit.rasterize_geoms import RasterizeAdminUnits
+
+from .conftest import write_raster
+
+
+def test_rasterize_tiled_matches_rasterize_geometries(tmp_path):
+    rng = np.random.default_rng(2)
+    grid = rng.integers(1, 30, size=(10, 12)).repeat(5, axis=0).repeat(4, axis=1).astype(np.int32)
+    grid[:7, :9] = -99
+    raster = write_raster(tmp_path.joinpath('grid.tif'), grid)
+    gdf = raster_to_polygon(raster)
+    RasterizeAdminUnits(gdf, raster, tmp_path.joinpath('whole.tif')).rasterize_geometries()
+    RasterizeAdminUnits(gdf, raster, tmp_path.joinpath('tiled.tif')).rasterize_tiled(blocksize=16, num_threads=3)
+    with rasterio.open(tmp_path.joinpath('whole.tif')) as whole, rasterio.open(tmp_path.joinpath('tiled.tif')) as tiled:
+        assert tiled.block_shapes[0] == (16, 16)
+        assert tiled.nodata == whole.nodata
+        assert np.array_equal(whole.read(1), tiled.read(1))
+        assert np.array_equal(tiled.read(1), grid)
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+import rasterio
+
+from aggreunit import AggregateUnits, LookupTable, rasterize, remap_raster, zonal_sum
+
+from .conftest import GRID, NODATA, write_raster
+
+
+def test_lookup_table():
+    lookup = LookupTable([30, 10, 20], [1, 2, 3])
+    assert lookup.apply(np.array([[10, 20], [30, 40]]), -1).tolist() == [[2, 3], [1, -1]]
+    with pytest.raises(ValueError):
+        LookupTable([1, 1], [2, 3])
+
+
+def test_remap_raster(tmp_path, admin_raster):
+    out = tmp_path.joinpath('remapped.tif')
+    remap_raster(admin_raster, [0, 1, 2, 3, 4, 5], [0, 1, 1, 3, 3, 5], out, max_pixels=1)
+    with rasterio.open(out) as src:
+        data = src.read(1)
+        assert src.nodata == NODATA
+    expected = np.array([[1, 1, 1, 1, 0], [1, 3, 3, 1, 0], [3, 3, 3, 5, 0], [3, NODATA, NODATA, 5, NODATA]])
+    assert data.tolist() == expected.tolist()
+
+
+def test_remap_matches_rasterize(tmp_path, admin_raster, area_raster, pop_table):
+    outputs = {}
+    for method in ('rasterize', 'remap'):
+        out_dir = tmp_path.joinpath(method)
+        out_dir.mkdir()
+        agg = AggregateUnits(admin_raster, pop_table, area_raster, out_dir.joinpath('admin_A.tif'), out_dir.joinpath('pop_A.csv'),
+                             out_dir.joinpath('admin_A.shp'), raster_method=method)
+        agg._aggregate()
+        with rasterio.open(agg.out_admin_raster) as src:
+            outputs[method] = src.read(1)
+    assert np.array_equal(outputs['rasterize'], outputs['remap'])
+
+
+def test_remap_raster_value_sums(tmp_path, admin_raster, area_raster):
+    ids, labels = [0, 1, 2, 3, 4, 5, 6], [0, 1, 1, 3, 3, 5, 6]
+    got_labels, sums = remap_raster(admin_raster, ids, labels, tmp_path.joinpath('remapped.tif'), max_pixels=1, value_raster=area_raster)
+    unit_ids, unit_sums = zonal_sum(admin_raster, area_raster)
+    expected = pd.Series(unit_sums, index=unit_ids).groupby(pd.Series(labels, index=ids)).sum()
+    assert got_labels.tolist() == expected.index.tolist()
+    assert np.allclose(sums, expected.to_numpy())
+
+
+def test_constrained_mode_matches_polygons(tmp_path, admin_raster, area_raster, pop_table):
+    constrained = np.where(np.arange(GRID.size).reshape(GRID.shape) % 3 == 0, GRID, NODATA).astype(np.int32)
+    constrained_raster = write_raster(tmp_path.joinpath('constrained.tif'), constrained)
+    agg = AggregateUnits(admin_raster, pop_table, area_raster, tmp_path.joinpath('admin_A.tif'), tmp_path.joinpath('pop_A.csv'),
+                         tmp_path.joinpath('admin_A.shp'), raster_method='remap', constrained_raster=constrained_raster,
+                         out_constrained_raster=tmp_path.joinpath('constrained_A.tif'), constrained_value_raster=area_raster,
+                         out_constrained_table=tmp_path.joinpath('constrained_A.csv'))
+    agg._aggregate()
+    with rasterio.open(agg.out_admin_raster) as src:
+        unconstrained_a = src.read(1)
+    with rasterio.open(agg.out_constrained_raster) as src:
+        constrained_a = src.read(1)
+    built = constrained != NODATA
+    assert np.array_equal(constrained_a[built], unconstrained_a[built])
+    assert (constrained_a[~built] == NODATA).all()
+    table = pd.read_csv(agg.out_constrained_table, index_col='adm_id')
+    with rasterio.open(area_raster) as src:
+        area = src.read(1)
+    for label, total in table['B_Tot'].items():
+        pixels = (constrained_a == label) & (area != -1)
+        assert np.isclose(total, area[pixels].sum()) if pixels.any() else np.isnan(total)
+    assert 'constrained' in [x.name for x in agg.report]
@@ -0,0 +1,53 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+import rasterio
+
+from aggreunit import AggregateUnits, LabelMap, validation_metrics
+
+from .conftest import GRID, write_raster
+
+
+def test_validation_metrics():
+    abs_error, rel_error, summary = validation_metrics([10.0, 20.0, 0.0, 5.0], [12.0, 16.0, 1.0, np.nan])
+    assert abs_error[:3].tolist() == [2.0, -4.0, 1.0] and np.isnan(abs_error[3])
+    assert rel_error[:2].tolist() == [0.2, -0.2] and np.isnan(rel_error[2:]).all()
+    assert summary['n_units'] == 3 and summary['census_total'] == 30.0 and summary['modelled_total'] == 29.0
+    assert np.isclose(summary['rmse'], np.sqrt(21 / 3))
+    assert np.isclose(summary['pct_mae'], (7 / 3) / 10 * 100)
+    with pytest.raises(ValueError):
+        validation_metrics([1.0], [1.0, 2.0])
+
+
+@pytest.mark.parametrize('method', ['remap', 'rasterize'])
+def test_validation_stage(tmp_path, admin_raster, area_raster, pop_table, method):
+    ppp = np.where(GRID > 0, GRID * 2.5, -1).astype(np.float32)
+    ppp_raster = write_raster(tmp_path.joinpath('ppp.tif'), ppp, nodata=-1)
+    agg = AggregateUnits(admin_raster, pop_table, area_raster, tmp_path.joinpath('admin_A.tif'), tmp_path.joinpath('pop_A.csv'), None,
+                         raster_method=method, out_label_map=tmp_path.joinpath('labels.npz'), ppp_raster=ppp_raster)
+    agg.run()
+    names = [x.name for x in agg.report]
+    assert names[-1] == 'validation' and names.count('rasterize') == 1
+    got = pd.read_csv(tmp_path.joinpath('pop_A_validation.csv'), index_col='adm_id')
+    labels = LabelMap.load(tmp_path.joinpath('labels.npz')).to_frame()['labels']
+    pixels = pd.Series(ppp[GRID > 0], index=labels.loc[GRID[GRID > 0]].to_numpy())
+    modelled = pixels.groupby(level=0).sum()
+    census = pd.read_csv(pop_table).set_index('GID')['B_Tot'].groupby(labels).sum()
+    assert np.allclose(got.loc[modelled.index, 'modelled'], modelled)
+    assert np.allclose(got.loc[census.index, 'census'], census)
+    assert np.allclose(got['abs_error'], got['modelled'] - got['census'], equal_nan=True)
+    summary = json.loads(tmp_path.joinpath('pop_A_validation.json').read_text())
+    assert summary == agg.validation
+    assert np.isclose(summary['rmse'], np.sqrt(np.nanmean(got['abs_error'] ** 2)))
+
+
+def test_validation_rejects_misaligned_ppp(tmp_path, admin_raster, area_raster, pop_table):
+    ppp = np.where(GRID > 0, GRID * 2.5, -1).astype(np.float32)
+    shifted = rasterio.transform.from_origin(11.0, 20.0, 0.5, 0.5)
+    ppp_raster = write_raster(tmp_path.joinpath('ppp.tif'), ppp, nodata=-1, transform=shifted)
+    agg = AggregateUnits(admin_raster, pop_table, area_raster, tmp_path.joinpath('admin_A.tif'), tmp_path.joinpath('pop_A.csv'), None,
+                         raster_method='rasterize', ppp_raster=ppp_raster)
+    with pytest.raises(ValueError, match='same grid'):
+        agg.run()
@@ -0,0 +1,46 @@
+import pyarrow.parquet as pq
+import pytest
+
+from aggreunit import raster_to_polygon, read_vector, save_shapefile, write_vector
+
+
+@pytest.mark.parametrize('suffix', ['.shp', '.gpkg', '.fgb', '.geojson', '.parquet'])
+def test_write_vector_round_trip(tmp_path, admin_raster, suffix):
+    gdf = raster_to_polygon(admin_raster)
+    path = tmp_path.joinpath(f'units{suffix}')
+    write_vector(gdf, path, batch_size=3, index=False)
+    got = read_vector(path).sort_values('adm_id').reset_index(drop=True)
+    assert got.adm_id.tolist() == gdf.adm_id.tolist()
+    assert got.crs == gdf.crs
+    for geom, expected in zip(got.geometry, gdf.geometry):
+        assert geom.symmetric_difference(expected).area < 1e-9
+
+
+def test_parquet_written_in_row_groups(tmp_path, admin_raster):
+    gdf = raster_to_polygon(admin_raster)
+    path = tmp_path.joinpath('units.parquet')
+    save_shapefile(gdf, path, batch_size=2)
+    assert pq.ParquetFile(path).num_row_groups == 4
+    assert b'geo' in pq.read_schema(path).metadata
+
+
+def test_write_vector_unknown_suffix(tmp_path, admin_raster):
+    with pytest.raises(ValueError):
+        write_vector(raster_to_polygon(admin_raster), tmp_path.joinpath('units.xyz'))
+
+
+def test_parquet_keeps_named_index(tmp_path, admin_raster):
+    gdf = raster_to_polygon(admin_raster)
+    gdf['adm_id'] = range(1, len(gdf) + 1) #Consecutive ids, pandas may keep them as a range index
+    gdf = gdf.set_index('adm_id')
+    write_vector(gdf, tmp_path.joinpath('units.parquet'), batch_size=2)
+    gdf.to_parquet(tmp_path.joinpath('expected.parquet'))
+    got, expected = read_vector(tmp_path.joinpath('units.parquet')), read_vector(tmp_path.joinpath('expected.parquet'))
+    assert got.index.name == expected.index.name == 'adm_id'
+    assert got.index.tolist() == gdf.index.tolist() and got.columns.tolist() == expected.columns.tolist()
+
+
+def test_write_vector_without_suffix(tmp_path, admin_raster):
+    gdf = raster_to_polygon(admin_raster)
+    write_vector(gdf, tmp_path.joinpath('units'), index=False) #Shapefile, as GeoDataFrame.to_file
+    assert read_vector(tmp_path.joinpath('units')).adm_id.tolist() == gdf.adm_id.tolist()
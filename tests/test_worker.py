@@ -0,0 +1,38 @@
+import json
+
+import pandas as pd
+
+from aggreunit import AggregateUnits, Worker, submit_job
+
+from .conftest import GRID, write_raster
+
+
+def test_worker_serves_spooled_jobs(tmp_path, admin_raster, area_raster, pop_table):
+    spool = tmp_path.joinpath('spool')
+    job = {'admin_raster': admin_raster, 'population_table': pop_table, 'area_raster': area_raster, 'raster_method': 'remap'}
+    done = [submit_job(spool, dict(job, job_id='pairs', out_population_table=tmp_path.joinpath('pop_pairs.csv'))),
+            submit_job(spool, dict(job, job_id='target', target_units=3, out_population_table=tmp_path.joinpath('pop_3.csv'))),
+            submit_job(spool, dict(job, job_id='bad', population_table=tmp_path.joinpath('missing.csv'),
+                                   out_population_table=tmp_path.joinpath('pop_bad.csv'))),
+            submit_job(spool, dict(job, job_id='unknown', colour='red'))]
+    statuses = Worker(spool, max_countries=1, poll_interval=0.01).serve(idle_timeout=0)
+    assert [x['job_id'] for x in statuses] == ['pairs', 'target', 'bad', 'unknown']
+    assert [x['status'] for x in statuses] == ['done', 'done', 'failed', 'failed']
+    assert [x['warm'] for x in statuses[:3]] == [False, True, True]
+    assert 'Unknown job fields' in statuses[3]['error']
+    assert json.loads(done[1].read_text())['status'] == 'done'
+    assert not list(spool.joinpath('incoming').iterdir()) and not list(spool.joinpath('running').iterdir())
+    #Same table as a cold run
+    cold = AggregateUnits(admin_raster, pop_table, area_raster, None, tmp_path.joinpath('cold.csv'), None, target_units=3)
+    cold.run()
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path.joinpath('pop_3.csv')), pd.read_csv(tmp_path.joinpath('cold.csv')))
+
+
+def test_worker_lru(tmp_path, admin_raster, area_raster, pop_table):
+    other = write_raster(tmp_path.joinpath('other.tif'), GRID[::-1].copy())
+    worker = Worker(tmp_path.joinpath('spool'), max_countries=1)
+    for raster in (admin_raster, other, admin_raster):
+        status = worker.run_job({'job_id': 'x', 'admin_raster': raster, 'population_table': pop_table, 'area_raster': area_raster,
+                                 'out_population_table': tmp_path.joinpath('pop_A.csv')})
+        assert status['status'] == 'done' and not status['warm'], status['error']
+        assert len(worker._countries) == 1
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+import rasterio
+
+from aggreunit import get_pop_density, grids_align, raster_to_polygon, zonal_reduce, zonal_sum
+
+from .conftest import GRID, write_raster
+
+
+def test_zonal_sum(admin_raster, area_raster):
+    ids, sums = zonal_sum(admin_raster, area_raster)
+    with rasterio.open(area_raster) as src:
+        area = src.read(1)
+    assert ids.tolist() == [0, 1, 2, 3, 4, 5, 6]
+    for unit_id, total in zip(ids, sums):
+        mask = (GRID == unit_id) & (area != -1)
+        assert total == pytest.approx(area[mask].sum())
+
+
+def test_zonal_sum_windows_match_whole_raster(admin_raster, area_raster):
+    ids, sums = zonal_sum(admin_raster, area_raster)
+    ids_w, sums_w = zonal_sum(admin_raster, area_raster, max_pixels=1)
+    assert np.array_equal(ids, ids_w)
+    assert np.allclose(sums, sums_w)
+
+
+def test_zonal_reduce_threads_match_serial(tmp_path, admin_raster, area_raster):
+    pop = write_raster(tmp_path.joinpath('pop.tif'), np.where(GRID == 3, np.nan, GRID * 1.5).astype(np.float32), nodata=None)
+    ids, sums, counts = zonal_reduce(admin_raster, [area_raster, pop], max_pixels=1, num_threads=1)
+    ids_t, sums_t, counts_t = zonal_reduce(admin_raster, [area_raster, pop], max_pixels=1, num_threads=4)
+    assert np.array_equal(ids, ids_t) and np.array_equal(counts, counts_t)
+    assert np.allclose(sums, sums_t)
+    assert counts[ids.tolist().index(3), 1] == 0 #NaN pixels are not counted
+    assert np.allclose(sums[:, 0], zonal_sum(admin_raster, area_raster)[1])
+
+
+def test_grids_align(tmp_path, admin_raster, area_raster):
+    shifted = write_raster(tmp_path.joinpath('shifted.tif'), GRID, transform=rasterio.transform.from_origin(11.0, 20.0, 0.5, 0.5))
+    assert grids_align(admin_raster, area_raster)
+    assert not grids_align(admin_raster, shifted)
+
+
+def test_get_pop_density_raster_path_matches_zonal_stats(admin_raster, area_raster):
+    gdf = raster_to_polygon(admin_raster).set_index('adm_id')
+    gdf['P_2020'] = np.arange(len(gdf)) * 10.0
+    expected = get_pop_density(gdf, area_raster)
+    got = get_pop_density(gdf, area_raster, admin_raster=admin_raster)
+    pd.testing.assert_series_equal(got['area'], expected['area'], check_dtype=False)
+    pd.testing.assert_series_equal(got['density'], expected['density'], check_dtype=False)